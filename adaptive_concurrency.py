@@ -0,0 +1,227 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+
+# Status codes meaning "slow down": quota exhausted and service overloaded
+OVERLOAD_CODES = frozenset({429, 503})
+RETRYABLE_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit shared by every request in the process.
+
+    Each success raises the limit by 1/limit (about +1 per limit's worth of successes);
+    each overload response (429/503) multiplies it by `backoff_factor`, at most once per
+    `decrease_interval` so a burst of failures from requests already in flight counts as
+    one signal. A server retry hint pauses all new requests until it has passed.
+
+    Works from threads (`slot`) and from asyncio tasks (`async_slot`), in any mix.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 4,
+        min_limit: float = 1,
+        max_limit: float = 32,
+        backoff_factor: float = 0.5,
+        decrease_interval: float = 1.0,
+        window: int = 100,
+    ):
+        """
+        Args:
+            initial_limit: Concurrency to start with.
+            min_limit: Floor the limit never drops below.
+            max_limit: Ceiling the limit never probes above.
+            backoff_factor: Multiplier applied to the limit on overload.
+            decrease_interval: Minimum seconds between two decreases.
+            window: Number of recent outcomes the error rate is computed over.
+        """
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_factor = backoff_factor
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.overloads = 0
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _wait_seconds(self, now: float) -> float | None:
+        """0 when a slot is free, the remaining pause, or None when every slot is taken."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight < max(1, int(self.limit)):
+            return 0.0
+        return None
+
+    def _wake_all(self):
+        # Called with the lock held; every waiter re-checks for a free slot
+        self._condition.notify_all()
+        for loop, future in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # The waiter's event loop has already closed
+        self._async_waiters.clear()
+
+    def acquire(self):
+        """Block until a slot is free and take it."""
+        with self._condition:
+            while (wait := self._wait_seconds(time.monotonic())) != 0.0:
+                self._condition.wait(timeout=wait)
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        """Wait, without blocking the event loop, until a slot is free and take it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            future = None
+            with self._lock:
+                wait = self._wait_seconds(time.monotonic())
+                if wait == 0.0:
+                    self.in_flight += 1
+                    return
+                if wait is None:
+                    future = loop.create_future()
+                    self._async_waiters.append((loop, future))
+            if future is not None:
+                await future
+            else:
+                await asyncio.sleep(wait)  # type: ignore
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._wake_all()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        await self.acquire_async()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def record_success(self):
+        """Additive increase."""
+        with self._condition:
+            self.successes += 1
+            self._outcomes.append(False)
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake_all()
+
+    def record_failure(self, overloaded: bool, retry_after: float | None = None):
+        """
+        Count a failed request; on overload, cut the limit and honor the server's retry hint.
+
+        Args:
+            overloaded: The server answered 429 or 503.
+            retry_after: Seconds the server asked clients to wait, if it said.
+        """
+        now = time.monotonic()
+        with self._condition:
+            self.failures += 1
+            self._outcomes.append(True)
+            if overloaded:
+                self.overloads += 1
+                if now - self._last_decrease >= self.decrease_interval:
+                    self.limit = max(self.min_limit, self.limit * self.backoff_factor)
+                    self._last_decrease = now
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+    @property
+    def error_rate(self) -> float:
+        """Share of failures among the recent outcomes."""
+        with self._lock:
+            return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "error_rate": round(self.error_rate, 3),
+            "successes": self.successes,
+            "failures": self.failures,
+            "overloads": self.overloads,
+            "paused_seconds": round(max(0.0, self.paused_until - time.monotonic()), 2),
+        }
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _parse_retry_after_header(value: str) -> float | None:
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """
+    The wait the server suggested with an error: a Retry-After header, or the
+    `retryDelay` of a google.rpc.RetryInfo detail in the error body.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is not None:
+        value = headers.get("retry-after")
+        if value:
+            seconds = _parse_retry_after_header(value)
+            if seconds is not None:
+                return seconds
+
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        body = details.get("error", details)
+        for detail in body.get("details", []) if isinstance(body, dict) else []:
+            if isinstance(detail, dict) and str(detail.get("@type", "")).endswith("google.rpc.RetryInfo"):
+                match = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+                if match:
+                    return float(match.group(1))
+    return None
+
+
+def backoff_seconds(attempt: int, base_delay: float, retry_after: float | None, max_delay: float = 60.0) -> float:
+    """
+    Wait before retry number `attempt` (0-based).
+
+    Without a hint this is "full jitter" exponential backoff, uniform between
+    `base_delay` and base_delay * 2**attempt, so retries from many workers spread out
+    instead of arriving in lockstep. A server hint is honored with up to
+    `base_delay` of jitter added.
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base_delay)
+    ceiling = min(max_delay, base_delay * 2**attempt)
+    return random.uniform(min(base_delay, ceiling), ceiling)
+
+
+# Shared by every GeminiChat that is not given its own limiter
+shared_limiter = AdaptiveLimiter()
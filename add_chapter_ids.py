@@ -10,6 +10,8 @@ import json
 from pathlib import Path
 from tqdm import tqdm
 
+from corpus_store import CorpusStore
+
 def add_chapter_ids_to_file(file_path: Path):
     """Add chapter_id to each chapter object in the given JSON file."""
     if not file_path.exists():
@@ -39,18 +41,44 @@ def add_chapter_ids_to_file(file_path: Path):
 
     file_path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
 
+def add_chapter_ids_to_store(store: CorpusStore) -> int:
+    """
+    Number the chapters of every video in the corpus store from 1, in their current order.
+
+    Only videos whose IDs change are written, all in one new revision part.
+
+    Returns:
+        Number of videos renumbered
+    """
+    renumbered = []
+    for analysis in store.analyses():
+        chapters = [chapter.model_copy(update={'chapter_id': idx + 1}) for idx, chapter in enumerate(analysis.chapters)]
+        if chapters != analysis.chapters:
+            renumbered.append(analysis.model_copy(update={'chapters': chapters}))
+    return store.write_analyses(renumbered)
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Add chapter IDs to the chapters in data/chapters.")
+    parser.add_argument("--corpus", type=Path, default=None, help="Renumber the chapters in this corpus store instead.")
+    args = parser.parse_args()
+
     cur_dir = Path.cwd()
     data_dir = cur_dir / "data"
     chapters_dir = data_dir / "chapters"
 
-    # Ensure chapters directory exists
-    chapters_dir.mkdir(parents=True, exist_ok=True)
-
-    # Process each JSON file in the chapters directory
-    json_files = list(chapters_dir.glob("*.json"))
-    if not json_files:
-        print("No JSON files found in data/chapters.")
+    if args.corpus:
+        # One read and at most one new part, instead of a rewrite per file
+        print(f"Renumbered {add_chapter_ids_to_store(CorpusStore(args.corpus))} videos in {args.corpus}.")
     else:
-        for json_file in tqdm(json_files, desc="Adding chapter IDs"):
-            add_chapter_ids_to_file(json_file)
+        # Ensure chapters directory exists
+        chapters_dir.mkdir(parents=True, exist_ok=True)
+
+        # Process each JSON file in the chapters directory
+        json_files = list(chapters_dir.glob("*.json"))
+        if not json_files:
+            print("No JSON files found in data/chapters.")
+        else:
+            for json_file in tqdm(json_files, desc="Adding chapter IDs"):
+                add_chapter_ids_to_file(json_file)
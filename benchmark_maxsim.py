@@ -0,0 +1,175 @@
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from loguru import logger
+from qdrant_client import QdrantClient, models
+from qdrant_client.http.models import PointStruct
+
+from benchmark_retrieval import git_commit
+from benchmark_two_level import random_dense, random_sparse, upload
+from colbert_storage import MultivectorStorage, TokenStore, storage_bytes, vector_params
+from embedding_models import DENSE_MODEL, LATE_INTERACTION_MODEL, SPARSE_MODEL, ModelRegistry
+from maxsim_reranker import MaxSimReranker
+from retrieval import HybridSearcher, QueryEmbeddings
+from usage_log import latency_summary
+
+DEFAULT_OUTPUT = Path("reports/maxsim_benchmark.json")
+SERVER_COLLECTION = "bench_colbert_server"
+LOCAL_COLLECTION = "bench_colbert_local"
+
+
+def current_rss() -> int | None:
+    """Resident memory of this process in bytes (Linux only)."""
+    try:
+        return int(Path("/proc/self/statm").read_text().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def random_tokens(rng: np.random.Generator, rows: int, dim: int) -> np.ndarray:
+    matrix = rng.standard_normal((rows, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def build_collection(
+    client: QdrantClient, collection_name: str, dense: Sequence[list[float]], sparse: Sequence[models.SparseVector],
+    late: Sequence[np.ndarray] | None,
+) -> int | None:
+    """
+    A synthetic chapters collection, with the ColBERT vector only if `late` is given.
+
+    Returns:
+        Growth of this process's RSS while loading it (meaningful for in-process Qdrant only).
+    """
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    vectors_config = {DENSE_MODEL: models.VectorParams(size=len(dense[0]), distance=models.Distance.COSINE)}
+    if late is not None:
+        vectors_config[LATE_INTERACTION_MODEL] = vector_params(MultivectorStorage(), late[0].shape[1])
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=vectors_config,
+        sparse_vectors_config={SPARSE_MODEL: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+    )
+    before = current_rss()
+    points = []
+    for number in range(len(dense)):
+        vector = {DENSE_MODEL: dense[number], SPARSE_MODEL: sparse[number]}
+        if late is not None:
+            vector[LATE_INTERACTION_MODEL] = late[number].tolist()
+        points.append(PointStruct(
+            id=number, vector=vector,  # type: ignore
+            payload={"video_id": f"v{number % 50}", "chapter_id": number, "heading": "", "content": "", "timestamp": ""},
+        ))
+    upload(client, collection_name, points, batch_size=200)
+    after = current_rss()
+    return after - before if before is not None and after is not None else None
+
+
+def run_benchmark(
+    registry: ModelRegistry,
+    token_store_dir: Path,
+    chapters: int = 2000,
+    queries: int = 50,
+    limit: int = 10,
+    dim: int = 128,
+    dense_dim: int = 384,
+    token_range: tuple[int, int] = (100, 300),
+    query_tokens: int = 32,
+    seed: int = 0,
+) -> dict:
+    """
+    Latency and memory of server-side ColBERT reranking against in-process MaxSim over a token store.
+
+    Both paths rerank the same dense + BM25 candidates of the same synthetic collection
+    (random vectors, no models are loaded). Memory is reported as the bytes of ColBERT
+    vectors Qdrant has to hold, the size of the token store file (served from the page
+    cache) and, for in-process Qdrant, how much this process grew while loading each
+    collection.
+    """
+    rng = np.random.default_rng(seed)
+    client = registry.client
+    dense = [random_dense(rng, dense_dim) for _ in range(chapters)]
+    sparse = [random_sparse(rng, 40) for _ in range(chapters)]
+    late = [random_tokens(rng, int(rng.integers(*token_range)), dim) for _ in range(chapters)]
+
+    server_rss = build_collection(client, SERVER_COLLECTION, dense, sparse, late)
+    local_rss = build_collection(client, LOCAL_COLLECTION, dense, sparse, None)
+    store = TokenStore(token_store_dir, dim=dim)
+    store.put_many([str(number) for number in range(chapters)], late)
+
+    embeddings = [
+        QueryEmbeddings(
+            dense=random_dense(rng, dense_dim), sparse=random_sparse(rng, 5),
+            late=random_tokens(rng, query_tokens, dim).tolist(),
+        )
+        for _ in range(queries)
+    ]
+    server = HybridSearcher(registry=registry, collection_name=SERVER_COLLECTION)
+    local = MaxSimReranker(HybridSearcher(registry=registry, collection_name=LOCAL_COLLECTION), store)
+
+    server_seconds, local_seconds, agreement = [], [], []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        server_results = server.search_embedded([embedding], "colbert", limit)[0]
+        server_seconds.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        local_results = local.search_embedded([embedding], limit)[0]
+        local_seconds.append(time.perf_counter() - start)
+        server_ids = {result.point_id for result in server_results}
+        agreement.append(len(server_ids & {result.point_id for result in local_results}) / max(len(server_ids), 1))
+
+    report = {
+        "commit": git_commit(),
+        "qdrant": registry.qdrant_location or registry.qdrant_url,
+        "chapters": chapters,
+        "token_vectors": sum(len(matrix) for matrix in late),
+        "queries": queries,
+        "candidates": server.limits.dense + server.limits.sparse,
+        "server_rerank": {
+            **latency_summary(server_seconds),
+            "qdrant_colbert_bytes": storage_bytes(late, MultivectorStorage())["ram_bytes"],
+            "load_rss_delta_bytes": server_rss,
+        },
+        "local_rerank": {
+            **latency_summary(local_seconds),
+            "candidates_ms_mean": 1000 * local.timings["candidates"] / queries,
+            "maxsim_ms_mean": 1000 * local.timings["rerank"] / queries,
+            "qdrant_colbert_bytes": 0,
+            "token_store_bytes": store.nbytes,
+            "load_rss_delta_bytes": local_rss,
+        },
+        f"top{limit}_agreement": float(np.mean(agreement)),
+    }
+    store.close()
+    for collection_name in (SERVER_COLLECTION, LOCAL_COLLECTION):
+        client.delete_collection(collection_name)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark server-side ColBERT rerank against in-process MaxSim.")
+    parser.add_argument(
+        "--qdrant-location", default=":memory:", help="In-process Qdrant, ':memory:' or a directory path."
+    )
+    parser.add_argument("--qdrant-url", default=None, help="Benchmark against a Qdrant server instead.")
+    parser.add_argument("--chapters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    registry = (
+        ModelRegistry(qdrant_url=args.qdrant_url) if args.qdrant_url else ModelRegistry(qdrant_location=args.qdrant_location)
+    )
+    with tempfile.TemporaryDirectory() as token_store_dir:
+        report = run_benchmark(registry, Path(token_store_dir), args.chapters, args.queries)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    logger.info(f"Results written to {args.output}: {report}")
@@ -0,0 +1,226 @@
+import json
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from loguru import logger
+
+from retrieval import STRATEGIES, EvalQuestion, HybridSearcher, QueryEmbeddings, SearchResult, Strategy, load_questions
+from usage_log import latency_summary
+
+DEFAULT_KS = (1, 3, 5, 10)
+DEFAULT_CONCURRENCY = (1, 4, 16)
+DEFAULT_OUTPUT = Path("reports/retrieval_benchmark.json")
+
+
+def reciprocal_rank(retrieved: Sequence[tuple[str, int]], relevant: set[tuple[str, int]]) -> float:
+    for rank, key in enumerate(retrieved, start=1):
+        if key in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def precision_at_k(retrieved: Sequence[tuple[str, int]], relevant: set[tuple[str, int]], k: int) -> float:
+    return sum(key in relevant for key in retrieved[:k]) / k
+
+
+def recall_at_k(retrieved: Sequence[tuple[str, int]], relevant: set[tuple[str, int]], k: int) -> float:
+    if not relevant:
+        return 0.0
+    return len(relevant & set(retrieved[:k])) / len(relevant)
+
+
+def score_question(
+    results: Sequence[SearchResult], relevant: set[tuple[str, int]], ks: Sequence[int]
+) -> dict[str, float]:
+    """MRR, Precision@K and Recall@K of one ranked result list; a hit is a matching (video_id, chapter_id)."""
+    retrieved = [(result.video_id, result.chapter_id) for result in results]
+    scores = {"mrr": reciprocal_rank(retrieved, relevant)}
+    for k in ks:
+        scores[f"precision@{k}"] = precision_at_k(retrieved, relevant, k)
+        scores[f"recall@{k}"] = recall_at_k(retrieved, relevant, k)
+    return scores
+
+
+def aggregate(rows: Sequence[dict[str, float]]) -> dict[str, float]:
+    """Mean of every metric over a group of questions."""
+    if not rows:
+        return {"questions": 0}
+    summary = {key: float(np.mean([row[key] for row in rows])) for key in rows[0]}
+    summary["questions"] = len(rows)
+    return summary
+
+
+def breakdown(questions: Sequence[EvalQuestion], rows: Sequence[dict[str, float]], field: str) -> dict[str, dict]:
+    """Aggregate metrics per value of a RAGQuestion field, e.g. difficulty_level."""
+    groups: dict[str, list[dict[str, float]]] = {}
+    for question, row in zip(questions, rows):
+        groups.setdefault(str(getattr(question.question, field)), []).append(row)
+    return {value: aggregate(group) for value, group in sorted(groups.items())}
+
+
+def evaluate_quality(
+    searcher: HybridSearcher,
+    questions: Sequence[EvalQuestion],
+    embeddings: Sequence[QueryEmbeddings],
+    strategy: Strategy,
+    ks: Sequence[int] = DEFAULT_KS,
+    batch_size: int = 64,
+) -> dict:
+    """Retrieval quality of a strategy, overall and by difficulty level and answer scope."""
+    limit = max(ks)
+    rows = []
+    for start in range(0, len(embeddings), batch_size):
+        batch = embeddings[start : start + batch_size]
+        for question, results in zip(
+            questions[start : start + batch_size], searcher.search_embedded(batch, strategy, limit)
+        ):
+            rows.append(score_question(results, question.relevant, ks))
+    return {
+        "overall": aggregate(rows),
+        "by_difficulty_level": breakdown(questions, rows, "difficulty_level"),
+        "by_answer_scope": breakdown(questions, rows, "answer_scope"),
+    }
+
+
+def measure_throughput(
+    searcher: HybridSearcher,
+    embeddings: Sequence[QueryEmbeddings],
+    strategy: Strategy,
+    concurrency: int,
+    limit: int = 10,
+) -> dict[str, float]:
+    """
+    Latency percentiles and QPS of single-query searches issued by `concurrency` threads.
+
+    Queries are embedded beforehand, so this measures Qdrant search time only.
+    """
+
+    def timed_search(embedding: QueryEmbeddings) -> float:
+        start = time.perf_counter()
+        searcher.search_embedded([embedding], strategy, limit)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed_search, embeddings))
+    wall_seconds = time.perf_counter() - start
+    return {"concurrency": concurrency, "qps": len(latencies) / wall_seconds, **latency_summary(latencies)}
+
+
+def embed_questions(searcher: HybridSearcher, questions: Sequence[EvalQuestion]) -> tuple[list[QueryEmbeddings], dict]:
+    """Embed every question once for all strategies, timing the batch."""
+    start = time.perf_counter()
+    embeddings = searcher.embed_queries([question.question.question for question in questions])
+    seconds = time.perf_counter() - start
+    return embeddings, {"seconds": seconds, "per_query_ms": 1000 * seconds / max(len(questions), 1)}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    searcher: HybridSearcher,
+    questions: Sequence[EvalQuestion],
+    strategies: Sequence[Strategy] = STRATEGIES,
+    ks: Sequence[int] = DEFAULT_KS,
+    concurrency_levels: Sequence[int] = DEFAULT_CONCURRENCY,
+) -> dict:
+    """
+    Benchmark every strategy on the same questions.
+
+    Args:
+        searcher: Searcher over an indexed collection.
+        questions: Questions with their ground truth chapters.
+        strategies: Retrieval strategies to compare.
+        ks: Cutoffs for Precision@K and Recall@K; the deepest one sets the result limit.
+        concurrency_levels: Thread counts for the latency and QPS runs; clamped to 1 for
+            in-process Qdrant, which is not thread-safe (benchmark a server for more).
+    """
+    if not questions:
+        raise ValueError("No questions to benchmark")
+    local = searcher.registry.qdrant_location is not None
+    if local and max(concurrency_levels) > 1:
+        logger.warning("In-process Qdrant is not thread-safe; measuring throughput at concurrency 1 only.")
+        concurrency_levels = [1]
+    embeddings, embedding_timing = embed_questions(searcher, questions)
+    report = {
+        "commit": git_commit(),
+        "collection": searcher.collection_name,
+        "qdrant": searcher.registry.qdrant_location or searcher.registry.qdrant_url,
+        "questions": len(questions),
+        "prefetch_limits": searcher.limits.model_dump(),
+        "storage": searcher.storage.label,
+        "query_embedding": embedding_timing,
+        "strategies": {},
+    }
+    if local:
+        report["concurrency_note"] = "In-process Qdrant is not thread-safe, so searches ran one at a time."
+    for strategy in strategies:
+        logger.info(f"Benchmarking {strategy}...")
+        quality = evaluate_quality(searcher, questions, embeddings, strategy, ks)
+        latency = [
+            measure_throughput(searcher, embeddings, strategy, concurrency, max(ks))
+            for concurrency in concurrency_levels
+        ]
+        report["strategies"][strategy] = {"quality": quality, "latency": latency}
+        overall = quality["overall"]
+        logger.info(
+            f"{strategy}: MRR {overall.get('mrr', 0):.3f}, "
+            f"p50 {latency[0]['p50_ms']:.1f} ms, {latency[-1]['qps']:.0f} QPS at concurrency {latency[-1]['concurrency']}"
+        )
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from colbert_storage import MultivectorStorage
+    from create_qdrant_index import COLLECTION_NAME, create_index
+    from embedding_cache import DEFAULT_CACHE_DIR
+    from embedding_models import ModelRegistry
+    from retrieval import PrefetchLimits
+
+    parser = argparse.ArgumentParser(description="Benchmark retrieval strategies against data/questions.")
+    parser.add_argument("--questions-dir", type=Path, default=Path("data/questions"))
+    parser.add_argument(
+        "--qdrant-location", default=":memory:", help="In-process Qdrant, ':memory:' or a directory path."
+    )
+    parser.add_argument("--qdrant-url", default=None, help="Benchmark against a Qdrant server instead (needed for concurrency > 1).")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--rebuild", action="store_true", help="Re-sync the collection from data/chapters first.")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument("--ks", nargs="+", type=int, default=list(DEFAULT_KS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument("--dense-limit", type=int, default=20)
+    parser.add_argument("--sparse-limit", type=int, default=20)
+    parser.add_argument("--colbert-datatype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    registry = (
+        ModelRegistry(qdrant_url=args.qdrant_url) if args.qdrant_url else ModelRegistry(qdrant_location=args.qdrant_location)
+    )
+    storage = MultivectorStorage(datatype=args.colbert_datatype)
+    if args.rebuild or not registry.client.collection_exists(args.collection):
+        create_index(cache_dir=DEFAULT_CACHE_DIR, registry=registry, storage=storage, collection_name=args.collection)
+
+    searcher = HybridSearcher(
+        registry=registry,
+        collection_name=args.collection,
+        limits=PrefetchLimits(dense=args.dense_limit, sparse=args.sparse_limit),
+        storage=storage,
+    )
+    report = run_benchmark(searcher, load_questions(args.questions_dir), args.strategies, args.ks, args.concurrency)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    logger.info(f"Results written to {args.output}")
@@ -0,0 +1,169 @@
+import json
+import time
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from loguru import logger
+from qdrant_client import QdrantClient, models
+from qdrant_client.http.models import PointStruct
+
+from benchmark_retrieval import git_commit
+from embedding_models import DENSE_MODEL, SPARSE_MODEL, ModelRegistry
+from retrieval import HybridSearcher, PrefetchLimits, QueryEmbeddings
+from transcript_windows import CHAPTER_KEY, TwoLevelSearcher, chapter_key, ensure_windows_collection, window_point_id
+from usage_log import latency_summary
+
+DEFAULT_OUTPUT = Path("reports/two_level_benchmark.json")
+DEFAULT_MULTIPLIERS = (1, 10, 50)
+BENCH_CHAPTERS = "bench_chapters"
+VOCABULARY = 30_000
+
+
+def random_dense(rng: np.random.Generator, dim: int) -> list[float]:
+    vector = rng.standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def random_sparse(rng: np.random.Generator, terms: int) -> models.SparseVector:
+    indices = np.sort(rng.choice(VOCABULARY, size=terms, replace=False))
+    return models.SparseVector(indices=indices.tolist(), values=np.ones(terms).tolist())
+
+
+def upload(client: QdrantClient, collection_name: str, points: Sequence[PointStruct], batch_size: int = 1000):
+    for start in range(0, len(points), batch_size):
+        client.upsert(collection_name=collection_name, points=list(points[start : start + batch_size]), wait=True)
+
+
+def build_chapters(client: QdrantClient, chapters: int, videos: int, dim: int, rng: np.random.Generator):
+    """A synthetic chapters collection with dense and BM25 vectors (no ColBERT, which these strategies skip)."""
+    if client.collection_exists(BENCH_CHAPTERS):
+        client.delete_collection(BENCH_CHAPTERS)
+    client.create_collection(
+        collection_name=BENCH_CHAPTERS,
+        vectors_config={DENSE_MODEL: models.VectorParams(size=dim, distance=models.Distance.COSINE)},
+        sparse_vectors_config={SPARSE_MODEL: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+    )
+    points = [
+        PointStruct(
+            id=number,
+            vector={DENSE_MODEL: random_dense(rng, dim), SPARSE_MODEL: random_sparse(rng, 40)},  # type: ignore
+            payload={"video_id": f"v{number % videos}", "chapter_id": number // videos + 1, "heading": "", "content": ""},
+        )
+        for number in range(chapters)
+    ]
+    upload(client, BENCH_CHAPTERS, points)
+
+
+def build_windows(
+    client: QdrantClient, collection_name: str, chapters: int, videos: int, per_chapter: int, dim: int,
+    rng: np.random.Generator,
+):
+    """`per_chapter` synthetic windows under every chapter of the chapters collection."""
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    ensure_windows_collection(client, collection_name, dim)
+    points = []
+    for number in range(chapters):
+        video_id, chapter_id = f"v{number % videos}", number // videos + 1
+        for window_no in range(per_chapter):
+            points.append(PointStruct(
+                id=window_point_id(video_id, chapter_id, window_no),
+                vector={DENSE_MODEL: random_dense(rng, dim), SPARSE_MODEL: random_sparse(rng, 25)},  # type: ignore
+                payload={
+                    CHAPTER_KEY: chapter_key(video_id, chapter_id), "video_id": video_id, "chapter_id": chapter_id,
+                    "window_no": window_no, "start_seconds": 0.0, "end_seconds": 60.0, "timestamp": "0:00", "text": "",
+                },
+            ))
+    upload(client, collection_name, points)
+
+
+def time_calls(function, embeddings: Sequence[QueryEmbeddings]) -> dict[str, float]:
+    seconds = []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        function(embedding)
+        seconds.append(time.perf_counter() - start)
+    return latency_summary(seconds)
+
+
+def run_benchmark(
+    registry: ModelRegistry,
+    chapters: int = 500,
+    videos: int = 50,
+    multipliers: Sequence[int] = DEFAULT_MULTIPLIERS,
+    queries: int = 50,
+    top_chapters: int = 5,
+    windows_per_chapter: int = 3,
+    dim: int = 128,
+    seed: int = 0,
+) -> dict:
+    """
+    Latency of chapter-only search, two-level search and a flat search over every window,
+    as the number of windows per chapter grows.
+
+    All searches use RRF over dense + BM25 prefetches, on synthetic random vectors (no
+    models are loaded). Payload indexes only take effect on a Qdrant server; in-process
+    Qdrant evaluates filters by scanning, so run against --qdrant-url for production numbers.
+    """
+    rng = np.random.default_rng(seed)
+    client = registry.client
+    build_chapters(client, chapters, videos, dim, rng)
+    searcher = HybridSearcher(registry=registry, collection_name=BENCH_CHAPTERS)
+    embeddings = [
+        QueryEmbeddings(dense=random_dense(rng, dim), sparse=random_sparse(rng, 5)) for _ in range(queries)
+    ]
+    chapter_only = time_calls(lambda e: searcher.search_embedded([e], "rrf", top_chapters), embeddings)
+
+    results = []
+    for multiplier in multipliers:
+        collection_name = f"bench_windows_x{multiplier}"
+        build_windows(client, collection_name, chapters, videos, multiplier, dim, rng)
+        two_level = TwoLevelSearcher(searcher, collection_name, windows_per_chapter=windows_per_chapter)
+        flat = HybridSearcher(registry=registry, collection_name=collection_name, limits=PrefetchLimits())
+        row = {
+            "windows_per_chapter": multiplier,
+            "windows": client.count(collection_name).count,
+            "two_level": time_calls(lambda e: two_level.search_embedded(e, "rrf", top_chapters), embeddings),
+            "flat_windows": time_calls(
+                lambda e: flat.search_embedded([e], "rrf", top_chapters * windows_per_chapter), embeddings
+            ),
+        }
+        row["two_level_over_chapter_only_p50"] = row["two_level"]["p50_ms"] / chapter_only["p50_ms"]
+        results.append(row)
+        logger.info(f"x{multiplier}: {row}")
+        client.delete_collection(collection_name)
+
+    return {
+        "commit": git_commit(),
+        "qdrant": registry.qdrant_location or registry.qdrant_url,
+        "chapters": chapters,
+        "queries": queries,
+        "top_chapters": top_chapters,
+        "chapter_only": chapter_only,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark two-level (chapter -> window) search latency.")
+    parser.add_argument(
+        "--qdrant-location", default=":memory:", help="In-process Qdrant, ':memory:' or a directory path."
+    )
+    parser.add_argument("--qdrant-url", default=None, help="Benchmark against a Qdrant server instead.")
+    parser.add_argument("--chapters", type=int, default=500)
+    parser.add_argument("--videos", type=int, default=50)
+    parser.add_argument("--multipliers", nargs="+", type=int, default=list(DEFAULT_MULTIPLIERS))
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    registry = (
+        ModelRegistry(qdrant_url=args.qdrant_url) if args.qdrant_url else ModelRegistry(qdrant_location=args.qdrant_location)
+    )
+    report = run_benchmark(registry, args.chapters, args.videos, args.multipliers, args.queries)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    logger.info(f"Results written to {args.output}")
@@ -1,14 +1,63 @@
 import json
+import multiprocessing
+import os
 import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
 from pathlib import Path
 import logging
+
+from pydantic import BaseModel, Field
+
+from corpus_store import CorpusStore
 from logging_config import setup_logging
+from srt_utils import parse_timestamp, read_final_cue_end
 
-# Configure logging
-setup_logging(level=logging.INFO, log_to_file=True, log_file="validation.log")
 logger = logging.getLogger(__name__)
 
+DEFAULT_REPORT_PATH = Path("reports/timestamp_validation.json")
+# The checks timestamp_mistakes.log has always been based on; the others are reported only in the JSON report
+ORIGINAL_ISSUE_KINDS = frozenset({"parse_error", "exceeds_duration"})
+
+
+class ValidationSettings(BaseModel):
+    """Thresholds of the corpus-wide chapter checks."""
+    min_gap_seconds: float = Field(30, description="Consecutive chapters closer than this are flagged")
+    max_final_chapter_seconds: float = Field(
+        30 * 60, description="A last chapter starting longer than this before the final cue leaves the end unchaptered"
+    )
+
+
+class TimestampIssue(BaseModel):
+    kind: str = Field(
+        ..., description="parse_error, exceeds_duration, not_increasing, gap_too_small or final_cue_not_covered"
+    )
+    message: str
+    chapter_id: int | None = None
+    timestamp: str | None = None
+    heading: str | None = None
+
+
+class PairResult(BaseModel):
+    """Validation outcome for one transcript/chapters pair."""
+    video_id: str
+    transcript_seconds: float | None = None
+    chapter_count: int = 0
+    error: str | None = Field(None, description="Why the pair could not be checked at all")
+    issues: list[TimestampIssue] = Field(default_factory=list)
+
+    @property
+    def valid(self) -> bool:
+        return self.error is None and not self.issues
+
+    @property
+    def passes_original_checks(self) -> bool:
+        """Valid by the checks in ORIGINAL_ISSUE_KINDS alone: every timestamp parses and lies within the transcript."""
+        return self.error is None and not any(issue.kind in ORIGINAL_ISSUE_KINDS for issue in self.issues)
+
+
 def parse_srt_timestamp(timestamp_str):
     """Parse SRT timestamp format (HH:MM:SS,mmm) to total seconds"""
     timestamp_str = timestamp_str.split(' --> ')[0].strip()
@@ -19,19 +68,13 @@ def parse_srt_timestamp(timestamp_str):
 
 def parse_chapter_timestamp(timestamp_str):
     """Parse chapter timestamp format (M:SS or H:MM:SS) to total seconds"""
-    timestamp_str = timestamp_str.strip()
-    parts = timestamp_str.split(':')
-    if len(parts) == 2:
-        minutes, seconds = map(int, parts)
-        return minutes * 60 + seconds
-    elif len(parts) == 3:
-        hours, minutes, seconds = map(int, parts)
-        return hours * 3600 + minutes * 60 + seconds
-    else:
+    seconds = parse_timestamp(timestamp_str)
+    if seconds is None:
         raise ValueError(f"Invalid timestamp format: {timestamp_str}")
+    return seconds
 
 def get_final_transcript_timestamp(transcript_content):
-    """Extract the final timestamp from the transcript"""
+    """Extract the final timestamp from the transcript text (see `read_final_cue_end` for files)"""
     timestamp_pattern = r'\d{2}:\d{2}:\d{2},\d{3} --> \d{2}:\d{2}:\d{2},\d{3}'
     timestamps = re.findall(timestamp_pattern, transcript_content)
     if not timestamps:
@@ -40,73 +83,200 @@ def get_final_transcript_timestamp(transcript_content):
     end_time = last_timestamp.split(' --> ')[1]
     return parse_srt_timestamp(end_time)
 
-def validate_timestamps(transcript_file: Path, chapters_file: Path):
-    """Main function to validate timestamps for a single pair of files."""
+def check_chapters(chapters: list[dict], final_seconds: float, settings: ValidationSettings) -> list[TimestampIssue]:
+    """
+    Every check for one video's chapters against its transcript duration: parseable,
+    within the transcript, strictly increasing, at least `min_gap_seconds` apart, and
+    reaching close enough to the final cue.
+    """
+    issues = []
+    previous: tuple[float, dict] | None = None
+    for chapter in chapters:
+        timestamp = chapter.get('timestamp', '')
+        fields = {
+            "chapter_id": chapter.get('chapter_id'), "timestamp": timestamp, "heading": chapter.get('heading', 'N/A')
+        }
+        seconds = parse_timestamp(timestamp) if isinstance(timestamp, str) else None
+        if seconds is None:
+            issues.append(TimestampIssue(kind="parse_error", message=f"Cannot parse timestamp '{timestamp}'", **fields))
+            continue
+        if seconds > final_seconds:
+            issues.append(TimestampIssue(
+                kind="exceeds_duration",
+                message=f"Timestamp '{timestamp}' exceeds transcript duration ({final_seconds:.2f}s)",
+                **fields,
+            ))
+        if previous is not None:
+            gap = seconds - previous[0]
+            if gap <= 0:
+                issues.append(TimestampIssue(
+                    kind="not_increasing",
+                    message=f"Timestamp '{timestamp}' does not come after '{previous[1].get('timestamp')}'",
+                    **fields,
+                ))
+            elif gap < settings.min_gap_seconds:
+                issues.append(TimestampIssue(
+                    kind="gap_too_small",
+                    message=f"Only {gap:.0f}s after the previous chapter (minimum {settings.min_gap_seconds:.0f}s)",
+                    **fields,
+                ))
+        previous = (seconds, chapter)
+
+    if previous is not None and final_seconds - previous[0] > settings.max_final_chapter_seconds:
+        issues.append(TimestampIssue(
+            kind="final_cue_not_covered",
+            message=(
+                f"Last chapter starts {timedelta(seconds=int(final_seconds - previous[0]))} before the final cue "
+                f"(maximum {timedelta(seconds=int(settings.max_final_chapter_seconds))})"
+            ),
+            chapter_id=previous[1].get('chapter_id'),
+            timestamp=previous[1].get('timestamp'),
+            heading=previous[1].get('heading', 'N/A'),
+        ))
+    return issues
+
+def check_transcript(
+    transcript_file: Path, chapters: list[dict], settings: ValidationSettings = ValidationSettings()
+) -> PairResult:
+    """Validate a transcript against chapters already loaded (e.g. from the corpus store); never raises."""
+    result = PairResult(video_id=transcript_file.stem)
     try:
-        transcript_content = transcript_file.read_text(encoding='utf-8')
-        chapters_data = json.loads(chapters_file.read_text(encoding='utf-8'))
-        
-        final_transcript_seconds = get_final_transcript_timestamp(transcript_content)
-        
-        invalid_timestamps = []
-        for chapter in chapters_data.get('chapters', []):
-            timestamp = chapter.get('timestamp', '')
-            heading = chapter.get('heading', 'N/A')
-            try:
-                chapter_seconds = parse_chapter_timestamp(timestamp)
-                if chapter_seconds > final_transcript_seconds:
-                    invalid_timestamps.append(
-                        f"Timestamp '{timestamp}' exceeds transcript duration "
-                        f"({final_transcript_seconds:.2f}s) for chapter: '{heading}'"
-                    )
-            except ValueError as e:
-                invalid_timestamps.append(f"Parse error for timestamp '{timestamp}': {e}")
-        
-        if invalid_timestamps:
-            for error in invalid_timestamps:
-                logger.warning(f"Invalid timestamp in {chapters_file.name}: {error}")
-            return False
-        else:
-            logger.info(f"All timestamps in {chapters_file.name} are valid.")
-            return True
-            
+        result.transcript_seconds = read_final_cue_end(transcript_file)
     except FileNotFoundError as e:
-        logger.error(f"File not found during validation: {e}")
-        return False
+        result.error = f"File not found: {e.filename}"
+        return result
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+        return result
+    result.chapter_count = len(chapters)
+    result.issues = check_chapters(chapters, result.transcript_seconds, settings)
+    return result
+
+def check_pair(transcript_file: Path, chapters_file: Path, settings: ValidationSettings = ValidationSettings()) -> PairResult:
+    """Validate one transcript/chapters pair; never raises, so it is safe to fan out."""
+    try:
+        chapters = json.loads(chapters_file.read_text(encoding='utf-8')).get('chapters', [])
+    except FileNotFoundError as e:
+        return PairResult(video_id=transcript_file.stem, error=f"File not found: {e.filename}")
     except json.JSONDecodeError:
-        logger.error(f"Invalid JSON format in {chapters_file.name}")
-        return False
+        return PairResult(video_id=transcript_file.stem, error=f"Invalid JSON format in {chapters_file.name}")
     except Exception as e:
-        logger.error(f"An unexpected error occurred validating {transcript_file.name}: {e}", exc_info=True)
+        return PairResult(video_id=transcript_file.stem, error=f"{type(e).__name__}: {e}")
+    return check_transcript(transcript_file, chapters, settings)
+
+def validate_timestamps(transcript_file: Path, chapters_file: Path, settings: ValidationSettings = ValidationSettings()):
+    """Main function to validate timestamps for a single pair of files (by the original checks)."""
+    result = check_pair(transcript_file, chapters_file, settings)
+    if result.error:
+        logger.error(f"Could not validate {transcript_file.name}: {result.error}")
+        return False
+    for issue in result.issues:
+        logger.warning(f"Invalid timestamp in {chapters_file.name}: {issue.message} for chapter: '{issue.heading}'")
+    if not result.passes_original_checks:
         return False
+    logger.info(f"All timestamps in {chapters_file.name} are valid.")
+    return True
 
-def validate_all_transcripts_and_chapters():
-    """
-    Validate all transcript/chapter pairs, logging mistakes to a file.
+def _check_pair_args(args: tuple[Path, Path | list[dict], ValidationSettings]) -> PairResult:
+    transcript_file, chapters, settings = args
+    if isinstance(chapters, Path):
+        return check_pair(transcript_file, chapters, settings)
+    return check_transcript(transcript_file, chapters, settings)
+
+def build_report(results: list[PairResult], missing: list[str], settings: ValidationSettings, seconds: float) -> dict:
+    issue_kinds = Counter(issue.kind for result in results for issue in result.issues)
+    return {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": settings.model_dump(),
+        "summary": {
+            "pairs": len(results),
+            "valid": sum(result.valid for result in results),
+            "invalid": sum(not result.valid for result in results),
+            "errors": sum(result.error is not None for result in results),
+            "missing_chapters": len(missing),
+            "issues_by_kind": dict(sorted(issue_kinds.items())),
+            "seconds": round(seconds, 3),
+        },
+        "missing_chapters": missing,
+        "results": [
+            {**result.model_dump(), "valid": result.valid} for result in results if not result.valid
+        ],
+    }
+
+def validate_all_transcripts_and_chapters(
+    subtitles_dir: Path = Path("data/subtitles"),
+    chapters_dir: Path = Path("data/chapters"),
+    settings: ValidationSettings = ValidationSettings(),
+    workers: int | None = None,
+    report_path: Path = DEFAULT_REPORT_PATH,
+    mistakes_log_path: Path = Path("timestamp_mistakes.log"),
+    corpus: CorpusStore | None = None,
+) -> dict | None:
     """
-    subtitles_dir = Path("data/subtitles")
-    chapters_dir = Path("data/chapters")
-    mistakes_log_path = Path("timestamp_mistakes.log")
-    
-    failed_files = []
+    Validate all transcript/chapter pairs across a process pool, writing a JSON report
+    (invalid pairs in full) and the list of failing files to `mistakes_log_path`.
+
+    The mistakes log lists only files failing the original checks (ORIGINAL_ISSUE_KINDS),
+    as it always has; gap_too_small, not_increasing and final_cue_not_covered issues
+    appear in the JSON report alone.
+
+    Args:
+        subtitles_dir: Directory of <video_id>.srt transcripts.
+        chapters_dir: Directory of <video_id>.json chapters.
+        settings: Thresholds of the chapter checks.
+        workers: Worker processes (CPU count by default; 1 checks in-process).
+        report_path: Where the JSON report goes.
+        mistakes_log_path: Plain list of failing files, as before the report existed.
+        corpus: Read every video's chapters from this store in one pass instead of
+            opening a JSON file per video in `chapters_dir`.
 
-    srt_files = list(subtitles_dir.glob("*.srt"))
+    Returns:
+        The report, or None if there are no transcripts
+    """
+    srt_files = sorted(subtitles_dir.glob("*.srt"))
     if not srt_files:
         logger.warning("No .srt files found in data/subtitles to validate.")
-        return
+        return None
 
     logger.info(f"Starting validation for {len(srt_files)} transcript(s)...")
-
+    start = time.perf_counter()
+    missing = []
+    pairs = []
+    stored = None
+    if corpus is not None:
+        stored = {
+            analysis.video_id: [chapter.model_dump() for chapter in analysis.chapters]
+            for analysis in corpus.analyses()
+        }
     for srt_file in srt_files:
         json_file = chapters_dir / srt_file.with_suffix('.json').name
-        if not json_file.exists():
-            missing_msg = f"Missing chapters file for {srt_file.name}"
-            logger.warning(missing_msg)
-            failed_files.append(missing_msg)
-            continue
-        
-        if not validate_timestamps(srt_file, json_file):
-            failed_files.append(srt_file.name)
+        if stored is not None and srt_file.stem in stored:
+            pairs.append((srt_file, stored[srt_file.stem], settings))
+        elif stored is None and json_file.exists():
+            pairs.append((srt_file, json_file, settings))
+        else:
+            missing.append(srt_file.name)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pairs) < 2:
+        results = [_check_pair_args(pair) for pair in pairs]
+    else:
+        # Spawned workers do not inherit the parent's logging handlers, threads or locks
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            chunksize = max(1, len(pairs) // (workers * 4))
+            results = list(executor.map(_check_pair_args, pairs, chunksize=chunksize))
+
+    report = build_report(results, missing, settings, time.perf_counter() - start)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    failed_files = [f"Missing chapters file for {name}" for name in missing]
+    failed_files += [f"{result.video_id}.srt" for result in results if not result.passes_original_checks]
+    for result in results:
+        if result.error:
+            logger.error(f"Could not validate {result.video_id}: {result.error}")
+        for issue in result.issues:
+            logger.warning(f"{result.video_id}: {issue.kind}: {issue.message}")
 
     if failed_files:
         logger.warning(f"Validation complete. Found issues in {len(failed_files)} file(s).")
@@ -116,6 +286,30 @@ def validate_all_transcripts_and_chapters():
         logger.info(f"List of files with errors logged to {mistakes_log_path}")
     else:
         logger.info("Validation complete. All transcript/chapter pairs are valid!")
+    logger.info(f"Report written to {report_path}: {report['summary']}")
+    return report
 
 if __name__ == "__main__":
-    validate_all_transcripts_and_chapters()
+    import argparse
+
+    # Configure logging
+    setup_logging(level=logging.INFO, log_to_file=True, log_file="validation.log")
+
+    parser = argparse.ArgumentParser(description="Validate chapter timestamps against their transcripts.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--min-gap", type=float, default=30, help="Minimum seconds between chapters.")
+    parser.add_argument(
+        "--max-final-chapter-minutes", type=float, default=30,
+        help="Flag videos whose last chapter starts longer than this before the final cue."
+    )
+    parser.add_argument("--report", type=Path, default=DEFAULT_REPORT_PATH)
+    parser.add_argument("--corpus", type=Path, default=None, help="Read chapters from this corpus store directory.")
+    args = parser.parse_args()
+    validate_all_transcripts_and_chapters(
+        settings=ValidationSettings(
+            min_gap_seconds=args.min_gap, max_final_chapter_seconds=args.max_final_chapter_minutes * 60
+        ),
+        workers=args.workers,
+        report_path=args.report,
+        corpus=CorpusStore(args.corpus) if args.corpus else None,
+    )
@@ -0,0 +1,484 @@
+import json
+import os
+import sqlite3
+import string
+import time
+from pathlib import Path
+from typing import Iterable, Literal, Sequence
+
+import numpy as np
+from fastembed import LateInteractionTextEmbedding
+from loguru import logger
+from pydantic import BaseModel, Field
+from qdrant_client import QdrantClient, models
+
+# Tokens carrying little meaning for MaxSim; dropped from documents when pruning is on
+STOPWORDS = frozenset(
+    """
+    a about above after again against all am an and any are as at be because been before being
+    below between both but by can could did do does doing down during each few for from further
+    had has have having he her here hers herself him himself his how i if in into is it its itself
+    just me more most my myself no nor not now of off on once only or other our ours ourselves out
+    over own same she should so some such than that the their theirs them themselves then there
+    these they this those through to too under until up very was we were what when where which
+    while who whom why will with would you your yours yourself yourselves
+    """.split()
+)
+# Leading rows ([CLS] and the document marker) are always kept, they summarize the passage
+KEPT_PREFIX_ROWS = 2
+BYTES_PER_ELEMENT = {"float32": 4, "float16": 2}
+DEFAULT_TOKEN_STORE_DIR = Path("data/colbert_tokens")
+
+
+class MultivectorStorage(BaseModel):
+    """
+    How the late-interaction multivectors are stored in Qdrant.
+
+    There is no uint8 option: Qdrant compares uint8 vectors as stored, and signed
+    components shifted onto 0-255 no longer give cosine similarities. Byte-sized vectors
+    come from int8 scalar quantization of the float vectors instead.
+    """
+    datatype: Literal["float32", "float16"] = Field(
+        "float32", description="Element type of the stored token vectors"
+    )
+    quantization: bool = Field(
+        False, description="Keep an int8 scalar-quantized copy in RAM and the originals on disk"
+    )
+    prune_tokens: bool = Field(
+        False, description="Drop stopword and punctuation token vectors from documents"
+    )
+
+    @property
+    def label(self) -> str:
+        parts = [self.datatype]
+        if self.quantization:
+            parts.append("sq-int8")
+        if self.prune_tokens:
+            parts.append("pruned")
+        return "+".join(parts)
+
+
+def vector_params(storage: MultivectorStorage, size: int) -> models.VectorParams:
+    """Qdrant config for the late-interaction vector, used only for reranking."""
+    return models.VectorParams(
+        size=size,
+        distance=models.Distance.COSINE,
+        multivector_config=models.MultiVectorConfig(
+            comparator=models.MultiVectorComparator.MAX_SIM,
+        ),
+        hnsw_config=models.HnswConfigDiff(m=0),  # Disable HNSW for reranking
+        datatype=models.Datatype(storage.datatype),
+        quantization_config=models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        ) if storage.quantization else None,
+        on_disk=True if storage.quantization else None,
+    )
+
+
+def encode(matrix: np.ndarray, storage: MultivectorStorage) -> np.ndarray:
+    """Convert a float32 token matrix (document or query) to the stored datatype."""
+    if storage.datatype == "float16":
+        return matrix.astype(np.float16)
+    return matrix
+
+
+def _is_low_information(token: str) -> bool:
+    word = token.lstrip("▁Ġ#").lower()
+    return not word or word in STOPWORDS or all(char in string.punctuation for char in word)
+
+
+def prune_tokens(
+    late_model: LateInteractionTextEmbedding, documents: Sequence[str], matrices: Sequence[np.ndarray]
+) -> list[np.ndarray]:
+    """
+    Drop the rows of stopword and punctuation tokens from document token matrices.
+
+    Rows are matched to tokens by re-tokenizing each document the way fastembed's ColBERT
+    does (document marker inserted after [CLS], skip-list and padding tokens removed).
+    A matrix whose row count does not line up with its tokens is returned unchanged.
+    """
+    colbert = late_model.model
+    pruned = []
+    for encoding, matrix in zip(colbert.tokenize(list(documents), is_doc=True), matrices):  # type: ignore
+        ids = list(encoding.ids)
+        tokens = list(encoding.tokens)
+        ids.insert(1, colbert.DOCUMENT_MARKER_TOKEN_ID)  # type: ignore
+        tokens.insert(1, "")
+        kept_tokens = [
+            token
+            for token_id, token in zip(ids, tokens)
+            if token_id not in colbert.skip_list and token_id != colbert.pad_token_id  # type: ignore
+        ]
+        if len(kept_tokens) != len(matrix):
+            pruned.append(matrix)
+            continue
+        keep = [
+            row < KEPT_PREFIX_ROWS or not _is_low_information(token)
+            for row, token in enumerate(kept_tokens)
+        ]
+        pruned.append(matrix[np.array(keep)])
+    return pruned
+
+
+def maxsim(query: np.ndarray, document: np.ndarray) -> float:
+    """ColBERT MaxSim with cosine similarity, computed the way Qdrant scores MAX_SIM."""
+    query = query.astype(np.float32)
+    document = document.astype(np.float32)
+    query = query / np.maximum(np.linalg.norm(query, axis=1, keepdims=True), 1e-12)
+    document = document / np.maximum(np.linalg.norm(document, axis=1, keepdims=True), 1e-12)
+    return float((query @ document.T).max(axis=1).sum())
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def maxsim_scores(query: np.ndarray, documents: Sequence[np.ndarray], normalized: bool = False) -> np.ndarray:
+    """
+    `maxsim` of one query against many documents, vectorized.
+
+    The documents' token rows are stacked and scored against every query token in a
+    single matmul; a segmented max (`np.maximum.reduceat`) then takes each document's
+    best row per query token, and the sum over query tokens gives the score.
+
+    Args:
+        query: (query tokens, dim) matrix.
+        documents: (tokens, dim) matrices of varying length; an empty one scores -inf.
+        normalized: The document rows are already unit-length (as in a TokenStore).
+    """
+    scores = np.full(len(documents), -np.inf, dtype=np.float32)
+    present = [i for i, document in enumerate(documents) if len(document)]
+    if not present:
+        return scores
+    rows = np.concatenate([np.asarray(documents[i], dtype=np.float32) for i in present])
+    if not normalized:
+        rows = normalize_rows(rows)
+    similarities = rows @ normalize_rows(query).T
+    starts = np.cumsum([0] + [len(documents[i]) for i in present[:-1]])
+    scores[present] = np.maximum.reduceat(similarities, starts, axis=0).sum(axis=1)
+    return scores
+
+
+class TokenStore:
+    """
+    ColBERT token matrices keyed by Qdrant point ID, for reranking outside Qdrant.
+
+    Like the embedding cache, the rows of every matrix are appended to one flat file
+    read through a memory map, and a SQLite index holds each point's row offset and
+    count (kept in memory as a dict for lookups). Rows are stored unit-normalized, so
+    MaxSim needs no per-query normalization of documents. Replacing or deleting a point
+    leaves its old rows in the file until `compact`, which writes a new rows file and
+    switches to it in the same transaction that rewrites the offsets.
+    """
+
+    def __init__(
+        self, root: Path = DEFAULT_TOKEN_STORE_DIR, dim: int | None = None,
+        datatype: Literal["float32", "float16"] = "float32",
+    ):
+        """
+        Args:
+            root: Directory of the store, created if missing.
+            dim: Token vector size; required when creating a store, checked when opening one.
+            datatype: Element type of the stored rows (float16 halves the file).
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.root / "index.sqlite", check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tokens (
+                point_id TEXT PRIMARY KEY,
+                row_offset INTEGER NOT NULL,
+                row_count INTEGER NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        meta = dict(self._db.execute("SELECT key, value FROM meta").fetchall())
+        if not meta:
+            if dim is None:
+                raise ValueError(f"No token store at {self.root}; pass `dim` to create one")
+            meta = {"dim": str(dim), "datatype": datatype, "rows_file": f"tokens.{datatype}"}
+            self._db.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", meta.items())
+            self._db.commit()
+        elif dim is not None and int(meta["dim"]) != dim:
+            raise ValueError(f"Token store at {self.root} holds {meta['dim']}-dim vectors, expected {dim}")
+        self.dim = int(meta["dim"])
+        self.dtype = np.dtype(meta["datatype"])
+        self.rows_path = self.root / meta["rows_file"]
+        self.rows_path.touch(exist_ok=True)
+        self._index: dict[str, tuple[int, int]] = {
+            point_id: (offset, count)
+            for point_id, offset, count in self._db.execute("SELECT point_id, row_offset, row_count FROM tokens")
+        }
+        self._memmap: np.memmap | None = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, point_id: str) -> bool:
+        return point_id in self._index
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the rows file on disk (read through the page cache, not held in RAM)."""
+        return self.rows_path.stat().st_size
+
+    @property
+    def _total_rows(self) -> int:
+        return self.nbytes // (self.dtype.itemsize * self.dim)
+
+    def _rows(self) -> np.ndarray:
+        """Memory map of the rows file, remapped when it has grown since the last read."""
+        total_rows = self._total_rows
+        if self._memmap is None or len(self._memmap) != total_rows:
+            if total_rows == 0:
+                return np.empty((0, self.dim), dtype=self.dtype)
+            self._memmap = np.memmap(self.rows_path, dtype=self.dtype, mode="r", shape=(total_rows, self.dim))
+        return self._memmap
+
+    def get_many(self, point_ids: Sequence[str]) -> list[np.ndarray | None]:
+        """Token matrix (a view into the memory map) of each point, or None where it is missing."""
+        rows = self._rows()
+        results: list[np.ndarray | None] = []
+        for point_id in point_ids:
+            location = self._index.get(point_id)
+            results.append(rows[location[0] : location[0] + location[1]] if location else None)
+        return results
+
+    def put_many(self, point_ids: Sequence[str], matrices: Iterable[np.ndarray]):
+        """Store (or replace) the token matrices of points."""
+        offset = self._total_rows
+        entries = []
+        with open(self.rows_path, "ab") as f:
+            for point_id, matrix in zip(point_ids, matrices):
+                matrix = normalize_rows(np.asarray(matrix).reshape(-1, self.dim)).astype(self.dtype)
+                f.write(matrix.tobytes())
+                entries.append((str(point_id), offset, len(matrix)))
+                offset += len(matrix)
+        self._db.executemany(
+            "INSERT OR REPLACE INTO tokens (point_id, row_offset, row_count) VALUES (?, ?, ?)", entries
+        )
+        self._db.commit()
+        self._index.update((point_id, (offset, count)) for point_id, offset, count in entries)
+
+    def delete_many(self, point_ids: Sequence[str]):
+        self._db.executemany("DELETE FROM tokens WHERE point_id = ?", [(str(point_id),) for point_id in point_ids])
+        self._db.commit()
+        for point_id in point_ids:
+            self._index.pop(str(point_id), None)
+
+    def compact(self) -> int:
+        """
+        Rewrite the rows file with only the live matrices.
+
+        Returns:
+            Bytes reclaimed.
+        """
+        before = self.nbytes
+        rows = self._rows()
+        compacted_path = self.root / f"tokens.{time.time_ns()}.{self.dtype.name}"
+        entries = []
+        offset = 0
+        with open(compacted_path, "wb") as f:
+            for point_id, (old_offset, count) in sorted(self._index.items(), key=lambda item: item[1][0]):
+                f.write(np.asarray(rows[old_offset : old_offset + count]).tobytes())
+                entries.append((point_id, offset, count))
+                offset += count
+            f.flush()
+            os.fsync(f.fileno())
+        # Same scheme as EmbeddingStore.prune: the old file is untouched until the new
+        # offsets and file name are committed together
+        with self._db:
+            self._db.execute("DELETE FROM tokens")
+            self._db.executemany("INSERT INTO tokens (point_id, row_offset, row_count) VALUES (?, ?, ?)", entries)
+            self._db.execute("UPDATE meta SET value = ? WHERE key = 'rows_file'", (compacted_path.name,))
+        self._memmap = None
+        self.rows_path = compacted_path
+        self._index = {point_id: (offset, count) for point_id, offset, count in entries}
+        # The old file, and any left behind by an interrupted compaction
+        for stale_path in self.root.glob("tokens.*"):
+            if stale_path != self.rows_path:
+                stale_path.unlink()
+        return before - self.nbytes
+
+    def close(self):
+        self._memmap = None
+        self._db.close()
+
+
+def simulate_scalar_quantization(matrices: Sequence[np.ndarray], quantile: float = 0.99) -> list[np.ndarray]:
+    """Round-trip vectors through int8 scalar quantization with a collection-wide quantile range."""
+    values = np.concatenate([matrix.ravel() for matrix in matrices]).astype(np.float32)
+    low, high = np.quantile(values, 1 - quantile), np.quantile(values, quantile)
+    # A constant range (e.g. all-zero vectors) would make the scale 0; keep it positive so values map to low
+    scale = max(high - low, np.finfo(np.float32).eps) / 255
+    return [
+        (np.rint((np.clip(matrix, low, high) - low) / scale) * scale + low).astype(np.float32)
+        for matrix in matrices
+    ]
+
+
+def storage_bytes(matrices: Sequence[np.ndarray], storage: MultivectorStorage) -> dict[str, int]:
+    """Bytes the multivectors take in RAM and on disk for a storage option."""
+    elements = sum(matrix.size for matrix in matrices)
+    stored = elements * BYTES_PER_ELEMENT[storage.datatype]
+    if storage.quantization:
+        # int8 codes stay in RAM, the original vectors move to disk
+        return {"ram_bytes": elements, "disk_bytes": stored}
+    return {"ram_bytes": stored, "disk_bytes": stored}
+
+
+def ranking_agreement(baseline: np.ndarray, candidate: np.ndarray, k: int = 10) -> dict[str, float]:
+    """Top-1 match and top-k overlap between two score vectors over the same documents."""
+    k = min(k, len(baseline))
+    baseline_top = np.argsort(-baseline)[:k]
+    candidate_top = np.argsort(-candidate)[:k]
+    return {
+        "top1_match": float(baseline_top[0] == candidate_top[0]),
+        f"top{k}_overlap": len(set(baseline_top) & set(candidate_top)) / k,
+    }
+
+
+def time_server_rerank(
+    client: QdrantClient,
+    storage: MultivectorStorage,
+    documents: Sequence[np.ndarray],
+    queries: Sequence[np.ndarray],
+    size: int,
+    limit: int = 10,
+) -> float:
+    """Median latency (seconds) of a MaxSim rerank over `documents` in a scratch collection."""
+    collection_name = f"colbert_storage_{storage.label.replace('+', '_')}"
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(collection_name, vectors_config={"colbert": vector_params(storage, size)})
+    try:
+        client.upload_points(
+            collection_name,
+            points=[
+                models.PointStruct(id=idx, vector={"colbert": encode(matrix, storage).tolist()})
+                for idx, matrix in enumerate(documents)
+            ],
+            batch_size=64,
+            wait=True,
+        )
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            client.query_points(
+                collection_name, query=encode(query, storage).tolist(), using="colbert", limit=limit
+            )
+            latencies.append(time.perf_counter() - start)
+        return float(np.median(latencies))
+    finally:
+        client.delete_collection(collection_name)
+
+
+def compare_storage(
+    late_model: LateInteractionTextEmbedding,
+    documents: Sequence[str],
+    document_matrices: Sequence[np.ndarray],
+    query_matrices: Sequence[np.ndarray],
+    options: Sequence[MultivectorStorage],
+    client: QdrantClient | None = None,
+) -> list[dict]:
+    """
+    Compare storage options against the float32 baseline.
+
+    For every option this reports RAM/disk bytes, agreement of the MaxSim ranking of
+    `documents` for every query with the float32 ranking, and (given a client) the
+    median server-side rerank latency.
+    """
+    baseline = MultivectorStorage()
+    pruned_matrices = None
+    size = document_matrices[0].shape[1]
+    baseline_scores = [
+        np.array([maxsim(query, doc) for doc in document_matrices]) for query in query_matrices
+    ]
+
+    report = []
+    for storage in [baseline, *options]:
+        matrices = list(document_matrices)
+        if storage.prune_tokens:
+            if pruned_matrices is None:
+                pruned_matrices = prune_tokens(late_model, documents, document_matrices)
+            matrices = pruned_matrices
+        stored = simulate_scalar_quantization(matrices) if storage.quantization else matrices
+        stored = [encode(matrix, storage) for matrix in stored]
+
+        agreements = [
+            ranking_agreement(
+                scores,
+                np.array([maxsim(encode(query, storage), doc) for doc in stored]),
+            )
+            for query, scores in zip(query_matrices, baseline_scores)
+        ]
+        row = {
+            "storage": storage.label,
+            "token_vectors": sum(len(matrix) for matrix in matrices),
+            **storage_bytes(matrices, storage),
+        }
+        for key in agreements[0]:
+            row[key] = float(np.mean([agreement[key] for agreement in agreements]))
+        if client is not None:
+            row["rerank_p50_seconds"] = time_server_rerank(client, storage, matrices, query_matrices, size)
+        report.append(row)
+        logger.info(f"{row}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from create_qdrant_index import get_json_files, iter_chapters
+    from embedding_cache import DEFAULT_CACHE_DIR, EmbeddingCache
+    from embedding_models import LATE_INTERACTION_MODEL, ModelRegistry
+    from pydantic_models import RAGQuestionSet
+
+    parser = argparse.ArgumentParser(description="Compare compact ColBERT storage options with float32.")
+    parser.add_argument("--documents", type=int, default=500, help="Chapters to sample.")
+    parser.add_argument("--queries", type=int, default=50, help="Questions to sample.")
+    parser.add_argument("--no-server", action="store_true", help="Skip the Qdrant rerank latency runs.")
+    parser.add_argument("--output", type=Path, default=Path("reports/colbert_storage.json"))
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    documents = [
+        chapter.content for _, chapter in iter_chapters(get_json_files(Path("data/chapters")))
+    ][: args.documents]
+    questions = [
+        question.question
+        for path in sorted(Path("data/questions").glob("*.json"))
+        for question in RAGQuestionSet.model_validate_json(path.read_text(encoding="utf-8")).questions
+    ][: args.queries]
+
+    cache = EmbeddingCache(DEFAULT_CACHE_DIR)
+    cache.add_model(LATE_INTERACTION_MODEL, registry.vector_size(LATE_INTERACTION_MODEL), multivector=True)
+    document_matrices = cache.get_many(LATE_INTERACTION_MODEL, documents)
+    missing = [doc for doc, hit in zip(documents, document_matrices) if hit is None]
+    if missing:
+        cache.put_many(LATE_INTERACTION_MODEL, missing, registry.late.passage_embed(missing))
+        document_matrices = cache.get_many(LATE_INTERACTION_MODEL, documents)
+    cache.close()
+    query_matrices = list(registry.late.query_embed(questions))
+
+    report = compare_storage(
+        registry.late,
+        documents,
+        document_matrices,  # type: ignore
+        query_matrices,
+        [
+            MultivectorStorage(datatype="float16"),
+            MultivectorStorage(quantization=True),
+            MultivectorStorage(prune_tokens=True),
+            MultivectorStorage(datatype="float16", prune_tokens=True),
+        ],
+        client=None if args.no_server else registry.client,
+    )
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    logger.info(f"Report written to {args.output}")
@@ -0,0 +1,283 @@
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from loguru import logger
+from pydantic import ValidationError
+
+from pydantic_models import Chapter, RAGQuestion, RAGQuestionSet, VideoAnalysis
+
+DEFAULT_STORE_DIR = Path("data/corpus")
+# Rows are sorted by video_id and grouped this finely, so row-group statistics let a
+# video_id filter skip most of a part without decoding it
+ROW_GROUP_SIZE = 2048
+
+VIDEO_SCHEMA = pa.schema([
+    ("video_id", pa.string()),
+    ("revision", pa.int64()),
+    ("overall_summary", pa.string()),
+    ("topics", pa.list_(pa.string())),
+])
+CHAPTER_SCHEMA = pa.schema([
+    ("video_id", pa.string()),
+    ("revision", pa.int64()),
+    ("chapter_id", pa.int64()),
+    ("timestamp", pa.string()),
+    ("heading", pa.string()),
+    ("content", pa.string()),
+])
+QUESTION_SCHEMA = pa.schema([
+    ("video_id", pa.string()),
+    ("revision", pa.int64()),
+    ("question_id", pa.int64()),
+    ("question", pa.string()),
+    ("expected_answer_type", pa.string()),
+    ("context_requirements", pa.string()),
+    ("ground_truth_reference", pa.list_(pa.int64())),
+    ("difficulty_level", pa.string()),
+    ("answer_scope", pa.string()),
+    ("question_category", pa.string()),
+])
+
+
+class CorpusStore:
+    """
+    Parquet store of every VideoAnalysis (videos and chapters tables) and RAGQuestion
+    (questions table).
+
+    Each table is a directory of immutable part files. Writing videos appends a new
+    part stamped with the next revision number; a video's rows from its latest revision
+    supersede older ones, so re-extracting a video is an append, not a rewrite.
+    `compact` folds the parts back into one. Reads are memory-mapped and push
+    `video_id` filters down to Parquet row groups. Meant for one writer at a time.
+    """
+
+    def __init__(self, root: Path = DEFAULT_STORE_DIR):
+        self.root = Path(root)
+
+    def _table_dir(self, name: str) -> Path:
+        return self.root / name
+
+    def _parts(self, name: str) -> list[Path]:
+        return sorted(self._table_dir(name).glob("part-*.parquet"))
+
+    def _next_revision(self, name: str) -> int:
+        parts = self._parts(name)
+        return int(parts[-1].stem.split("-")[1]) + 1 if parts else 1
+
+    def _write_part(self, name: str, table: pa.Table, revision: int):
+        directory = self._table_dir(name)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"part-{revision:06d}.parquet"
+        temporary = path.with_suffix(".tmp")
+        sorted_table = table.sort_by([("video_id", "ascending")])
+        pq.write_table(sorted_table, temporary, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+        os.replace(temporary, path)
+
+    def _read(self, name: str, schema: pa.Schema, video_ids: Iterable[str] | None) -> pa.Table:
+        """All rows of every part, optionally only those of `video_ids`."""
+        parts = self._parts(name)
+        if not parts:
+            return schema.empty_table()
+        filters = None
+        if video_ids is not None:
+            filters = pc.field("video_id").isin(list(video_ids))
+        return pq.read_table([str(part) for part in parts], schema=schema, filters=filters, memory_map=True)
+
+    @staticmethod
+    def _latest(table: pa.Table, revisions: pa.Table) -> pa.Table:
+        """Rows of `table` whose revision is their video's latest one in `revisions`."""
+        if table.num_rows == 0:
+            return table
+        latest = revisions.group_by("video_id").aggregate([("revision", "max")])
+        # A lookup rather than a join, since joins cannot carry list columns such as topics
+        positions = pc.index_in(table["video_id"], value_set=latest["video_id"])
+        latest_revision = pc.take(latest["revision_max"], positions)
+        return table.filter(pc.equal(table["revision"], latest_revision))
+
+    def videos(self, video_ids: Iterable[str] | None = None) -> pa.Table:
+        table = self._read("videos", VIDEO_SCHEMA, video_ids)
+        return self._latest(table, table).sort_by("video_id")
+
+    def chapters(self, video_ids: Iterable[str] | None = None) -> pa.Table:
+        video_ids = list(video_ids) if video_ids is not None else None
+        # Revisions come from the videos table, so a video re-extracted with fewer
+        # chapters does not keep the chapters it lost
+        revisions = self._read("videos", VIDEO_SCHEMA, video_ids).select(["video_id", "revision"])
+        table = self._read("chapters", CHAPTER_SCHEMA, video_ids)
+        return self._latest(table, revisions).sort_by([("video_id", "ascending"), ("chapter_id", "ascending")])
+
+    def questions(self, video_ids: Iterable[str] | None = None) -> pa.Table:
+        table = self._read("questions", QUESTION_SCHEMA, video_ids)
+        return self._latest(table, table).sort_by([("video_id", "ascending"), ("question_id", "ascending")])
+
+    def video_ids(self) -> list[str]:
+        return self.videos().column("video_id").to_pylist()
+
+    def write_analyses(self, analyses: Iterable[VideoAnalysis]) -> int:
+        """Append (or supersede) videos and their chapters; returns the number of videos written."""
+        analyses = list(analyses)
+        if not analyses:
+            return 0
+        revision = self._next_revision("videos")
+        videos = pa.Table.from_pylist(
+            [
+                {"video_id": a.video_id, "revision": revision, "overall_summary": a.overall_summary, "topics": a.topics}
+                for a in analyses
+            ],
+            schema=VIDEO_SCHEMA,
+        )
+        chapters = pa.Table.from_pylist(
+            [
+                {"video_id": a.video_id, "revision": revision, **chapter.model_dump()}
+                for a in analyses
+                for chapter in a.chapters
+            ],
+            schema=CHAPTER_SCHEMA,
+        )
+        # Chapters first: until the videos part lands, readers still resolve the old revision
+        self._write_part("chapters", chapters, revision)
+        self._write_part("videos", videos, revision)
+        return len(analyses)
+
+    def write_questions(self, question_sets: dict[str, RAGQuestionSet]) -> int:
+        """Append (or supersede) the question sets of videos; returns the number of videos written."""
+        if not question_sets:
+            return 0
+        revision = self._next_revision("questions")
+        rows = [
+            {"video_id": video_id, "revision": revision, **question.model_dump(mode="json")}
+            for video_id, question_set in question_sets.items()
+            for question in question_set.questions
+        ]
+        self._write_part("questions", pa.Table.from_pylist(rows, schema=QUESTION_SCHEMA), revision)
+        return len(question_sets)
+
+    def analyses(self, video_ids: Iterable[str] | None = None) -> Iterator[VideoAnalysis]:
+        video_ids = list(video_ids) if video_ids is not None else None
+        chapters_by_video = defaultdict(list)
+        for row in self.chapters(video_ids).drop_columns(["revision"]).to_pylist():
+            chapters_by_video[row.pop("video_id")].append(Chapter(**row))
+        for row in self.videos(video_ids).to_pylist():
+            yield VideoAnalysis(
+                video_id=row["video_id"],
+                overall_summary=row["overall_summary"],
+                chapters=chapters_by_video[row["video_id"]],
+                topics=row["topics"],
+            )
+
+    def question_sets(self, video_ids: Iterable[str] | None = None) -> dict[str, RAGQuestionSet]:
+        questions_by_video = defaultdict(list)
+        for row in self.questions(video_ids).drop_columns(["revision"]).to_pylist():
+            questions_by_video[row.pop("video_id")].append(RAGQuestion(**row))
+        return {video_id: RAGQuestionSet(questions=questions) for video_id, questions in questions_by_video.items()}
+
+    def compact(self):
+        """
+        Rewrite each table as a single part holding only current rows.
+
+        Rows keep their revision and the part takes the latest revision's name, replacing
+        it atomically, so readers see the same rows before, during and after compaction.
+        """
+        for name, read in (("chapters", self.chapters), ("videos", self.videos), ("questions", self.questions)):
+            old_parts = self._parts(name)
+            if len(old_parts) <= 1:
+                continue
+            self._write_part(name, read(), int(old_parts[-1].stem.split("-")[1]))
+            for part in old_parts[:-1]:
+                part.unlink()
+            logger.info(f"Compacted {len(old_parts)} {name} parts into one.")
+
+
+def iter_store_chapters(store: CorpusStore, video_ids: Iterable[str] | None = None) -> Iterator[tuple[str, Chapter]]:
+    """(video_id, chapter) pairs from the store, in the same shape as create_qdrant_index.iter_chapters."""
+    columns = store.chapters(video_ids).drop_columns(["revision"]).to_pylist()
+    for row in columns:
+        yield row.pop("video_id"), Chapter(**row)
+
+
+def import_json(
+    store: CorpusStore, chapters_dir: Path = Path("data/chapters"), questions_dir: Path = Path("data/questions")
+) -> tuple[int, int]:
+    """
+    Load the per-video JSON layout into the store, skipping unreadable files.
+
+    Returns:
+        Number of videos and of question sets imported
+    """
+    analyses = []
+    for path in sorted(chapters_dir.glob("*.json")):
+        try:
+            analyses.append(VideoAnalysis.model_validate_json(path.read_text(encoding="utf-8")))
+        except (ValidationError, ValueError) as e:
+            logger.error(f"Could not load chapters from {path}: {e}")
+    question_sets = {}
+    for path in sorted(questions_dir.glob("*.json")):
+        try:
+            question_sets[path.stem] = RAGQuestionSet.model_validate_json(path.read_text(encoding="utf-8"))
+        except (ValidationError, ValueError) as e:
+            logger.error(f"Could not load questions from {path}: {e}")
+    return store.write_analyses(analyses), store.write_questions(question_sets)
+
+
+def export_json(
+    store: CorpusStore,
+    chapters_dir: Path = Path("data/chapters"),
+    questions_dir: Path = Path("data/questions"),
+    video_ids: Iterable[str] | None = None,
+) -> tuple[int, int]:
+    """
+    Write the store back out in the per-video JSON layout.
+
+    Returns:
+        Number of chapters files and of questions files written
+    """
+    video_ids = list(video_ids) if video_ids is not None else None
+    chapters_dir.mkdir(parents=True, exist_ok=True)
+    questions_dir.mkdir(parents=True, exist_ok=True)
+    chapter_files = 0
+    for analysis in store.analyses(video_ids):
+        (chapters_dir / f"{analysis.video_id}.json").write_text(
+            json.dumps(analysis.model_dump(), indent=2, ensure_ascii=False), encoding="utf-8"
+        )
+        chapter_files += 1
+    question_sets = store.question_sets(video_ids)
+    for video_id, question_set in question_sets.items():
+        (questions_dir / f"{video_id}.json").write_text(question_set.model_dump_json(indent=2), encoding="utf-8")
+    return chapter_files, len(question_sets)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Columnar store of chapters and questions.")
+    parser.add_argument("command", choices=["import", "export", "compact", "info"])
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE_DIR)
+    parser.add_argument("--chapters-dir", type=Path, default=Path("data/chapters"))
+    parser.add_argument("--questions-dir", type=Path, default=Path("data/questions"))
+    parser.add_argument("--videos", nargs="+", default=None, help="Export only these video IDs.")
+    args = parser.parse_args()
+
+    store = CorpusStore(args.store)
+    if args.command == "import":
+        videos, questions = import_json(store, args.chapters_dir, args.questions_dir)
+        logger.info(f"Imported {videos} videos and {questions} question sets into {args.store}.")
+    elif args.command == "export":
+        videos, questions = export_json(store, args.chapters_dir, args.questions_dir, args.videos)
+        logger.info(f"Exported {videos} chapters files and {questions} questions files.")
+    elif args.command == "compact":
+        store.compact()
+    else:
+        start = time.perf_counter()
+        chapters = store.chapters()
+        questions = store.questions()
+        logger.info(
+            f"{len(store.video_ids())} videos, {chapters.num_rows} chapters, {questions.num_rows} questions; "
+            f"full scan in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
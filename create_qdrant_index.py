@@ -1,29 +1,47 @@
 
+import hashlib
 import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import batched
 from pathlib import Path
+from typing import Iterable, Iterator
 
 from fastembed import LateInteractionTextEmbedding, SparseTextEmbedding, TextEmbedding
 from loguru import logger
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import PointStruct
-from uuid import uuid4
+from uuid import UUID, uuid5
 
-from pydantic_models import VideoAnalysis
+from colbert_storage import MultivectorStorage, TokenStore, encode, prune_tokens, vector_params
+from corpus_store import CorpusStore, iter_store_chapters
+from srt_index import DEFAULT_SUBTITLES_DIR, TranscriptSpans
+from embedding_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, EmbeddingCache
+from embedding_models import DENSE_MODEL, LATE_INTERACTION_MODEL, SPARSE_MODEL, ModelRegistry
+from pydantic_models import Chapter, VideoAnalysis
 
-# 1. Define constants for model names and the Qdrant collection
-DENSE_MODEL = "jinaai/jina-embeddings-v2-base-en"
-SPARSE_MODEL = "Qdrant/bm25"
-LATE_INTERACTION_MODEL = "jinaai/jina-colbert-v2"
+# 1. Define constants for the Qdrant collection (model names live in embedding_models)
 COLLECTION_NAME = "huberman_clips"
 
+DEFAULT_CHAPTERS_DIR = Path("data/chapters")
+# Chapters are streamed across file boundaries into batches of this size
+DEFAULT_BATCH_SIZE = 64
+# Namespace for deterministic point IDs derived from (video_id, chapter_id)
+POINT_ID_NAMESPACE = UUID("6f0c2f64-3c1e-4b8e-9a57-2d8f1e9b4c31")
+# Upsert threads and the number of embedded batches allowed to wait for them
+DEFAULT_UPLOAD_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 8
+# Qdrant's default indexing threshold (KB), restored after a bulk load if the collection had none set
+INDEXING_THRESHOLD = 20000
 
-# 2. Initialize embedding models and Qdrant client
-logger.info("Initializing embedding models and Qdrant client...")
-dense_embed_model = TextEmbedding(model_name=DENSE_MODEL)
-sparse_embed_model = SparseTextEmbedding(model_name=SPARSE_MODEL)
-late_embed_model = LateInteractionTextEmbedding(model_name=LATE_INTERACTION_MODEL)
-client = QdrantClient(url="http://localhost:6333")
-logger.info("Initialization complete.")
+
+# 2. Embedding models and the Qdrant client are loaded on first use, not at import
+model_registry = ModelRegistry()
 
 
 def get_json_files(data_path: Path):
@@ -31,38 +49,503 @@ def get_json_files(data_path: Path):
     return data_path.rglob("*.json")
 
 
-def create_index():
+def iter_chapters(
+    json_files: Iterable[Path], failed_videos: set[str] | None = None
+) -> Iterator[tuple[str, Chapter]]:
+    """
+    Yield (video_id, chapter) pairs from every chapters JSON file, skipping unreadable files.
+
+    Args:
+        json_files: Chapters JSON files, named after their video_id.
+        failed_videos: If given, the video_id of every file that could not be loaded is added to it.
+    """
+    for file_path in json_files:
+        try:
+            with open(file_path, "r") as f:
+                video_analysis = VideoAnalysis(**json.load(f))
+        except json.JSONDecodeError:
+            logger.error(f"Could not decode JSON from {file_path}")
+            if failed_videos is not None:
+                failed_videos.add(file_path.stem)
+            continue
+        except Exception as e:
+            logger.error(f"Could not load chapters from {file_path}: {e}", exc_info=True)
+            if failed_videos is not None:
+                failed_videos.add(file_path.stem)
+            continue
+
+        if not video_analysis.chapters:
+            logger.warning(f"No chapters found in {file_path.name}, skipping.")
+            continue
+        for chapter in video_analysis.chapters:
+            yield video_analysis.video_id, chapter
+
+
+def chapter_point_id(video_id: str, chapter_id: int) -> str:
+    """Deterministic point ID for a chapter, so reindexing overwrites instead of duplicating."""
+    return str(uuid5(POINT_ID_NAMESPACE, f"{video_id}:{chapter_id}"))
+
+
+def chapter_content_hash(chapter: Chapter, bounds: tuple[float, float] | None = None) -> str:
+    """
+    Hash of everything stored for a chapter that affects its vectors or payload.
+
+    Args:
+        chapter: The chapter.
+        bounds: Start and end seconds of its transcript span, when the payload carries one.
+    """
+    digest = hashlib.sha256()
+    for field in (chapter.heading, chapter.content, chapter.timestamp):
+        digest.update(field.encode("utf-8"))
+        digest.update(b"\0")
+    if bounds is not None:
+        digest.update(f"{bounds[0]:.3f}-{bounds[1]:.3f}".encode())
+    return digest.hexdigest()
+
+
+def fetch_indexed_chapters(client: QdrantClient, collection_name: str) -> dict[str, tuple[str | None, str | None]]:
+    """
+    Scroll the collection for the content hash and video_id of every indexed point.
+
+    Returns:
+        A dict mapping point ID to (content_hash, video_id).
+    """
+    indexed = {}
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=["content_hash", "video_id"],
+            with_vectors=False,
+        )
+        for record in records:
+            payload = record.payload or {}
+            indexed[str(record.id)] = (payload.get("content_hash"), payload.get("video_id"))
+        if offset is None:
+            return indexed
+
+
+def select_changed_chapters(
+    chapters: Iterable[tuple[str, Chapter]],
+    indexed: dict[str, tuple[str | None, str | None]],
+    seen_ids: set[str],
+    spans: TranscriptSpans | None = None,
+) -> Iterator[tuple[str, Chapter]]:
+    """
+    Yield only chapters that are new or whose content hash differs from the indexed one.
+
+    The point ID of every chapter, changed or not, is added to `seen_ids`. With `spans`,
+    a chapter whose transcript span moved (e.g. its next chapter did) counts as changed.
+    """
+    for video_id, chapter in chapters:
+        point_id = chapter_point_id(video_id, chapter.chapter_id)
+        seen_ids.add(point_id)
+        indexed_hash, _ = indexed.get(point_id, (None, None))
+        bounds = spans.bounds.get((video_id, chapter.chapter_id)) if spans is not None else None
+        if indexed_hash != chapter_content_hash(chapter, bounds):
+            yield video_id, chapter
+
+
+def embed_documents(
+    models_by_name: dict[str, TextEmbedding | SparseTextEmbedding | LateInteractionTextEmbedding],
+    documents_by_model: dict[str, list[str]],
+) -> tuple[dict[str, list], dict[str, float]]:
+    """
+    Embed each model's documents with that model.
+
+    Returns:
+        A dict of embeddings keyed by model name and a dict of seconds spent in each model.
+    """
+    embeddings = {}
+    timings = {}
+    for model_name, documents in documents_by_model.items():
+        if not documents:
+            embeddings[model_name] = []
+            continue
+        start = time.perf_counter()
+        embeddings[model_name] = list(
+            models_by_name[model_name].passage_embed(documents, batch_size=len(documents))
+        )
+        timings[model_name] = time.perf_counter() - start
+    return embeddings, timings
+
+
+# Models owned by an embedding worker process, set by _init_embedding_worker
+_worker_registry: ModelRegistry | None = None
+
+
+def _init_embedding_worker(threads: int):
+    """Give a worker process its own model sessions, capped at `threads` ONNX threads each."""
+    global _worker_registry
+    _worker_registry = ModelRegistry(threads=threads)
+
+
+def _embed_in_worker(documents_by_model: dict[str, list[str]]) -> tuple[dict[str, list], dict[str, float]]:
+    """Embed a batch using the worker's own model sessions."""
+    assert _worker_registry is not None, "embedding worker was not initialized"
+    models_by_name = {name: _worker_registry.get(name) for name, docs in documents_by_model.items() if docs}
+    return embed_documents(models_by_name, documents_by_model)
+
+
+def _split_cached(
+    documents: list[str], cache: EmbeddingCache | None
+) -> tuple[dict[str, list], dict[str, list[str]]]:
+    """
+    Look a batch up in the embedding cache.
+
+    Returns:
+        The cached embedding (or None) of every document per model, and the documents
+        each model still has to embed.
+    """
+    cached = {}
+    to_embed = {}
+    for model_name in (DENSE_MODEL, SPARSE_MODEL, LATE_INTERACTION_MODEL):
+        hits = cache.get_many(model_name, documents) if cache else [None] * len(documents)
+        cached[model_name] = hits
+        to_embed[model_name] = [doc for doc, hit in zip(documents, hits) if hit is None]
+    return cached, to_embed
+
+
+def _merge_cached(
+    cached: dict[str, list],
+    to_embed: dict[str, list[str]],
+    embedded: dict[str, list],
+    cache: EmbeddingCache | None,
+) -> dict[str, list]:
+    """Fill the cache misses with fresh embeddings and store those in the cache."""
+    merged = {}
+    for model_name, hits in cached.items():
+        fresh = iter(embedded[model_name])
+        merged[model_name] = [hit if hit is not None else next(fresh) for hit in hits]
+        if cache and to_embed[model_name]:
+            cache.put_many(model_name, to_embed[model_name], embedded[model_name])
+    return merged
+
+
+def embed_batches(
+    batches: Iterable[list[tuple[str, Chapter]]],
+    workers: int = 1,
+    cache: EmbeddingCache | None = None,
+    registry: ModelRegistry = model_registry,
+) -> Iterator[tuple[list[tuple[str, Chapter]], dict[str, list], dict[str, float], dict[str, int]]]:
+    """
+    Embed chapter batches, in order, either in-process or spread over worker processes.
+
+    With `workers > 1` each worker process holds its own data-parallel session of every
+    model, and at most two batches per worker are in flight so memory stays bounded.
+    Embeddings found in `cache` are not recomputed, and fresh ones are added to it.
+
+    Yields:
+        (batch, embeddings by model name, seconds spent in each model, chapters embedded
+        by each model) per batch.
+    """
+    if workers <= 1:
+        for batch in batches:
+            cached, to_embed = _split_cached([chapter.content for _, chapter in batch], cache)
+            models_by_name = {name: registry.get(name) for name, docs in to_embed.items() if docs}
+            embedded, timings = embed_documents(models_by_name, to_embed)
+            counts = {name: len(docs) for name, docs in to_embed.items()}
+            yield batch, _merge_cached(cached, to_embed, embedded, cache), timings, counts
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_embedding_worker,
+        initargs=(threads,),
+    ) as executor:
+        pending = deque()
+        for batch in batches:
+            cached, to_embed = _split_cached([chapter.content for _, chapter in batch], cache)
+            pending.append((batch, cached, to_embed, executor.submit(_embed_in_worker, to_embed)))
+            while pending and (len(pending) >= 2 * workers or pending[0][3].done()):
+                batch, cached, to_embed, future = pending.popleft()
+                embedded, timings = future.result()
+                counts = {name: len(docs) for name, docs in to_embed.items()}
+                yield batch, _merge_cached(cached, to_embed, embedded, cache), timings, counts
+        for batch, cached, to_embed, future in pending:
+            embedded, timings = future.result()
+            counts = {name: len(docs) for name, docs in to_embed.items()}
+            yield batch, _merge_cached(cached, to_embed, embedded, cache), timings, counts
+
+
+def compact_late_embeddings(
+    batch: list[tuple[str, Chapter]],
+    late_embeddings: list,
+    storage: MultivectorStorage,
+    registry: ModelRegistry,
+) -> list:
+    """Prune and convert the float32 ColBERT matrices of a batch to the stored format."""
+    if storage.prune_tokens:
+        documents = [chapter.content for _, chapter in batch]
+        late_embeddings = prune_tokens(registry.late, documents, late_embeddings)
+    if storage.datatype == "float32":
+        return late_embeddings
+    return [encode(matrix, storage).tolist() for matrix in late_embeddings]
+
+
+def build_points(
+    batch: list[tuple[str, Chapter]], embeddings: dict[str, list], spans: TranscriptSpans | None = None
+) -> list[PointStruct]:
+    """
+    Create one PointStruct per chapter with its dense, sparse and (unless they are kept in
+    a token store) late-interaction vectors.
+
+    With `spans`, the payload also carries the chapter's end time and transcript text,
+    sliced from the video's cue index.
+    """
+    points = []
+    for idx, (video_id, chapter) in enumerate(batch):
+        bounds = spans.bounds.get((video_id, chapter.chapter_id)) if spans is not None else None
+        payload = {
+            "video_id": video_id,
+            "chapter_id": chapter.chapter_id,
+            "heading": chapter.heading,
+            "content": chapter.content,
+            "timestamp": chapter.timestamp,
+            "content_hash": chapter_content_hash(chapter, bounds),
+        }
+        if spans is not None:
+            payload.update(spans.payload(video_id, chapter.chapter_id))
+
+        vector = {
+            DENSE_MODEL: embeddings[DENSE_MODEL][idx],
+            SPARSE_MODEL: embeddings[SPARSE_MODEL][idx].as_object(),
+        }
+        if LATE_INTERACTION_MODEL in embeddings:
+            vector[LATE_INTERACTION_MODEL] = embeddings[LATE_INTERACTION_MODEL][idx]
+        point = PointStruct(
+            id=chapter_point_id(video_id, chapter.chapter_id),
+            vector=vector, # type: ignore
+            payload=payload,
+        )
+        points.append(point)
+    return points
+
+
+class UpsertPipeline:
+    """
+    Consumer side of the ingest pipeline: upsert threads drain PointStruct batches
+    from a bounded queue with `wait=False`, and `close()` confirms them all at once.
+
+    The queue bound gives backpressure: `put()` blocks while the upsert threads are
+    behind, so embedding never runs more than `queue_size` batches ahead of Qdrant.
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        collection_name: str,
+        workers: int = DEFAULT_UPLOAD_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ):
+        options = client.init_options
+        if workers > 1 and (options.get("location") == ":memory:" or options.get("path") is not None):
+            # Local (in-process) Qdrant is not thread-safe; concurrent upserts corrupt its vector storage
+            logger.info("Local Qdrant: upserting with a single worker.")
+            workers = 1
+        self.client = client
+        self.collection_name = collection_name
+        self.workers = max(1, workers)
+        self.upserted = 0
+        self.upload_seconds = 0.0
+        self._queue: queue.Queue[list[PointStruct] | None] = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._error: Exception | None = None
+        self._last_batch: list[PointStruct] | None = None
+        self._threads = [
+            threading.Thread(target=self._drain, name=f"qdrant-upsert-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _drain(self):
+        while (points := self._queue.get()) is not None:
+            # After a failure keep draining, so the producer is never blocked forever
+            if self._error is None:
+                try:
+                    start = time.perf_counter()
+                    self.client.upsert(
+                        collection_name=self.collection_name,
+                        points=points,
+                        wait=False,
+                    )
+                    with self._lock:
+                        self.upload_seconds += time.perf_counter() - start
+                        self.upserted += len(points)
+                        self._last_batch = points
+                except Exception as e:
+                    logger.error(f"Upsert of {len(points)} points failed: {e}", exc_info=True)
+                    self._error = e
+
+    def put(self, points: list[PointStruct]):
+        """Queue a batch for upsert, blocking while the queue is full."""
+        if self._error is not None:
+            raise RuntimeError("An upsert worker failed; aborting ingest.") from self._error
+        self._queue.put(points)
+
+    def close(self) -> int:
+        """
+        Stop the upsert threads and wait until Qdrant has applied every queued batch.
+
+        Returns:
+            The number of points upserted.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._error is not None:
+            raise RuntimeError("An upsert worker failed; aborting ingest.") from self._error
+
+        # Qdrant applies updates in arrival order, so one synchronous (idempotent) re-upsert
+        # returns only after all of the earlier asynchronous ones have been applied.
+        if self._last_batch is not None:
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=self._last_batch,
+                wait=True,
+            )
+        return self.upserted
+
+
+def log_throughput(
+    chapter_count: int,
+    model_seconds: dict[str, float],
+    model_chapters: dict[str, int],
+    wall_seconds: float,
+    workers: int,
+):
+    """Log chapters per second for each model and for the whole run."""
+    for model_name, embedded in model_chapters.items():
+        # Model time is summed over workers, so divide by the worker count for wall-clock throughput
+        seconds = model_seconds.get(model_name, 0.0)
+        effective_seconds = seconds / max(1, workers)
+        rate = embedded / effective_seconds if effective_seconds else 0.0
+        logger.info(
+            f"{model_name}: {rate:.1f} chapters/s ({embedded} embedded, "
+            f"{chapter_count - embedded} from cache, {seconds:.1f}s model time)"
+        )
+    overall = chapter_count / wall_seconds if wall_seconds else 0.0
+    logger.info(f"Embedded and upserted {chapter_count} chapters in {wall_seconds:.1f}s ({overall:.1f} chapters/s)")
+
+
+def defer_indexing(client: QdrantClient, collection_name: str) -> models.OptimizersConfigDiff:
+    """
+    Turn off HNSW indexing and pause the optimizers for a bulk load.
+
+    Returns:
+        The collection's own optimizer settings, for `resume_indexing` to restore.
+    """
+    config = client.get_collection(collection_name).config.optimizer_config
+    # A config diff cannot set a field back to null, so unset values are restored as their defaults
+    previous = models.OptimizersConfigDiff(
+        indexing_threshold=config.indexing_threshold if config.indexing_threshold is not None else INDEXING_THRESHOLD,
+        max_optimization_threads=(
+            config.max_optimization_threads
+            if config.max_optimization_threads is not None
+            else models.MaxOptimizationThreadsSetting.AUTO
+        ),
+    )
+    # With no optimization threads, segments are neither merged nor indexed until the load is done
+    client.update_collection(
+        collection_name=collection_name,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0, max_optimization_threads=0),
+    )
+    return previous
+
+
+def resume_indexing(client: QdrantClient, collection_name: str, previous: models.OptimizersConfigDiff):
+    """Restore the optimizer settings `defer_indexing` replaced, so the optimizers build the HNSW index."""
+    client.update_collection(collection_name=collection_name, optimizers_config=previous)
+
+
+def wait_for_optimization(
+    client: QdrantClient, collection_name: str, poll_seconds: float = 1.0, timeout: float | None = None
+):
+    """Block until the collection is green, i.e. every segment is optimized and indexed."""
+    start = time.perf_counter()
+    # Give the optimizers a moment to pick up the config change before polling
+    time.sleep(poll_seconds)
+    while client.get_collection(collection_name).status != models.CollectionStatus.GREEN:
+        if timeout is not None and time.perf_counter() - start > timeout:
+            raise TimeoutError(f"Collection '{collection_name}' still optimizing after {timeout:.0f}s")
+        time.sleep(poll_seconds)
+
+
+def create_index(
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
+    cache_max_bytes: int = DEFAULT_MAX_BYTES,
+    registry: ModelRegistry = model_registry,
+    storage: MultivectorStorage = MultivectorStorage(),
+    collection_name: str = COLLECTION_NAME,
+    bulk: bool = False,
+    corpus: CorpusStore | None = None,
+    subtitles_dir: Path | None = DEFAULT_SUBTITLES_DIR,
+    token_store: TokenStore | None = None,
+    chapters_dir: Path = DEFAULT_CHAPTERS_DIR,
+) -> bool:
     """
     Creates a Qdrant index for the Huberman Labs chapters using a hybrid
     approach with dense, sparse, and late-interaction vectors.
+
+    Args:
+        batch_size: Number of chapters per embedding batch; batches span file boundaries.
+        workers: Number of embedding worker processes (1 embeds in-process).
+        upload_workers: Number of threads upserting embedded batches into Qdrant.
+        queue_size: Maximum number of embedded batches waiting to be upserted.
+        cache_dir: Embedding cache checked before calling fastembed; None disables it.
+        cache_max_bytes: Size bound of the embedding cache.
+        registry: Lazily loaded models and Qdrant client to index with.
+        storage: Datatype, quantization and token pruning of the ColBERT multivectors;
+            applied when the collection is created.
+        collection_name: Qdrant collection to build.
+        bulk: Defer HNSW indexing and segment optimization until every point is loaded,
+            then restore the collection's optimizer settings and build the index once.
+        corpus: Read chapters from this columnar store instead of data/chapters/*.json.
+        subtitles_dir: Transcripts whose chapter spans and end times go into the payload;
+            None leaves them out.
+        token_store: Keep the ColBERT token matrices in this memory-mapped store instead of
+            Qdrant, for reranking in-process with MaxSimReranker; the collection is then
+            created without the late-interaction vector.
+        chapters_dir: Directory of chapters JSON files, read unless `corpus` is given.
+
+    Returns:
+        True if the collection is in sync with the chapters; False if a step failed and
+        was logged, in which case rerunning retries it.
     """
-    # 3. Get vector sizes dynamically from the embedding models
-    dense_vector_size = len(next(dense_embed_model.embed("test"))) # type: ignore
-    late_interaction_vector_size = next(late_embed_model.embed("test")).shape[1] # type: ignore
+    client = registry.client
+
+    # 3. Get vector sizes from model metadata, without loading the models
+    dense_vector_size = registry.vector_size(DENSE_MODEL)
+    late_interaction_vector_size = registry.vector_size(LATE_INTERACTION_MODEL)
 
     # 4. Check if the collection already exists
     try:
-        if client.collection_exists(collection_name=COLLECTION_NAME):
-            logger.info(f"Collection '{COLLECTION_NAME}' already exists. Skipping creation.")
+        if client.collection_exists(collection_name=collection_name):
+            logger.info(f"Collection '{collection_name}' already exists. Skipping creation.")
         else:
             # 5. Create the Qdrant collection if it doesn't exist
-            logger.info(f"Collection '{COLLECTION_NAME}' does not exist. Creating...")
+            logger.info(f"Collection '{collection_name}' does not exist. Creating...")
+            vectors_config = {
+                DENSE_MODEL: models.VectorParams(
+                    size=dense_vector_size,
+                    distance=models.Distance.COSINE,
+                ),
+            }
+            if token_store is None:
+                vectors_config[LATE_INTERACTION_MODEL] = vector_params(storage, late_interaction_vector_size)
             client.create_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config={
-                    DENSE_MODEL: models.VectorParams(
-                        size=dense_vector_size,
-                        distance=models.Distance.COSINE,
-                    ),
-                    LATE_INTERACTION_MODEL: models.VectorParams(
-                        size=late_interaction_vector_size,
-                        distance=models.Distance.COSINE,
-                        multivector_config=models.MultiVectorConfig(
-                            comparator=models.MultiVectorComparator.MAX_SIM,
-                        ),
-                        hnsw_config=models.HnswConfigDiff(m=0),  # Disable HNSW for reranking
-                    ),
-                },
+                collection_name=collection_name,
+                vectors_config=vectors_config,
                 sparse_vectors_config={
                     SPARSE_MODEL: models.SparseVectorParams(modifier=models.Modifier.IDF)
                 },
@@ -70,77 +553,234 @@ def create_index():
             logger.info("Collection created successfully.")
     except Exception as e:
         logger.error(f"Could not check or create collection: {e}", exc_info=True)
-        return
+        return False
 
-    # 6. Get all json files from the chapters directory
-    chapters_path = Path("data/chapters")
-    json_files = list(get_json_files(chapters_path))
-    total_files = len(json_files)
-    logger.info(f"Found {total_files} JSON files to process.")
-
-    # 7. Process each JSON file and upsert data in batches
-    for i, file_path in enumerate(json_files):
-        logger.info(f"Processing file {i + 1}/{total_files}: {file_path.name}")
+    # 6. In bulk mode, stop indexing while points stream in so the graph is built once
+    if bulk:
+        phase_start = time.perf_counter()
         try:
-            with open(file_path, "r") as f:
-                video_analysis = VideoAnalysis(**json.load(f))
+            previous_optimizers = defer_indexing(client, collection_name)
+        except Exception as e:
+            logger.error(f"Could not defer indexing: {e}", exc_info=True)
+            return False
+        logger.info(f"Bulk load: indexing deferred in {time.perf_counter() - phase_start:.1f}s.")
 
-            documents = [chapter.content for chapter in video_analysis.chapters]
-            if not documents:
-                logger.warning(f"No chapters found in {file_path.name}, skipping.")
-                continue
-
-            # 8. Generate all embeddings for the file's chapters
-            logger.info(f"Generating embeddings for {len(documents)} chapters...")
-            dense_embeddings = list(dense_embed_model.passage_embed(documents))
-            sparse_embeddings = list(sparse_embed_model.passage_embed(documents))
-            late_embeddings = list(late_embed_model.passage_embed(documents))
-            logger.info("Embeddings generated.")
-
-            # 9. Create PointStructs for batch upsert
-            points_to_upsert = []
-            for idx, chapter in enumerate(video_analysis.chapters):
-                payload = {
-                    "video_id": video_analysis.video_id,
-                    "chapter_id": chapter.chapter_id,
-                    "heading": chapter.heading,
-                    "content": chapter.content,
-                    "timestamp": chapter.timestamp,
-                }
-
-                point = PointStruct(
-                    id=uuid4().hex,  # Use a unique ID for each point
-                    vector={
-                        DENSE_MODEL: dense_embeddings[idx],
-                        SPARSE_MODEL: sparse_embeddings[idx].as_object(),
-                        LATE_INTERACTION_MODEL: late_embeddings[idx],
-                    }, # type: ignore
-                    payload=payload,
-                )
-                points_to_upsert.append(point)
-
-            # 10. Upsert all points for the current file in a single batch
-            if points_to_upsert:
-                logger.info(f"Upserting {len(points_to_upsert)} points...")
-                client.upsert(
-                    collection_name=COLLECTION_NAME,
-                    points=points_to_upsert,
-                    wait=True,
+    phase_start = time.perf_counter()
+    synced = False
+    try:
+        synced = sync_chapters(
+            registry,
+            collection_name,
+            batch_size=batch_size,
+            workers=workers,
+            upload_workers=upload_workers,
+            queue_size=queue_size,
+            cache_dir=cache_dir,
+            cache_max_bytes=cache_max_bytes,
+            storage=storage,
+            corpus=corpus,
+            subtitles_dir=subtitles_dir,
+            token_store=token_store,
+            chapters_dir=chapters_dir,
+        )
+    finally:
+        if bulk:
+            logger.info(f"Bulk load: points loaded in {time.perf_counter() - phase_start:.1f}s.")
+            # 7. Re-enable indexing and wait for the optimizers to build the index
+            phase_start = time.perf_counter()
+            try:
+                resume_indexing(client, collection_name, previous_optimizers)
+                wait_for_optimization(client, collection_name)
+                logger.info(f"Bulk load: index built in {time.perf_counter() - phase_start:.1f}s.")
+            except Exception as e:
+                logger.error(f"Could not rebuild the index after bulk load: {e}", exc_info=True)
+                synced = False
+    logger.info(f"Startup timings: {registry.startup_report()['loads']}")
+    return synced
+
+
+def sync_chapters(
+    registry: ModelRegistry,
+    collection_name: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
+    cache_max_bytes: int = DEFAULT_MAX_BYTES,
+    storage: MultivectorStorage = MultivectorStorage(),
+    corpus: CorpusStore | None = None,
+    subtitles_dir: Path | None = DEFAULT_SUBTITLES_DIR,
+    token_store: TokenStore | None = None,
+    chapters_dir: Path = DEFAULT_CHAPTERS_DIR,
+) -> bool:
+    """
+    Embed and upsert new or changed chapters from `chapters_dir` (or a corpus store) into
+    an existing collection, and delete the points of chapters that disappeared.
+
+    Chapters whose transcript is in `subtitles_dir` get its span in their payload
+    (None disables this). With a `token_store`, ColBERT matrices are written there
+    instead of to Qdrant, and chapters missing from it are re-embedded.
+
+    Returns:
+        True if every chapter was upserted and removed chapters were deleted.
+    """
+    client = registry.client
+
+    # 1. Get all json files from the chapters directory, unless chapters come from the corpus store
+    if corpus is None:
+        json_files = list(get_json_files(chapters_dir))
+        total_files = len(json_files)
+        logger.info(f"Found {total_files} JSON files to process.")
+    else:
+        logger.info(f"Reading chapters from the corpus store at {corpus.root}.")
+
+    # 2. Look up what is already indexed so only new or changed chapters are embedded
+    try:
+        indexed = fetch_indexed_chapters(client, collection_name)
+    except Exception as e:
+        logger.error(f"Could not read indexed chapters: {e}", exc_info=True)
+        return False
+    logger.info(f"Collection holds {len(indexed)} indexed chapters.")
+    seen_ids: set[str] = set()
+    failed_videos: set[str] = set()
+    source = iter_chapters(json_files, failed_videos) if corpus is None else iter_store_chapters(corpus)
+    spans = TranscriptSpans(subtitles_dir) if subtitles_dir is not None else None
+    if spans is not None:
+        source = spans.annotate(source)
+    if token_store is not None:
+        current = {point_id: entry for point_id, entry in indexed.items() if point_id in token_store}
+    else:
+        current = indexed
+    chapters = select_changed_chapters(source, current, seen_ids, spans)
+
+    # 3. Stream chapters from all files into fixed-size batches and embed them, skipping
+    #    cached embeddings, while upsert threads drain the batches into Qdrant concurrently
+    cache = None
+    if cache_dir is not None:
+        cache = EmbeddingCache(cache_dir, max_bytes=cache_max_bytes)
+        cache.add_model(DENSE_MODEL, registry.vector_size(DENSE_MODEL))
+        cache.add_model(
+            LATE_INTERACTION_MODEL, registry.vector_size(LATE_INTERACTION_MODEL), multivector=True
+        )
+    start = time.perf_counter()
+    chapter_count = 0
+    model_seconds: dict[str, float] = defaultdict(float)
+    model_chapters: dict[str, int] = defaultdict(int)
+    batches = (list(batch) for batch in batched(chapters, batch_size))
+    pipeline = UpsertPipeline(
+        client, collection_name, workers=upload_workers, queue_size=queue_size
+    )
+    ingest_complete = False
+    try:
+        for batch, embeddings, timings, counts in embed_batches(
+            batches, workers=workers, cache=cache, registry=registry
+        ):
+            for model_name, seconds in timings.items():
+                model_seconds[model_name] += seconds
+            for model_name, count in counts.items():
+                model_chapters[model_name] += count
+            if token_store is not None:
+                late_embeddings = embeddings.pop(LATE_INTERACTION_MODEL)
+                if storage.prune_tokens:
+                    documents = [chapter.content for _, chapter in batch]
+                    late_embeddings = prune_tokens(registry.late, documents, late_embeddings)
+                point_ids = [chapter_point_id(video_id, chapter.chapter_id) for video_id, chapter in batch]
+                token_store.put_many(point_ids, late_embeddings)
+            else:
+                embeddings[LATE_INTERACTION_MODEL] = compact_late_embeddings(
+                    batch, embeddings[LATE_INTERACTION_MODEL], storage, registry
                 )
-                logger.info(f"Successfully upserted points from {file_path.name}")
+            pipeline.put(build_points(batch, embeddings, spans))
+            chapter_count += len(batch)
+            logger.info(f"Embedded {chapter_count} chapters so far.")
+        ingest_complete = True
+    except Exception as e:
+        logger.error(f"An error occurred while indexing chapters: {e}", exc_info=True)
+    finally:
+        if cache is not None:
+            cache.prune()
+            cache.close()
 
-        except json.JSONDecodeError:
-            logger.error(f"Could not decode JSON from {file_path}")
-        except Exception as e:
-            logger.error(
-                f"An error occurred while processing {file_path}: {e}", exc_info=True
+    # 4. Confirm every asynchronous upsert once, at the end
+    try:
+        chapter_count = pipeline.close()
+    except Exception as e:
+        logger.error(f"Could not confirm upserts: {e}", exc_info=True)
+        return False
+    logger.info(f"Upsert time {pipeline.upload_seconds:.1f}s across {pipeline.workers} worker(s).")
+    logger.info(f"{chapter_count} new or changed chapters, {len(seen_ids) - chapter_count} unchanged.")
+    log_throughput(chapter_count, model_seconds, model_chapters, time.perf_counter() - start, workers)
+
+    # 5. Delete points whose chapters disappeared, keeping those of files that failed to load
+    if not ingest_complete:
+        logger.warning("Ingest did not finish; not deleting any points.")
+        return False
+    stale_ids = [
+        point_id
+        for point_id, (_, video_id) in indexed.items()
+        if point_id not in seen_ids and video_id not in failed_videos
+    ]
+    if stale_ids:
+        try:
+            client.delete(
+                collection_name=collection_name,
+                points_selector=models.PointIdsList(points=stale_ids),  # type: ignore
+                wait=True,
             )
+            if token_store is not None:
+                token_store.delete_many(stale_ids)
+            logger.info(f"Deleted {len(stale_ids)} points for removed chapters.")
+        except Exception as e:
+            logger.error(f"Could not delete removed chapters: {e}", exc_info=True)
+            return False
+    return True
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the huberman_clips Qdrant index.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Chapters per embedding batch.")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding worker processes.")
+    parser.add_argument("--upload-workers", type=int, default=DEFAULT_UPLOAD_WORKERS, help="Qdrant upsert threads.")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR, help="Embedding cache directory.")
+    parser.add_argument("--no-cache", action="store_true", help="Always recompute embeddings.")
+    parser.add_argument("--collection", default=COLLECTION_NAME, help="Qdrant collection to build.")
+    parser.add_argument("--colbert-datatype", choices=["float32", "float16"], default="float32", help="Element type of stored ColBERT vectors.")
+    parser.add_argument("--colbert-quantization", action="store_true", help="Scalar-quantize ColBERT vectors (int8 in RAM, originals on disk).")
+    parser.add_argument("--prune-tokens", action="store_true", help="Drop stopword and punctuation ColBERT token vectors.")
+    parser.add_argument("--bulk", action="store_true", help="Defer indexing until all points are loaded.")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Embedded batches allowed to wait for upsert.")
+    parser.add_argument("--corpus", type=Path, default=None, help="Read chapters from this corpus store directory.")
+    parser.add_argument("--no-transcript-spans", action="store_true", help="Leave transcript spans out of the payload.")
+    parser.add_argument("--colbert-tokens", type=Path, default=None, help="Keep ColBERT vectors in this token store directory instead of Qdrant.")
+    args = parser.parse_args()
+
     log_path = Path("logs")
     log_path.mkdir(exist_ok=True)
     logger.add(
         log_path / "create_qdrant_index.log", rotation="10 MB", level="INFO"
     )
-    create_index()
+    synced = create_index(
+        batch_size=args.batch_size,
+        workers=args.workers,
+        upload_workers=args.upload_workers,
+        queue_size=args.queue_size,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        storage=MultivectorStorage(
+            datatype=args.colbert_datatype,
+            quantization=args.colbert_quantization,
+            prune_tokens=args.prune_tokens,
+        ),
+        collection_name=args.collection,
+        bulk=args.bulk,
+        corpus=CorpusStore(args.corpus) if args.corpus else None,
+        subtitles_dir=None if args.no_transcript_spans else DEFAULT_SUBTITLES_DIR,
+        token_store=(
+            TokenStore(args.colbert_tokens, model_registry.vector_size(LATE_INTERACTION_MODEL))
+            if args.colbert_tokens else None
+        ),
+    )
+    if not synced:
+        raise SystemExit(1)
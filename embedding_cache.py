@@ -0,0 +1,397 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import fastembed
+import numpy as np
+from loguru import logger
+
+# Default location of the cache, relative to the project root
+DEFAULT_CACHE_DIR = Path("cache/embeddings")
+# Default size bound across all models, in bytes
+DEFAULT_MAX_BYTES = 20 * 1024**3
+
+
+def text_sha(text: str) -> str:
+    """SHA-256 hex digest of a text, used as its cache key."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def default_model_version() -> str:
+    """Version tag for cached embeddings; a fastembed upgrade may change model outputs."""
+    return f"fastembed-{fastembed.__version__}"
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "__", value)
+
+
+class EmbeddingStore:
+    """
+    Persistent float32 embeddings for one (model name, model version), keyed by text SHA.
+
+    Every embedding is stored as a (rows, dim) matrix appended to a single flat
+    `vectors*.f32` file that is read through a memory map. Dense models store one row
+    per text, so the file is a plain (N, dim) array; late-interaction models store one
+    row per token, so the file is a ragged array and the SQLite index holds each
+    entry's row offset and row count. The index also names the current vectors file
+    and how many of its rows are committed: appended rows count only once the entries
+    pointing at them commit, and anything past that count (an append that never
+    committed, a partial row) is cut off on open. Compaction writes a new file and
+    switches to it in the same transaction that rewrites the offsets.
+    """
+
+    def __init__(self, root: Path, model_name: str, model_version: str, dim: int, multivector: bool):
+        self.model_name = model_name
+        self.model_version = model_version
+        self.dim = dim
+        self.multivector = multivector
+        self.path = Path(root) / _slug(model_name) / _slug(model_version)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path / "index.sqlite")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                text_sha TEXT PRIMARY KEY,
+                row_offset INTEGER NOT NULL,
+                row_count INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._db.executemany(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("model_name", model_name),
+                ("model_version", model_version),
+                ("dim", str(dim)),
+                ("multivector", str(int(multivector))),
+                ("vectors_file", "vectors.f32"),
+            ],
+        )
+        self._db.commit()
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if int(meta["dim"]) != dim:
+            raise ValueError(f"Cache at {self.path} holds {meta['dim']}-dim vectors, expected {dim}")
+        self.vectors_path = self.path / meta["vectors_file"]
+        self.vectors_path.touch(exist_ok=True)
+        row_bytes = 4 * dim
+        if "committed_rows" not in meta:
+            # Stores written before the count was kept: every whole row on disk is committed
+            meta["committed_rows"] = str(self.nbytes // row_bytes)
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO meta (key, value) VALUES ('committed_rows', ?)", (meta["committed_rows"],)
+                )
+        self._committed_rows = int(meta["committed_rows"])
+        if self.nbytes > self._committed_rows * row_bytes:
+            logger.warning(f"Dropping {self.nbytes - self._committed_rows * row_bytes} uncommitted bytes from {self.vectors_path}")
+            os.truncate(self.vectors_path, self._committed_rows * row_bytes)
+        self._memmap: np.memmap | None = None
+        self._mapped_rows = 0
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the vectors file on disk."""
+        return self.vectors_path.stat().st_size
+
+    def _rows(self) -> np.memmap:
+        """Memory map of the committed rows, remapped when more have been committed since the last read."""
+        total_rows = self._committed_rows
+        if self._memmap is None or self._mapped_rows != total_rows:
+            self._memmap = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(total_rows, self.dim)
+            )
+            self._mapped_rows = total_rows
+        return self._memmap
+
+    def get_many(self, texts: Sequence[str]) -> list[np.ndarray | None]:
+        """Cached embedding for each text, or None where it is missing."""
+        if not texts:
+            return []
+        shas = [text_sha(text) for text in texts]
+        found = {}
+        unique_shas = list(set(shas))
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(unique_shas), 500):
+            chunk = unique_shas[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for sha, offset, count in self._db.execute(
+                f"SELECT text_sha, row_offset, row_count FROM entries WHERE text_sha IN ({placeholders})",
+                chunk,
+            ):
+                found[sha] = (offset, count)
+        if not found:
+            return [None] * len(texts)
+
+        rows = self._rows()
+        results: list[np.ndarray | None] = []
+        for sha in shas:
+            if sha not in found:
+                results.append(None)
+                continue
+            offset, count = found[sha]
+            matrix = np.array(rows[offset : offset + count])
+            results.append(matrix if self.multivector else matrix[0])
+
+        self._db.executemany(
+            "UPDATE entries SET last_used = ? WHERE text_sha = ?",
+            [(time.time(), sha) for sha in found],
+        )
+        self._db.commit()
+        return results
+
+    def put_many(self, texts: Sequence[str], embeddings: Iterable[np.ndarray]):
+        """Append embeddings for texts that are not cached yet."""
+        now = time.time()
+        offset = self._committed_rows
+        entries = []
+        pending: set[str] = set()
+        with open(self.vectors_path, "r+b") as f:
+            # Overwrite whatever an earlier put_many appended but did not commit
+            f.seek(offset * 4 * self.dim)
+            f.truncate()
+            for text, embedding in zip(texts, embeddings):
+                sha = text_sha(text)
+                if sha in pending or self._db.execute(
+                    "SELECT 1 FROM entries WHERE text_sha = ?", (sha,)
+                ).fetchone():
+                    continue
+                matrix = np.asarray(embedding, dtype=np.float32).reshape(-1, self.dim)
+                f.write(matrix.tobytes())
+                entries.append((sha, offset, len(matrix), now))
+                pending.add(sha)
+                offset += len(matrix)
+            if not entries:
+                return
+            f.flush()
+            os.fsync(f.fileno())
+        # The rows are on disk before the entries and the count that make them visible commit
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO entries (text_sha, row_offset, row_count, last_used) VALUES (?, ?, ?, ?)",
+                entries,
+            )
+            self._db.execute("UPDATE meta SET value = ? WHERE key = 'committed_rows'", (str(offset),))
+        self._committed_rows = offset
+
+    def prune(self, max_bytes: int) -> int:
+        """
+        Evict least recently used entries until the vectors file fits in `max_bytes`,
+        then compact the file.
+
+        Returns:
+            The number of evicted entries.
+        """
+        if self.nbytes <= max_bytes:
+            return 0
+        row_bytes = 4 * self.dim
+        kept = []
+        used = 0
+        for sha, offset, count, last_used in self._db.execute(
+            "SELECT text_sha, row_offset, row_count, last_used FROM entries ORDER BY last_used DESC"
+        ):
+            size = count * row_bytes
+            if used + size > max_bytes:
+                continue
+            kept.append((sha, offset, count, last_used))
+            used += size
+        evicted = len(self) - len(kept)
+
+        # Rewrite the surviving rows, in their original order, into a fresh file
+        rows = self._rows()
+        compacted_path = self.path / f"vectors.{time.time_ns()}.f32"
+        new_entries = []
+        new_offset = 0
+        with open(compacted_path, "wb") as f:
+            for sha, offset, count, last_used in sorted(kept, key=lambda entry: entry[1]):
+                f.write(np.asarray(rows[offset : offset + count]).tobytes())
+                new_entries.append((sha, new_offset, count, last_used))
+                new_offset += count
+            f.flush()
+            os.fsync(f.fileno())
+        # Offsets and file name change in one transaction: until it commits, the index
+        # still describes the old file, which stays untouched, so a crash never pairs
+        # the offsets of one file with the rows of the other
+        with self._db:
+            self._db.execute("DELETE FROM entries")
+            self._db.executemany(
+                "INSERT INTO entries (text_sha, row_offset, row_count, last_used) VALUES (?, ?, ?, ?)",
+                new_entries,
+            )
+            self._db.execute("UPDATE meta SET value = ? WHERE key = 'vectors_file'", (compacted_path.name,))
+            self._db.execute("UPDATE meta SET value = ? WHERE key = 'committed_rows'", (str(new_offset),))
+        self._memmap = None
+        self.vectors_path = compacted_path
+        self._committed_rows = new_offset
+        # The old file, and any left behind by an interrupted compaction
+        for stale_path in self.path.glob("vectors*.f32"):
+            if stale_path != self.vectors_path:
+                stale_path.unlink()
+        return evicted
+
+    def stats(self) -> dict:
+        """Entry count, stored rows, bytes on disk and access-time range."""
+        entries, rows, oldest, newest = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(row_count), 0), MIN(last_used), MAX(last_used) FROM entries"
+        ).fetchone()
+        return {
+            "model_name": self.model_name,
+            "model_version": self.model_version,
+            "dim": self.dim,
+            "entries": entries,
+            "rows": rows,
+            "bytes": self.nbytes,
+            "oldest_use": oldest,
+            "newest_use": newest,
+        }
+
+    def close(self):
+        self._memmap = None
+        self._db.close()
+
+
+class EmbeddingCache:
+    """
+    Embedding stores for the dense and late-interaction models, sharing one size bound.
+
+    Sparse BM25 embeddings are cheap to recompute and are not cached.
+    """
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        model_version: str | None = None,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.model_version = model_version or default_model_version()
+        self.stores: dict[str, EmbeddingStore] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add_model(self, model_name: str, dim: int, multivector: bool = False) -> EmbeddingStore:
+        """Open (or create) the store for a model."""
+        store = EmbeddingStore(self.root, model_name, self.model_version, dim, multivector)
+        self.stores[model_name] = store
+        return store
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> list[np.ndarray | None]:
+        """Cached embeddings for a model; all None if the model is not cached."""
+        if model_name not in self.stores:
+            return [None] * len(texts)
+        results = self.stores[model_name].get_many(texts)
+        hits = sum(result is not None for result in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model_name: str, texts: Sequence[str], embeddings: Iterable[np.ndarray]):
+        if model_name in self.stores:
+            self.stores[model_name].put_many(texts, embeddings)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(store.nbytes for store in self.stores.values())
+
+    def prune(self, max_bytes: int | None = None) -> int:
+        """
+        Shrink the stores to fit `max_bytes` in total (the cache bound by default),
+        splitting the budget in proportion to each store's current size.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        total = self.nbytes
+        if total <= max_bytes:
+            return 0
+        evicted = 0
+        for store in self.stores.values():
+            share = int(max_bytes * store.nbytes / total)
+            evicted += store.prune(share)
+        logger.info(f"Evicted {evicted} cached embeddings to fit {max_bytes / 1024**2:.0f} MB.")
+        return evicted
+
+    def close(self):
+        for store in self.stores.values():
+            store.close()
+
+
+def open_stores(root: Path = DEFAULT_CACHE_DIR) -> list[EmbeddingStore]:
+    """Open every store found under `root`, whatever model and version it belongs to."""
+    stores = []
+    for index_path in sorted(Path(root).glob("*/*/index.sqlite")):
+        with sqlite3.connect(index_path) as db:
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+        stores.append(
+            EmbeddingStore(
+                root,
+                meta["model_name"],
+                meta["model_version"],
+                int(meta["dim"]),
+                bool(int(meta["multivector"])),
+            )
+        )
+    return stores
+
+
+def warm_cache(cache: EmbeddingCache, chapters_dir: Path, batch_size: int = 64):
+    """Embed every chapter in `chapters_dir` that is not cached yet."""
+    from create_qdrant_index import get_json_files, iter_chapters
+    from embedding_models import DENSE_MODEL, LATE_INTERACTION_MODEL, ModelRegistry
+
+    registry = ModelRegistry()
+    documents = list(dict.fromkeys(chapter.content for _, chapter in iter_chapters(get_json_files(chapters_dir))))
+    logger.info(f"Found {len(documents)} distinct chapters in {chapters_dir}.")
+    for model_name, multivector in ((DENSE_MODEL, False), (LATE_INTERACTION_MODEL, True)):
+        store = cache.stores.get(model_name) or cache.add_model(
+            model_name, registry.vector_size(model_name), multivector
+        )
+        missing = [doc for doc, hit in zip(documents, store.get_many(documents)) if hit is None]
+        logger.info(f"{model_name}: {len(documents) - len(missing)} cached, {len(missing)} to embed.")
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            store.put_many(batch, registry.get(model_name).passage_embed(batch, batch_size=len(batch)))
+    cache.prune()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Warm, inspect or prune the embedding cache.")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    warm_parser = subparsers.add_parser("warm", help="Embed every chapter that is not cached yet.")
+    warm_parser.add_argument("--chapters-dir", type=Path, default=Path("data/chapters"))
+    warm_parser.add_argument("--max-gb", type=float, default=DEFAULT_MAX_BYTES / 1024**3)
+    subparsers.add_parser("info", help="Show entries and size per cached model.")
+    prune_parser = subparsers.add_parser("prune", help="Evict least recently used entries.")
+    prune_parser.add_argument("--max-gb", type=float, required=True)
+    args = parser.parse_args()
+
+    if args.command == "warm":
+        cache = EmbeddingCache(args.cache_dir, max_bytes=int(args.max_gb * 1024**3))
+        warm_cache(cache, args.chapters_dir)
+        cache.close()
+    elif args.command == "info":
+        for store in open_stores(args.cache_dir):
+            stats = store.stats()
+            logger.info(
+                f"{stats['model_name']} ({stats['model_version']}): {stats['entries']} entries, "
+                f"{stats['rows']} rows x {stats['dim']} dims, {stats['bytes'] / 1024**2:.1f} MB"
+            )
+            store.close()
+    elif args.command == "prune":
+        cache = EmbeddingCache(args.cache_dir, max_bytes=int(args.max_gb * 1024**3))
+        for store in open_stores(args.cache_dir):
+            cache.stores[f"{store.model_name}/{store.model_version}"] = store
+        cache.prune()
+        cache.close()
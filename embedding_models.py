@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from fastembed import LateInteractionTextEmbedding, SparseTextEmbedding, TextEmbedding
+from loguru import logger
+from qdrant_client import QdrantClient
+
+DENSE_MODEL = "jinaai/jina-embeddings-v2-base-en"
+SPARSE_MODEL = "Qdrant/bm25"
+LATE_INTERACTION_MODEL = "jinaai/jina-colbert-v2"
+
+MODEL_CLASSES = {
+    DENSE_MODEL: TextEmbedding,
+    SPARSE_MODEL: SparseTextEmbedding,
+    LATE_INTERACTION_MODEL: LateInteractionTextEmbedding,
+}
+
+DEFAULT_QDRANT_URL = "http://localhost:6333"
+# Vector sizes that had to be measured by inference, kept so that happens only once
+VECTOR_SIZES_PATH = Path("cache/vector_sizes.json")
+
+
+class ModelRegistry:
+    """
+    Embedding models and Qdrant client that are created on first use.
+
+    Creating a registry is free; each model's ONNX session is loaded the first time
+    it is requested, and the time every load took is kept for `startup_report()`.
+    Loading is locked, so threads that hit the first use together share one load.
+    """
+
+    def __init__(
+        self,
+        qdrant_url: str | None = DEFAULT_QDRANT_URL,
+        qdrant_location: str | None = None,
+        threads: int | None = None,
+    ):
+        """
+        Args:
+            qdrant_url: URL of the Qdrant server.
+            qdrant_location: Local Qdrant instead of a server, ':memory:' or a directory path.
+            threads: ONNX threads per model (None lets onnxruntime decide).
+        """
+        self.qdrant_url = qdrant_url
+        self.qdrant_location = qdrant_location
+        self.threads = threads
+        self.created_at = time.perf_counter()
+        self.load_seconds: dict[str, float] = {}
+        self._models: dict = {}
+        self._client: QdrantClient | None = None
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str) -> TextEmbedding | SparseTextEmbedding | LateInteractionTextEmbedding:
+        """Return a model, loading it on first use."""
+        if model_name not in self._models:
+            with self._lock:
+                if model_name not in self._models:
+                    logger.info(f"Loading embedding model {model_name}...")
+                    start = time.perf_counter()
+                    self._models[model_name] = MODEL_CLASSES[model_name](model_name=model_name, threads=self.threads)
+                    self.load_seconds[model_name] = time.perf_counter() - start
+                    logger.info(f"Loaded {model_name} in {self.load_seconds[model_name]:.2f}s.")
+        return self._models[model_name]
+
+    @property
+    def dense(self) -> TextEmbedding:
+        return self.get(DENSE_MODEL)  # type: ignore
+
+    @property
+    def sparse(self) -> SparseTextEmbedding:
+        return self.get(SPARSE_MODEL)  # type: ignore
+
+    @property
+    def late(self) -> LateInteractionTextEmbedding:
+        return self.get(LATE_INTERACTION_MODEL)  # type: ignore
+
+    @property
+    def client(self) -> QdrantClient:
+        """Qdrant client, connected on first use."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    start = time.perf_counter()
+                    if self.qdrant_location == ":memory:":
+                        client = QdrantClient(location=":memory:")
+                    elif self.qdrant_location is not None:
+                        client = QdrantClient(path=self.qdrant_location)
+                    else:
+                        client = QdrantClient(url=self.qdrant_url)
+                    self.load_seconds["qdrant_client"] = time.perf_counter() - start
+                    self._client = client
+        return self._client
+
+    def vector_size(self, model_name: str) -> int:
+        """
+        Size of a dense or per-token vector, read from fastembed's model metadata.
+
+        Models without a listed size are measured by embedding one text, once; the
+        result is saved to VECTOR_SIZES_PATH for later runs.
+        """
+        for description in MODEL_CLASSES[model_name].list_supported_models():
+            if description["model"] == model_name and description.get("dim"):
+                return int(description["dim"])
+
+        sizes = json.loads(VECTOR_SIZES_PATH.read_text()) if VECTOR_SIZES_PATH.exists() else {}
+        if model_name not in sizes:
+            embedding = next(iter(self.get(model_name).embed(["test"])))
+            sizes[model_name] = int(embedding.shape[-1])
+            VECTOR_SIZES_PATH.parent.mkdir(parents=True, exist_ok=True)
+            VECTOR_SIZES_PATH.write_text(json.dumps(sizes, indent=2))
+        return sizes[model_name]
+
+    def startup_report(self) -> dict:
+        """Seconds spent loading each model and connecting the client so far."""
+        return {
+            "loads": dict(self.load_seconds),
+            "total_load_seconds": sum(self.load_seconds.values()),
+            "seconds_since_created": time.perf_counter() - self.created_at,
+        }
+
+
+def measure_cold_start(registry: ModelRegistry) -> dict:
+    """Load every model and run one query through each, timing both steps."""
+    first_embedding = {}
+    for model_name in MODEL_CLASSES:
+        model = registry.get(model_name)
+        start = time.perf_counter()
+        next(iter(model.query_embed("cold start")))
+        first_embedding[model_name] = time.perf_counter() - start
+    report = registry.startup_report()
+    report["first_query_seconds"] = first_embedding
+    return report
+
+
+if __name__ == "__main__":
+    # Run in a fresh interpreter so the numbers are a true cold start
+    import_start = time.perf_counter()
+    import create_qdrant_index  # noqa: F401
+
+    import_seconds = time.perf_counter() - import_start
+    report = measure_cold_start(ModelRegistry())
+    report["import_create_qdrant_index_seconds"] = import_seconds
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,238 @@
+import json
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from pydantic import BaseModel, ValidationError
+
+from gemini_chat_completion import GeminiChat
+from prompt_inputs import chapters_input_data, load_prompt_config, questions_input_data
+from pydantic_models import RAGQuestionSet, VideoAnalysis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD_SIZE = 500
+# The batch service accepts input files up to 2 GB; stay well below it
+DEFAULT_MAX_SHARD_BYTES = 1_000_000_000
+BATCHES_DIR = Path("data/batches")
+
+
+class BatchTask(BaseModel):
+    """One kind of batch job: which prompts render which inputs into which outputs."""
+    name: str
+    prompts_dir: str
+    input_dir: Path
+    input_glob: str
+    output_dir: Path
+
+    @property
+    def requests_dir(self) -> Path:
+        return BATCHES_DIR / self.name / "requests"
+
+    @property
+    def retry_path(self) -> Path:
+        return BATCHES_DIR / self.name / "retry.jsonl"
+
+
+TASKS = {
+    "chapters": BatchTask(
+        name="chapters",
+        prompts_dir="prompts/chapters_extractor_prompts/json_chapters",
+        input_dir=Path("data/subtitles"),
+        input_glob="*.srt",
+        output_dir=Path("data/chapters"),
+    ),
+    "questions": BatchTask(
+        name="questions",
+        prompts_dir="prompts/question_creation_prompts",
+        input_dir=Path("data/chapters"),
+        input_glob="*.json",
+        output_dir=Path("data/questions"),
+    ),
+}
+TASK_MODELS: dict[str, type[BaseModel]] = {"chapters": VideoAnalysis, "questions": RAGQuestionSet}
+
+
+class CollectSummary(BaseModel):
+    """Outcome counts of collecting batch results."""
+    written: int = 0
+    failed: int = 0
+
+
+def task_chat(task: BatchTask) -> GeminiChat:
+    """GeminiChat configured for a task; it only creates a client if a request is sent interactively."""
+    return GeminiChat(task.prompts_dir, output_type="structured", pydantic_model=TASK_MODELS[task.name])
+
+
+def pending_inputs(task: BatchTask, keys: set[str] | None = None) -> Iterator[tuple[str, dict]]:
+    """
+    Yield (video_id, prompt variables) for every input without an output yet.
+
+    Args:
+        task: The batch task.
+        keys: Restrict to these video IDs (e.g. the retry queue).
+    """
+    config = load_prompt_config(task.prompts_dir)
+    for path in sorted(task.input_dir.glob(task.input_glob)):
+        video_id = path.stem
+        if keys is not None and video_id not in keys:
+            continue
+        if (task.output_dir / f"{video_id}.json").exists():
+            continue
+        if task.name == "chapters":
+            yield video_id, chapters_input_data(path, config)
+            continue
+        try:
+            chapters_data = json.loads(path.read_text(encoding='utf-8'))
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON in {path}. Skipping.")
+            continue
+        if not chapters_data or "chapters" not in chapters_data:
+            logger.warning(f"No valid chapters data found in {path}.")
+            continue
+        yield video_id, questions_input_data(chapters_data, config)
+
+
+def write_batch_requests(
+    chat: GeminiChat,
+    items: Iterable[tuple[str, dict]],
+    requests_dir: Path,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    max_shard_bytes: int = DEFAULT_MAX_SHARD_BYTES,
+) -> list[Path]:
+    """
+    Stream rendered prompts into sharded batch JSONL files, one request line per key.
+
+    A shard is closed once it holds `shard_size` requests or adding the next line would
+    take it past `max_shard_bytes`. Shard numbering continues after existing shards.
+
+    Args:
+        chat: GeminiChat whose prompts render each request.
+        items: (key, prompt variables) pairs; the key comes back on the result line.
+        requests_dir: Directory the shards are written to.
+        shard_size: Maximum requests per shard.
+        max_shard_bytes: Maximum bytes per shard.
+
+    Returns:
+        Paths of the shards written.
+    """
+    requests_dir.mkdir(parents=True, exist_ok=True)
+    shard_index = len(list(requests_dir.glob("requests-*.jsonl")))
+    shards: list[Path] = []
+    shard = None
+    count = size = 0
+    try:
+        for key, input_data in items:
+            line = (json.dumps({"key": key, "request": chat.batch_request(input_data)}) + "\n").encode("utf-8")
+            if shard is None or count >= shard_size or (count and size + len(line) > max_shard_bytes):
+                if shard is not None:
+                    shard.close()
+                path = requests_dir / f"requests-{shard_index:05d}.jsonl"
+                shard_index += 1
+                shards.append(path)
+                shard = path.open("wb")
+                count = size = 0
+            shard.write(line)
+            count += 1
+            size += len(line)
+    finally:
+        if shard is not None:
+            shard.close()
+    logger.info(f"Wrote {len(shards)} request shard(s) to {requests_dir}")
+    return shards
+
+
+def read_retry_keys(retry_path: Path) -> set[str]:
+    """Keys queued for retry by earlier collections."""
+    if not retry_path.exists():
+        return set()
+    return {json.loads(line)["key"] for line in retry_path.read_text(encoding='utf-8').splitlines() if line.strip()}
+
+
+def collect_batch_results(
+    chat: GeminiChat,
+    result_files: Iterable[Path],
+    output_dir: Path,
+    retry_path: Path,
+) -> CollectSummary:
+    """
+    Stream batch result JSONL files, validate each line, and write one output per key.
+
+    Lines that carry an error, no candidates, or output failing validation are appended
+    to the retry file with the reason, and no output is written for them.
+
+    Args:
+        chat: GeminiChat whose pydantic_model validates each response.
+        result_files: Result JSONL files from the batch service.
+        output_dir: Where `<key>.json` outputs go.
+        retry_path: JSONL retry queue, appended to.
+    """
+    summary = CollectSummary()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    retry_path.parent.mkdir(parents=True, exist_ok=True)
+    with retry_path.open("a", encoding='utf-8') as retry_file:
+
+        def queue_retry(key: str, reason: str):
+            summary.failed += 1
+            logger.error(f"Batch result for {key} failed: {reason}")
+            retry_file.write(json.dumps({"key": key, "reason": reason}) + "\n")
+
+        for result_file in result_files:
+            with result_file.open(encoding='utf-8') as lines:
+                for line_number, line in enumerate(lines, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        result = json.loads(line)
+                        key = result["key"]
+                    except (json.JSONDecodeError, KeyError, TypeError) as e:
+                        logger.error(f"Unreadable line {line_number} in {result_file}: {e}")
+                        summary.failed += 1
+                        continue
+                    if "error" in result:
+                        queue_retry(key, json.dumps(result["error"]))
+                        continue
+                    try:
+                        parsed = chat.parse_batch_response(result.get("response") or {})
+                    except (ValueError, ValidationError) as e:
+                        queue_retry(key, str(e))
+                        continue
+                    if "video_id" in type(parsed).model_fields:
+                        parsed.video_id = key  # type: ignore
+                    (output_dir / f"{key}.json").write_text(parsed.model_dump_json(indent=2), encoding='utf-8')
+                    summary.written += 1
+    logger.info(f"Collected batch results: {summary.model_dump()}")
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from logging_config import setup_logging
+
+    setup_logging(level=logging.INFO, log_to_file=True, log_file="gemini_batch.log")
+
+    parser = argparse.ArgumentParser(description="Build batch request files and collect batch results.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    write_parser = subparsers.add_parser("write", help="Write request shards for every pending input.")
+    write_parser.add_argument("task", choices=TASKS)
+    write_parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    write_parser.add_argument("--max-shard-bytes", type=int, default=DEFAULT_MAX_SHARD_BYTES)
+    write_parser.add_argument("--retry", action="store_true", help="Only re-queue keys from the retry file.")
+    collect_parser = subparsers.add_parser("collect", help="Validate result files and write outputs.")
+    collect_parser.add_argument("task", choices=TASKS)
+    collect_parser.add_argument("results", nargs="+", type=Path, help="Result JSONL files.")
+    args = parser.parse_args()
+
+    task = TASKS[args.task]
+    chat = task_chat(task)
+    if args.command == "write":
+        keys = read_retry_keys(task.retry_path) if args.retry else None
+        write_batch_requests(
+            chat, pending_inputs(task, keys), task.requests_dir, args.shard_size, args.max_shard_bytes
+        )
+        if args.retry:
+            # The failed keys are in the new shards now
+            task.retry_path.unlink(missing_ok=True)
+    else:
+        collect_batch_results(chat, args.results, task.output_dir, task.retry_path)
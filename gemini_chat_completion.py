@@ -1,16 +1,26 @@
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
 from google import genai
 from google.genai import types
 from jinja2 import Template
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import Union, Optional
 import logging
+import threading
 import time
 from pathlib import Path
-from typing import Type
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from google.genai.errors import APIError, ClientError, ServerError
+from typing import AsyncIterator, Callable, Iterator, Type
+from google.genai.errors import APIError
+from adaptive_concurrency import (
+    OVERLOAD_CODES, RETRYABLE_CODES, AdaptiveLimiter, backoff_seconds, retry_after_seconds, shared_limiter
+)
+from gemini_runner import RequestBudget
+from prompt_inputs import estimate_tokens, system_prompt_path
+from response_cache import ResponseCache, response_key
+from usage_log import UsageLog, default_usage_log
+from streaming_json import StructuredStream
 load_dotenv()
 import weave
 
@@ -26,7 +36,13 @@ class GeminiChat:
         pydantic_model: Type[BaseModel] | None = None,
         model_name: str = "gemini-2.5-pro",
         max_retries: int = 3,
-        retry_delay: float = 1.0
+        retry_delay: float = 1.0,
+        client: genai.Client | None = None,
+        cache: ResponseCache | Callable[[], ResponseCache] | None = None,
+        bypass_cache: bool = False,
+        limiter: AdaptiveLimiter | None = None,
+        usage_log: UsageLog | None = None,
+        budget: RequestBudget | None = None
     ):
         """
         Initialize the GeminiChat class.
@@ -36,8 +52,16 @@ class GeminiChat:
             output_type: 'text' for regular text output or 'structured' for Pydantic model output
             pydantic_model: Pydantic model class for structured output (required if output_type='structured')
             api_key: Gemini API key (if None, expects GOOGLE_API_KEY in environment)
-            max_retries: Maximum number of retry attempts for API calls
-            retry_delay: Delay between retries in seconds
+            max_retries: Maximum number of retries after a failed API call (429, 5xx)
+            retry_delay: Base delay between retries in seconds, doubled per retry with jitter
+            client: Pre-built client (or a fake with the same `models` / `aio.models` interface) to use
+                instead of creating one from GEMINI_API_KEY on first request
+            cache: Response cache checked before every request, or a factory (e.g. `ResponseCache`)
+                that creates it on first use (None disables caching)
+            bypass_cache: Always call the API, still storing fresh responses in the cache
+            limiter: Adaptive concurrency limit for API calls (the process-wide shared one by default)
+            usage_log: Where per-call tokens, latency and retries are recorded (the shared default log if None)
+            budget: Per-minute request and token budgets charged before every async API call, retries included
         """
         self.prompts_dir = Path(prompts_dir)
         self.output_type = output_type
@@ -52,26 +76,49 @@ class GeminiChat:
         if output_type == "structured" and pydantic_model is None:
             raise ValueError("pydantic_model must be provided for structured output")
 
-        # Fetch GEMINI_API_KEY from environment
-        gemini_api_key = os.getenv("GEMINI_API_KEY")
-        if not gemini_api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set")
+        self._cache = cache
+        self._cache_lock = threading.Lock()
+        self.bypass_cache = bypass_cache
+        self.limiter = limiter or shared_limiter
+        self.usage_log = usage_log or default_usage_log
+        self.budget = budget
 
-        # Initialize client (no api_key param)
-        self.client = genai.Client()
+        # Created on first use, so prompts can be rendered (e.g. into batch files) without credentials
+        self._client = client
 
         # Load prompts (no file params)
         self.system_prompt = self._load_system_prompt()
         self.user_template = self._load_user_template()
 
+    @property
+    def client(self) -> genai.Client:
+        """Gemini client, created from GEMINI_API_KEY on first use unless one was injected."""
+        if self._client is None:
+            # Fetch GEMINI_API_KEY from environment
+            gemini_api_key = os.getenv("GEMINI_API_KEY")
+            if not gemini_api_key:
+                raise ValueError("GEMINI_API_KEY environment variable not set")
+
+            # Initialize client (no api_key param)
+            self._client = genai.Client()
+        return self._client
+
+    @property
+    def cache(self) -> ResponseCache | None:
+        """Response cache, created on first use when a factory was given, so constructing a chat opens no files."""
+        if callable(self._cache):
+            with self._cache_lock:
+                if callable(self._cache):
+                    self._cache = self._cache()
+        return self._cache
+
     def _load_system_prompt(self) -> str:
-        """Load system prompt from markdown file in prompts_dir."""
-        filename = "system_prompt.md"
+        """Load system prompt from markdown file in prompts_dir, or the base directory its prompt_config.json names."""
+        file_path = system_prompt_path(self.prompts_dir)
         try:
-            file_path = self.prompts_dir / filename
             return file_path.read_text(encoding='utf-8').strip()
         except FileNotFoundError:
-            logger.error(f"System prompt file {filename} not found in {self.prompts_dir}")
+            logger.error(f"System prompt file {file_path} not found")
             raise
         except Exception as e:
             logger.error(f"Error loading system prompt: {str(e)}")
@@ -90,49 +137,58 @@ class GeminiChat:
             logger.error(f"Error loading user prompt: {str(e)}")
             raise
 
-    @weave.op(
-        name="gemini_chat_completion",)
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=10),
-        retry=retry_if_exception_type((APIError, ClientError, ServerError)),
-        reraise=True
-    )
-    def complete(self, input_data: dict) -> Union[str, BaseModel]:
-        """
-        Generate completion based on input data.
-
-        Args:
-            input_data: Dictionary containing variables for user prompt template
-
-        Returns:
-            str if output_type='text', Pydantic model instance if output_type='structured'
-        """
-        # Render user prompt with input data
+    def _render_user_prompt(self, input_data: dict) -> str:
+        """Render the user prompt template with input data."""
         try:
-            user_prompt = self.user_template.render(**input_data)
+            return self.user_template.render(**input_data)
         except Exception as e:
             logger.error(f"Error rendering user prompt: {str(e)}")
             raise
 
-        # Prepare config
+    def _build_config(self) -> types.GenerateContentConfig:
+        """Generation config for the configured output type."""
         if self.output_type == "structured" and self.pydantic_model:
-            config = types.GenerateContentConfig(
+            return types.GenerateContentConfig(
                 response_mime_type="application/json",
                 response_schema=self.pydantic_model,
                 system_instruction=self.system_prompt
             )
+        return types.GenerateContentConfig(
+            system_instruction=self.system_prompt
+        )
+
+    def _cache_key(self, user_prompt: str) -> str:
+        """Content address of a request: model, prompts and the output schema."""
+        schema_json = ""
+        if self.output_type == "structured" and self.pydantic_model:
+            schema_json = json.dumps(self.pydantic_model.model_json_schema(), sort_keys=True)
+        return response_key(self.model_name, self.system_prompt, user_prompt, schema_json)
+
+    def _cached_response(self, key: str) -> Union[str, BaseModel, None]:
+        """A cached result rehydrated to the output type, or None on a miss or bypass."""
+        if self.cache is None or self.bypass_cache:
+            return None
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        if self.output_type == "text":
+            result = cached
         else:
-            config = types.GenerateContentConfig(
-                system_instruction=self.system_prompt
-            )
+            try:
+                result = self.pydantic_model.model_validate_json(cached)  # type: ignore
+            except ValidationError:
+                logger.warning(f"Cached response {key[:12]} no longer validates; requesting a fresh one")
+                return None
+        self.usage_log.record(self.model_name, cache_hit=True)
+        return result
 
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            config=config,
-            contents=user_prompt
-        )
+    def _store_response(self, key: str, result: Union[str, BaseModel]):
+        if self.cache is not None:
+            text = result if isinstance(result, str) else result.model_dump_json()
+            self.cache.put(key, self.model_name, text)
 
+    def _parse_response(self, response) -> Union[str, BaseModel]:
+        """Extract text or the Pydantic model instance from a response."""
         if self.output_type == "text":
             try:
                 return response.text if response.text is not None else ""
@@ -153,6 +209,294 @@ class GeminiChat:
                 logger.error(f"Error parsing structured output: {str(e)}")
                 raise
 
+    def batch_request(self, input_data: dict) -> dict:
+        """
+        Render input data into one request of a Gemini batch JSONL file.
+
+        Args:
+            input_data: Dictionary containing variables for user prompt template
+
+        Returns:
+            The `request` object of a batch line, in the REST GenerateContentRequest format
+        """
+        request = {
+            "contents": [{"role": "user", "parts": [{"text": self._render_user_prompt(input_data)}]}],
+            "system_instruction": {"parts": [{"text": self.system_prompt}]},
+        }
+        if self.output_type == "structured" and self.pydantic_model:
+            request["generation_config"] = {
+                "response_mime_type": "application/json",
+                "response_json_schema": self.pydantic_model.model_json_schema(),
+            }
+        return request
+
+    def parse_batch_response(self, response: dict) -> Union[str, BaseModel]:
+        """
+        Extract text or the validated Pydantic model from one batch result `response` object.
+
+        Raises:
+            ValueError: If the response has no text candidate
+            pydantic.ValidationError: If structured output does not match pydantic_model
+        """
+        candidates = response.get("candidates") or []
+        if not candidates:
+            raise ValueError(f"Response has no candidates (prompt feedback: {response.get('promptFeedback')})")
+        parts = candidates[0].get("content", {}).get("parts", [])
+        text = "".join(part.get("text", "") for part in parts if not part.get("thought"))
+        if self.output_type == "text":
+            return text
+        if not text:
+            raise ValueError(f"Empty response (finish reason: {candidates[0].get('finishReason')})")
+        return self.pydantic_model.model_validate_json(text)  # type: ignore
+
+    def _record_failure(self, error: APIError, attempt: int, started: float, retryable: bool = True) -> float:
+        """
+        Report a failed call to the limiter and decide whether to retry it.
+
+        A call that gives up is recorded in the usage log as an error. `retryable=False`
+        gives up regardless of the error, e.g. for a stream that already handed out text.
+
+        Returns:
+            Seconds to wait before the retry
+
+        Raises:
+            APIError: The error itself when it is not retryable or retries are exhausted
+        """
+        retry_after = retry_after_seconds(error)
+        self.limiter.record_failure(error.code in OVERLOAD_CODES, retry_after)
+        if not retryable or error.code not in RETRYABLE_CODES or attempt >= self.max_retries:
+            self.usage_log.record(
+                self.model_name, time.perf_counter() - started, retries=attempt, status=f"error_{error.code}"
+            )
+            raise error
+        wait = backoff_seconds(attempt, self.retry_delay, retry_after)
+        logger.warning(
+            f"Gemini call failed with {error.code} (attempt {attempt + 1}), retrying in {wait:.1f}s; "
+            f"limiter {self.limiter.stats()}"
+        )
+        return wait
+
+    def _generate(self, user_prompt: str):
+        """
+        Call the API under the shared concurrency limit, retrying overloads and server errors.
+
+        Latency recorded in the usage log is wall time from the first attempt, retries included.
+        """
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            with self.limiter.slot():
+                try:
+                    response = self.client.models.generate_content(
+                        model=self.model_name,
+                        config=self._build_config(),
+                        contents=user_prompt
+                    )
+                    self.limiter.record_success()
+                    self.usage_log.record(
+                        self.model_name, time.perf_counter() - started, response, retries=attempt
+                    )
+                    return response
+                except APIError as e:
+                    wait = self._record_failure(e, attempt, started)
+            time.sleep(wait)
+            attempt += 1
+
+    async def _charge_budget(self, user_prompt: str):
+        """Wait for room in the per-minute budgets, if any, for one request with this prompt."""
+        if self.budget is not None:
+            await self.budget.acquire(estimate_tokens(self.system_prompt) + estimate_tokens(user_prompt))
+
+    async def _agenerate(self, user_prompt: str):
+        """Async `_generate`."""
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            await self._charge_budget(user_prompt)
+            async with self.limiter.async_slot():
+                try:
+                    response = await self.client.aio.models.generate_content(
+                        model=self.model_name,
+                        config=self._build_config(),
+                        contents=user_prompt
+                    )
+                    self.limiter.record_success()
+                    self.usage_log.record(
+                        self.model_name, time.perf_counter() - started, response, retries=attempt
+                    )
+                    return response
+                except APIError as e:
+                    wait = self._record_failure(e, attempt, started)
+            await asyncio.sleep(wait)
+            attempt += 1
+
+    def _generate_stream(self, user_prompt: str) -> Iterator[str]:
+        """
+        Streaming `_generate`, yielding text chunks as they arrive.
+
+        The concurrency slot is held until the stream ends. Failures before the first chunk
+        are retried like `_generate`; after it they are final, since the text already
+        handed out cannot be taken back.
+        """
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            received = False
+            with self.limiter.slot():
+                try:
+                    chunk = None
+                    for chunk in self.client.models.generate_content_stream(
+                        model=self.model_name,
+                        config=self._build_config(),
+                        contents=user_prompt
+                    ):
+                        if chunk.text:
+                            received = True
+                            yield chunk.text
+                    self.limiter.record_success()
+                    # Token counts arrive with the last chunk
+                    self.usage_log.record(self.model_name, time.perf_counter() - started, chunk, retries=attempt)
+                    return
+                except APIError as e:
+                    wait = self._record_failure(e, attempt, started, retryable=not received)
+            time.sleep(wait)
+            attempt += 1
+
+    async def _agenerate_stream(self, user_prompt: str) -> AsyncIterator[str]:
+        """Async `_generate_stream`."""
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            received = False
+            await self._charge_budget(user_prompt)
+            async with self.limiter.async_slot():
+                try:
+                    chunk = None
+                    async for chunk in await self.client.aio.models.generate_content_stream(
+                        model=self.model_name,
+                        config=self._build_config(),
+                        contents=user_prompt
+                    ):
+                        if chunk.text:
+                            received = True
+                            yield chunk.text
+                    self.limiter.record_success()
+                    self.usage_log.record(self.model_name, time.perf_counter() - started, chunk, retries=attempt)
+                    return
+                except APIError as e:
+                    wait = self._record_failure(e, attempt, started, retryable=not received)
+            await asyncio.sleep(wait)
+            attempt += 1
+
+    def _structured_stream(self, input_data: dict, item_field: str, asynchronous: bool) -> StructuredStream:
+        if self.output_type != "structured":
+            raise ValueError("Streaming structured output requires output_type='structured'")
+        user_prompt = self._render_user_prompt(input_data)
+        key = self._cache_key(user_prompt)
+        cached = self._cached_response(key)
+        if cached is not None:
+            text = cached.model_dump_json()  # type: ignore
+            pieces = _replay(text) if asynchronous else iter([text])
+            return StructuredStream(pieces, self.pydantic_model, item_field)  # type: ignore
+        pieces = self._agenerate_stream(user_prompt) if asynchronous else self._generate_stream(user_prompt)
+        return StructuredStream(
+            pieces, self.pydantic_model, item_field, on_result=lambda result: self._store_response(key, result)  # type: ignore
+        )
+
+    def complete_stream(self, input_data: dict, item_field: str) -> StructuredStream:
+        """
+        Streaming version of `complete` for structured output.
+
+        Iterate the returned stream to receive each element of the list field `item_field`
+        (e.g. every Chapter of a VideoAnalysis) as soon as the model has finished writing
+        it; afterwards `stream.result` holds the full, validated response.
+
+        Args:
+            input_data: Dictionary containing variables for user prompt template
+            item_field: Name of a `list[Model]` field of the pydantic model
+
+        Returns:
+            StructuredStream over the elements of `item_field`
+        """
+        return self._structured_stream(input_data, item_field, asynchronous=False)
+
+    def acomplete_stream(self, input_data: dict, item_field: str) -> StructuredStream:
+        """Async `complete_stream`: iterate the returned stream with `async for`."""
+        return self._structured_stream(input_data, item_field, asynchronous=True)
+
+    async def astream_text(self, input_data: dict) -> AsyncIterator[str]:
+        """
+        Stream a text completion chunk by chunk, e.g. to forward tokens to a client as they arrive.
+
+        A cached response is replayed as a single chunk; a completed stream is stored in the cache.
+
+        Args:
+            input_data: Dictionary containing variables for user prompt template
+        """
+        if self.output_type != "text":
+            raise ValueError("Streaming text requires output_type='text'")
+        user_prompt = self._render_user_prompt(input_data)
+        key = self._cache_key(user_prompt)
+        cached = self._cached_response(key)
+        if cached is not None:
+            yield cached  # type: ignore
+            return
+        pieces = []
+        async for piece in self._agenerate_stream(user_prompt):
+            pieces.append(piece)
+            yield piece
+        self._store_response(key, "".join(pieces))
+
+    @weave.op(
+        name="gemini_chat_completion",)
+    def complete(self, input_data: dict) -> Union[str, BaseModel]:
+        """
+        Generate completion based on input data.
+
+        Args:
+            input_data: Dictionary containing variables for user prompt template
+
+        Returns:
+            str if output_type='text', Pydantic model instance if output_type='structured'
+        """
+        user_prompt = self._render_user_prompt(input_data)
+        key = self._cache_key(user_prompt)
+        cached = self._cached_response(key)
+        if cached is not None:
+            return cached
+
+        response = self._generate(user_prompt)
+        result = self._parse_response(response)
+        self._store_response(key, result)
+        return result
+
+    @weave.op(
+        name="gemini_chat_completion_async",)
+    async def acomplete(self, input_data: dict) -> Union[str, BaseModel]:
+        """
+        Async version of `complete`, using the SDK's async client so many requests can be in flight.
+
+        Args:
+            input_data: Dictionary containing variables for user prompt template
+
+        Returns:
+            str if output_type='text', Pydantic model instance if output_type='structured'
+        """
+        user_prompt = self._render_user_prompt(input_data)
+        key = self._cache_key(user_prompt)
+        cached = self._cached_response(key)
+        if cached is not None:
+            return cached
+
+        response = await self._agenerate(user_prompt)
+        result = self._parse_response(response)
+        self._store_response(key, result)
+        return result
+
+async def _replay(text: str) -> AsyncIterator[str]:
+    yield text
+
+
 # Example usage:
 if __name__ == "__main__":
     weave.init('gemini_chat_completion_example')
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Sequence
+
+from pydantic import BaseModel, Field
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio used to size requests against the tokens-per-minute budget
+CHARS_PER_TOKEN = 4
+
+
+class RateLimits(BaseModel):
+    """Limits applied to concurrent Gemini requests."""
+    concurrency: int = Field(8, ge=1, description="Requests allowed in flight at once")
+    requests_per_minute: float | None = Field(None, gt=0, description="Request budget per minute")
+    tokens_per_minute: float | None = Field(None, gt=0, description="Estimated prompt-token budget per minute")
+
+
+class RunSummary(BaseModel):
+    """Outcome counts of a concurrent run."""
+    completed: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `per_minute` tokens per minute.
+
+    Waiters are served in arrival order. A request larger than the bucket's capacity is
+    clamped to the capacity so it can still go through once the bucket is full.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        """
+        Args:
+            per_minute: Refill rate.
+            capacity: Burst size (defaults to one minute's worth of tokens).
+        """
+        self.rate = per_minute / 60
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """Wait until `amount` tokens are available and take them."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class RequestBudget:
+    """
+    The per-minute request and prompt-token budgets of RateLimits, charged per Gemini request.
+
+    Every GeminiChat of a run is given the same budget, so a long video extracted in N
+    windows plus a merge call is charged N + 1 requests, each for its own prompt.
+    """
+
+    def __init__(self, limits: RateLimits):
+        self.requests = TokenBucket(limits.requests_per_minute) if limits.requests_per_minute else None
+        self.tokens = TokenBucket(limits.tokens_per_minute) if limits.tokens_per_minute else None
+
+    async def acquire(self, prompt_tokens: int):
+        """Wait until one more request of `prompt_tokens` estimated tokens fits both budgets."""
+        if self.requests:
+            await self.requests.acquire()
+        if self.tokens:
+            await self.tokens.acquire(prompt_tokens)
+
+
+async def run_jobs(
+    jobs: Sequence[tuple[Path, Path]],
+    handler: Callable[[Path], Awaitable[BaseModel | None]],
+    limits: RateLimits = RateLimits(),
+    desc: str = "Processing",
+) -> RunSummary:
+    """
+    Run `handler` over input files concurrently and save each result as JSON.
+
+    Jobs whose output already exists are skipped. A handler returning None or raising
+    counts as a failure and leaves no output, so the job is retried on the next run.
+
+    A job may make several Gemini requests, so the per-minute budgets are not charged
+    here: give the handler's chats a shared RequestBudget(limits).
+
+    Args:
+        jobs: (input_path, output_path) pairs.
+        handler: Coroutine turning an input file into a Pydantic model.
+        limits: Jobs allowed to run at once.
+        desc: Progress bar label.
+    """
+    summary = RunSummary()
+    semaphore = asyncio.Semaphore(limits.concurrency)
+
+    pending = []
+    for input_path, output_path in jobs:
+        if output_path.exists():
+            logger.info(f"Output already exists for {input_path.name}, skipping.")
+            summary.skipped += 1
+        else:
+            pending.append((input_path, output_path))
+
+    progress = tqdm(total=len(pending), desc=desc)
+
+    async def run_one(input_path: Path, output_path: Path):
+        async with semaphore:
+            try:
+                result = await handler(input_path)
+                if result is None:
+                    summary.failed += 1
+                    return
+                output_path.write_text(result.model_dump_json(indent=2), encoding='utf-8')
+                summary.completed += 1
+                logger.info(f"Successfully saved {output_path}")
+            except Exception as e:
+                summary.failed += 1
+                logger.error(f"Failed to process {input_path.name}: {e}", exc_info=True)
+            finally:
+                progress.update(1)
+
+    try:
+        await asyncio.gather(*(run_one(input_path, output_path) for input_path, output_path in pending))
+    finally:
+        progress.close()
+    logger.info(f"Run finished: {summary.model_dump()}")
+    return summary
@@ -1,5 +1,355 @@
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Callable
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from embedding_models import ModelRegistry
+from gemini_chat_completion import GeminiChat
+from query_cache import CachedSearcher, normalize_query
+from retrieval import STRATEGIES, HybridSearcher, SearchResult, Strategy
+from usage_log import latency_summary
+
+DEFAULT_PROMPTS_DIR = Path("prompts/answer_prompts")
+DEFAULT_MODEL = "gemini-2.5-flash"
+# Largest request body accepted, far above any question
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ServiceSettings(BaseModel):
+    """Retrieval and serving settings of the chat service."""
+    strategy: Strategy = Field("rrf", description="Retrieval strategy for every question")
+    limit: int = Field(5, gt=0, description="Chapters retrieved and passed to the model")
+    retrieval_workers: int = Field(4, gt=0, description="Threads embedding queries and searching Qdrant")
+    max_question_chars: int = Field(2000, gt=0)
+    metrics_window: int = Field(1000, gt=0, description="Most recent requests the latency percentiles cover")
+
+
+class Citation(BaseModel):
+    """A retrieved chapter the answer can cite as [number]."""
+    number: int
+    video_id: str
+    chapter_id: int
+    heading: str
+    timestamp: str
+    score: float
+
+
+class RequestTiming(BaseModel):
+    """Latency of one request, from receipt to the retrieval results, first token and last token."""
+    retrieval_seconds: float | None
+    ttft_seconds: float | None
+    total_seconds: float
+    shared: bool = Field(description="Whether the request joined an identical question already in flight")
+
+
+class ServiceMetrics:
+    """Request counters and latency percentiles over the most recent requests."""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.shared = 0
+        self.errors = 0
+        self.timings: deque[RequestTiming] = deque(maxlen=window)
+
+    def record(self, timing: RequestTiming, error: bool = False):
+        self.requests += 1
+        self.shared += timing.shared
+        self.errors += error
+        self.timings.append(timing)
+
+    def snapshot(self) -> dict:
+        def summary(field: str) -> dict | None:
+            seconds = [value for timing in self.timings if (value := getattr(timing, field)) is not None]
+            return latency_summary(seconds) if seconds else None
+
+        return {
+            "requests": self.requests,
+            "shared": self.shared,
+            "errors": self.errors,
+            "retrieval": summary("retrieval_seconds"),
+            "ttft": summary("ttft_seconds"),
+            "total": summary("total_seconds"),
+        }
+
+
+class Flight:
+    """Events of one in-flight answer, replayed to every request that joins it."""
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self.done = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: dict):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def close(self):
+        async with self._changed:
+            self.done = True
+            self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[dict]:
+        """Every event from the first one, then new ones as they are published, until the flight closes."""
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: position < len(self.events) or self.done)
+                events = self.events[position:]
+                done = self.done
+            for event in events:
+                yield event
+            position += len(events)
+            if done:
+                return
+
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight work: the first caller for a key starts it, later
+    callers subscribe to the same events until it finishes.
+
+    The work runs as its own task, so a client disconnecting does not cancel it for the
+    others.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, Flight] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(self, key: str, start: Callable[[], AsyncIterator[dict]]) -> tuple[Flight, bool]:
+        """
+        Returns:
+            The flight for `key` and whether this call started it.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = self._flights[key] = Flight()
+        task = asyncio.create_task(self._run(key, flight, start()))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return flight, True
+
+    async def _run(self, key: str, flight: Flight, events: AsyncIterator[dict]):
+        try:
+            async for event in events:
+                await flight.publish(event)
+        except Exception as e:
+            logger.error(f"Answer failed: {e}")
+            await flight.publish({"type": "error", "message": str(e)})
+        finally:
+            del self._flights[key]
+            await flight.close()
+
+
+class ChatService:
+    """
+    Answers questions with hybrid retrieval over huberman_clips and a streamed LLM answer.
+
+    One model registry (Qdrant client and embedding models) and one Gemini client are
+    shared by all requests. Embedding and search run on a thread pool, kept to a single
+    thread for in-process Qdrant, which is not thread-safe.
+    """
+
+    def __init__(
+        self,
+        searcher: CachedSearcher | HybridSearcher,
+        chat: GeminiChat,
+        settings: ServiceSettings = ServiceSettings(),
+    ):
+        """
+        Args:
+            searcher: Retrieval over the chapters collection, optionally behind the query cache.
+            chat: Text-output chat with the answer prompts.
+            settings: Retrieval and serving settings.
+        """
+        self.searcher = searcher
+        self.chat = chat
+        self.settings = settings
+        self.metrics = ServiceMetrics(settings.metrics_window)
+        self.flights = SingleFlight()
+        registry = searcher.searcher.registry if isinstance(searcher, CachedSearcher) else searcher.registry
+        workers = 1 if registry.qdrant_location is not None else settings.retrieval_workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval")
+
+    async def retrieve(self, question: str) -> list[SearchResult]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.searcher.search, question, self.settings.strategy, self.settings.limit
+        )
+
+    async def _answer(self, question: str) -> AsyncIterator[dict]:
+        results = await self.retrieve(question)
+        citations = [
+            Citation(number=number, score=result.score, **result.model_dump(exclude={"point_id", "score", "content"}))
+            for number, result in enumerate(results, start=1)
+        ]
+        yield {"type": "citations", "citations": [citation.model_dump() for citation in citations]}
+        chapters = [result.model_dump() for result in results]
+        async for text in self.chat.astream_text({"question": question, "chapters": chapters}):
+            yield {"type": "token", "text": text}
+
+    async def ask(self, question: str) -> AsyncIterator[dict]:
+        """
+        Citations, then answer tokens, then a `done` event with this request's timing.
+
+        Identical questions (after normalization) already being answered are joined
+        rather than answered again.
+        """
+        started = time.perf_counter()
+        flight, leader = self.flights.join(normalize_query(question), lambda: self._answer(question))
+        retrieval = ttft = None
+        failed = False
+        async for event in flight.subscribe():
+            if event["type"] == "citations":
+                retrieval = time.perf_counter() - started
+            elif event["type"] == "token" and ttft is None:
+                ttft = time.perf_counter() - started
+            elif event["type"] == "error":
+                failed = True
+            yield event
+        timing = RequestTiming(
+            retrieval_seconds=retrieval, ttft_seconds=ttft, total_seconds=time.perf_counter() - started,
+            shared=not leader,
+        )
+        self.metrics.record(timing, error=failed)
+        first_token = f"{ttft * 1000:.0f} ms" if ttft is not None else "none"
+        logger.info(
+            f"Answered in {timing.total_seconds * 1000:.0f} ms, first token {first_token}"
+            f"{' (shared)' if not leader else ''}."
+        )
+        yield {"type": "done", **timing.model_dump()}
+
+    def metrics_snapshot(self) -> dict:
+        snapshot = {**self.metrics.snapshot(), "in_flight": len(self.flights)}
+        if isinstance(self.searcher, CachedSearcher):
+            snapshot["query_cache"] = self.searcher.metrics.as_dict()
+        return snapshot
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one HTTP/1.1 request per connection: POST /ask, GET /metrics and GET /health."""
+        try:
+            method, path, body = await read_request(reader)
+            if method == "GET" and path == "/health":
+                await write_json(writer, 200, {"status": "ok"})
+            elif method == "GET" and path == "/metrics":
+                await write_json(writer, 200, self.metrics_snapshot())
+            elif method == "POST" and path == "/ask":
+                try:
+                    question = str(json.loads(body)["question"]).strip()
+                except (ValueError, KeyError, TypeError):
+                    await write_json(writer, 400, {"error": 'Body must be JSON with a "question" field'})
+                    return
+                if not question or len(question) > self.settings.max_question_chars:
+                    await write_json(writer, 400, {"error": "Question is empty or too long"})
+                    return
+                writer.write(response_head(200, "text/event-stream", extra="Cache-Control: no-cache\r\n"))
+                async for event in self.ask(question):
+                    writer.write(f"data: {json.dumps(event)}\n\n".encode())
+                    await writer.drain()
+            else:
+                await write_json(writer, 404, {"error": f"No route for {method} {path}"})
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            await write_json(writer, 400, {"error": f"Malformed request: {e}"})
+        except ConnectionError:
+            logger.info("Client disconnected.")
+        finally:
+            writer.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        if isinstance(self.searcher, CachedSearcher):
+            self.searcher.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.Server:
+        server = await asyncio.start_server(self.handle, host, port)
+        address = server.sockets[0].getsockname()
+        logger.info(f"Serving on http://{address[0]}:{address[1]}")
+        return server
+
+
+async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    """Method, path and body of an HTTP request."""
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+        raise ValueError("bad request line")
+    method, path, _ = request_line
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path.split("?", 1)[0], body
+
+
+def response_head(status: int, content_type: str, length: int | None = None, extra: str = "") -> bytes:
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found"}
+    head = f"HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: {content_type}\r\nConnection: close\r\n{extra}"
+    if length is not None:
+        head += f"Content-Length: {length}\r\n"
+    return (head + "\r\n").encode("latin-1")
+
+
+async def write_json(writer: asyncio.StreamWriter, status: int, payload: dict):
+    body = json.dumps(payload).encode()
+    writer.write(response_head(status, "application/json", len(body)) + body)
+    await writer.drain()
+
+
+def build_service(
+    registry: ModelRegistry | None = None,
+    settings: ServiceSettings = ServiceSettings(),
+    model_name: str = DEFAULT_MODEL,
+    use_cache: bool = True,
+) -> ChatService:
+    searcher = HybridSearcher(registry)
+    chat = GeminiChat(str(DEFAULT_PROMPTS_DIR), output_type="text", model_name=model_name)
+    return ChatService(CachedSearcher(searcher) if use_cache else searcher, chat, settings)
+
+
 def main():
-    print("Hello from huberman-chat!")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve streamed, cited answers over the huberman_clips collection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--qdrant-url", default=None, help="Qdrant server (the registry default if omitted).")
+    parser.add_argument("--qdrant-location", default=None, help="In-process Qdrant directory instead of a server.")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="rrf")
+    parser.add_argument("--limit", type=int, default=5, help="Chapters passed to the model.")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--no-query-cache", action="store_true", help="Search Qdrant for every question.")
+    args = parser.parse_args()
+
+    if args.qdrant_location:
+        registry = ModelRegistry(qdrant_location=args.qdrant_location)
+    elif args.qdrant_url:
+        registry = ModelRegistry(qdrant_url=args.qdrant_url)
+    else:
+        registry = ModelRegistry()
+    service = build_service(
+        registry, ServiceSettings(strategy=args.strategy, limit=args.limit), args.model, not args.no_query_cache
+    )
+
+    async def run():
+        server = await service.serve(args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from difflib import SequenceMatcher
+
+from pydantic import BaseModel, Field
+
+from gemini_chat_completion import GeminiChat
+from prompt_inputs import PromptConfig
+from pydantic_models import Chapter, VideoAnalysis
+from srt_utils import Cue, compact_transcript, format_srt, format_timestamp, parse_timestamp
+from usage_log import usage_context
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPTS_DIR = "prompts/chapters_extractor_prompts/merge_summary"
+
+
+class MapReduceSettings(BaseModel):
+    """When and how long transcripts are split into windows."""
+    long_video_seconds: float = Field(90 * 60, description="Transcripts running longer than this are split")
+    window_seconds: float = Field(30 * 60, gt=0, description="Length of each window")
+    overlap_seconds: float = Field(2 * 60, ge=0, description="Time shared by consecutive windows")
+    window_concurrency: int = Field(4, ge=1, description="Windows of one video extracted at once")
+    dedupe_seconds: float = Field(90, description="Chapters this close with similar headings are duplicates")
+    heading_similarity: float = Field(0.6, description="Heading similarity ratio above which chapters are duplicates")
+
+
+class Window(BaseModel):
+    """A slice of the transcript and the part of it whose chapters it owns."""
+    cues: list[Cue]
+    core_start: float
+    core_end: float
+
+
+def transcript_duration(cues: list[Cue]) -> float:
+    return max((cue.end for cue in cues), default=0.0)
+
+
+def split_windows(cues: list[Cue], settings: MapReduceSettings = MapReduceSettings()) -> list[Window]:
+    """
+    Split cues into overlapping time windows.
+
+    Each window owns a core range running from the middle of its overlap with the
+    previous window to the middle of its overlap with the next one, so every chapter
+    start time belongs to exactly one window.
+    """
+    if settings.overlap_seconds >= settings.window_seconds:
+        raise ValueError("overlap_seconds must be shorter than window_seconds")
+    duration = transcript_duration(cues)
+    step = settings.window_seconds - settings.overlap_seconds
+    half_overlap = settings.overlap_seconds / 2
+    windows = []
+    start = 0.0
+    while True:
+        end = start + settings.window_seconds
+        is_last = end >= duration
+        windows.append(
+            Window(
+                cues=[cue for cue in cues if cue.end > start and cue.start < end],
+                core_start=0.0 if not windows else start + half_overlap,
+                core_end=float("inf") if is_last else end - half_overlap,
+            )
+        )
+        if is_last:
+            return windows
+        start += step
+
+
+def window_transcript(window: Window, config: PromptConfig) -> str:
+    """Render a window in the prompt directory's transcript format; timestamps stay absolute."""
+    if config.transcript_format == "compact":
+        return compact_transcript(window.cues, config.bucket_seconds)
+    return format_srt(window.cues)
+
+
+def _is_duplicate(previous: tuple[float, Chapter], current: tuple[float, Chapter], settings: MapReduceSettings) -> bool:
+    close = current[0] - previous[0] <= settings.dedupe_seconds
+    similar = SequenceMatcher(
+        None, previous[1].heading.lower(), current[1].heading.lower()
+    ).ratio() >= settings.heading_similarity
+    return close and similar
+
+
+def merge_chapters(
+    windows: list[Window], analyses: list[VideoAnalysis], settings: MapReduceSettings = MapReduceSettings()
+) -> list[Chapter]:
+    """
+    Combine per-window chapters into one ordered, renumbered list.
+
+    A window's chapters are kept only if they start inside its core range, which drops
+    the copies extracted from the overlap by the neighbouring window. Chapters that
+    still land close together with near-identical headings are collapsed, keeping the
+    one with the longer content.
+    """
+    timed: list[tuple[float, Chapter]] = []
+    for window, analysis in zip(windows, analyses):
+        for chapter in analysis.chapters:
+            seconds = parse_timestamp(chapter.timestamp)
+            if seconds is None:
+                logger.warning(f"Dropping chapter with unparseable timestamp '{chapter.timestamp}': {chapter.heading}")
+                continue
+            if window.core_start <= seconds < window.core_end:
+                timed.append((seconds, chapter))
+    timed.sort(key=lambda item: item[0])
+
+    merged: list[tuple[float, Chapter]] = []
+    for item in timed:
+        if merged and _is_duplicate(merged[-1], item, settings):
+            if len(item[1].content) > len(merged[-1][1].content):
+                merged[-1] = (merged[-1][0], item[1].model_copy(update={"timestamp": merged[-1][1].timestamp}))
+            continue
+        merged.append(item)
+    return [
+        chapter.model_copy(update={"chapter_id": chapter_id, "timestamp": format_timestamp(seconds)})
+        for chapter_id, (seconds, chapter) in enumerate(merged, start=1)
+    ]
+
+
+def merge_topics(analyses: list[VideoAnalysis]) -> list[str]:
+    """Union of the windows' topics, in first-seen order, ignoring case."""
+    seen = set()
+    topics = []
+    for analysis in analyses:
+        for topic in analysis.topics:
+            if topic.lower() not in seen:
+                seen.add(topic.lower())
+                topics.append(topic)
+    return topics
+
+
+async def stream_chapters(chat: GeminiChat, video_id: str, input_data: dict) -> VideoAnalysis:
+    """
+    Single-request chapter extraction, streamed: each chapter is numbered as soon as it arrives.
+
+    Chapter IDs follow the order the model writes the chapters in, as add_chapter_ids
+    numbers them, so the saved file already carries its IDs.
+
+    Args:
+        chat: Structured GeminiChat producing a VideoAnalysis.
+        video_id: The video the transcript belongs to.
+        input_data: Variables of `chat`'s user prompt.
+    """
+    stream = chat.acomplete_stream(input_data, "chapters")
+    chapters = []
+    async for chapter in stream:
+        chapters.append(chapter.model_copy(update={"chapter_id": len(chapters) + 1}))
+        logger.debug(f"{video_id}: chapter {len(chapters)} at {chapter.timestamp}: {chapter.heading}")
+    return stream.result.model_copy(update={"video_id": video_id, "chapters": chapters})  # type: ignore
+
+
+async def extract_long_transcript(
+    chat: GeminiChat,
+    summary_chat: GeminiChat,
+    video_id: str,
+    cues: list[Cue],
+    config: PromptConfig = PromptConfig(),
+    settings: MapReduceSettings = MapReduceSettings(),
+) -> VideoAnalysis:
+    """
+    Map-reduce chapter extraction: extract every window concurrently, then merge.
+
+    A window that fails raises, failing the video; with a response cache on `chat`, a
+    rerun pays only for the windows that did not complete.
+
+    Args:
+        chat: Structured GeminiChat producing a VideoAnalysis per window.
+        summary_chat: Text GeminiChat writing the overall summary from the window summaries.
+        video_id: The video the transcript belongs to.
+        cues: The parsed transcript.
+        config: Payload format of `chat`'s prompt directory.
+        settings: Window sizes and merge thresholds.
+    """
+    windows = split_windows(cues, settings)
+    logger.info(f"{video_id}: extracting {len(windows)} windows of {settings.window_seconds / 60:.0f} min")
+    semaphore = asyncio.Semaphore(settings.window_concurrency)
+
+    async def extract_window(window: Window) -> VideoAnalysis:
+        async with semaphore:
+            with usage_context(stage="extract_window", video_id=video_id):
+                return await chat.acomplete({"transcript": window_transcript(window, config)})  # type: ignore
+
+    analyses = await asyncio.gather(*(extract_window(window) for window in windows))
+    chapters = merge_chapters(windows, analyses, settings)
+    with usage_context(stage="extract_merge", video_id=video_id):
+        overall_summary = await summary_chat.acomplete(
+            {
+                "summaries": [analysis.overall_summary for analysis in analyses],
+                "headings": [chapter.heading for chapter in chapters],
+            }
+        )
+    return VideoAnalysis(
+        video_id=video_id,
+        overall_summary=str(overall_summary).strip(),
+        chapters=chapters,
+        topics=merge_topics(analyses),
+    )
@@ -0,0 +1,117 @@
+import time
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from loguru import logger
+from qdrant_client import models
+
+from colbert_storage import DEFAULT_TOKEN_STORE_DIR, TokenStore, maxsim_scores
+from retrieval import HybridSearcher, QueryEmbeddings, SearchResult, to_result
+
+# Payload fields a SearchResult needs; the transcript span stays on the server
+RESULT_FIELDS = ["video_id", "chapter_id", "heading", "content", "timestamp"]
+
+
+class MaxSimReranker:
+    """
+    ColBERT reranking in-process, over token matrices kept in a TokenStore.
+
+    Qdrant only runs the dense and BM25 prefetches and returns the union of their
+    candidates (an RRF query with room for all of them); their token matrices are read
+    from the memory-mapped store by point ID and scored with a vectorized MaxSim. The
+    collection then needs no late-interaction vector, so Qdrant holds no ColBERT
+    vectors in RAM. Scores match Qdrant's MAX_SIM with cosine similarity.
+    """
+
+    def __init__(self, searcher: HybridSearcher | None = None, store: TokenStore | None = None):
+        """
+        Args:
+            searcher: Candidate search; its prefetch limits bound the candidates reranked.
+            store: Token matrices of the collection's points, written by create_index.
+        """
+        self.searcher = searcher or HybridSearcher()
+        self.store = store or TokenStore(DEFAULT_TOKEN_STORE_DIR)
+        self.timings = {"candidates": 0.0, "rerank": 0.0}
+
+    def candidate_request(
+        self, embedding: QueryEmbeddings, query_filter: models.Filter | None = None
+    ) -> models.QueryRequest:
+        limits = self.searcher.limits
+        return models.QueryRequest(
+            prefetch=self.searcher._prefetch(embedding, query_filter),
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=limits.dense + limits.sparse,
+            with_payload=RESULT_FIELDS,
+            filter=query_filter,
+        )
+
+    def rerank(self, query: np.ndarray, candidates: Sequence[SearchResult], limit: int = 10) -> list[SearchResult]:
+        """The top `limit` candidates by MaxSim against the query's token matrix."""
+        matrices = self.store.get_many([candidate.point_id for candidate in candidates])
+        missing = sum(matrix is None for matrix in matrices)
+        if missing:
+            logger.warning(f"{missing} candidates have no token matrix; they rank last.")
+        scores = maxsim_scores(
+            query, [matrix if matrix is not None else np.empty((0, self.store.dim)) for matrix in matrices],
+            normalized=True,
+        )
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [candidates[i].model_copy(update={"score": float(scores[i])}) for i in order]
+
+    def search_embedded(
+        self,
+        embeddings: Sequence[QueryEmbeddings],
+        limit: int = 10,
+        query_filter: models.Filter | None = None,
+    ) -> list[list[SearchResult]]:
+        """Fetch every query's candidates in one `query_batch_points` round trip, then rerank locally."""
+        if not embeddings:
+            return []
+        if any(embedding.late is None for embedding in embeddings):
+            raise ValueError("MaxSim reranking needs queries embedded with the late-interaction model")
+        start = time.perf_counter()
+        responses = self.searcher.registry.client.query_batch_points(
+            collection_name=self.searcher.collection_name,
+            requests=[self.candidate_request(embedding, query_filter) for embedding in embeddings],
+        )
+        self.timings["candidates"] += time.perf_counter() - start
+        start = time.perf_counter()
+        results = [
+            self.rerank(np.asarray(embedding.late, dtype=np.float32), [to_result(p) for p in response.points], limit)
+            for embedding, response in zip(embeddings, responses)
+        ]
+        self.timings["rerank"] += time.perf_counter() - start
+        return results
+
+    def search_batch(
+        self, queries: Sequence[str], limit: int = 10, query_filter: models.Filter | None = None
+    ) -> list[list[SearchResult]]:
+        # Query matrices stay float32: the store is scored in NumPy, not in Qdrant's stored datatype
+        late = list(self.searcher.registry.late.query_embed(list(queries)))
+        embeddings = [
+            embedding.model_copy(update={"late": matrix.tolist()})
+            for embedding, matrix in zip(self.searcher.embed_queries(queries, with_late=False), late)
+        ]
+        return self.search_embedded(embeddings, limit, query_filter)
+
+    def search(self, query: str, limit: int = 10, query_filter: models.Filter | None = None) -> list[SearchResult]:
+        """Search a single query."""
+        return self.search_batch([query], limit, query_filter)[0]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search huberman_clips with in-process MaxSim reranking.")
+    parser.add_argument("queries", nargs="+", help="One or more questions.")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--token-store", type=Path, default=DEFAULT_TOKEN_STORE_DIR)
+    args = parser.parse_args()
+
+    reranker = MaxSimReranker(store=TokenStore(args.token_store))
+    for query, results in zip(args.queries, reranker.search_batch(args.queries, args.limit)):
+        logger.info(f"Query: {query}")
+        for result in results:
+            logger.info(f"  {result.score:.3f} [{result.video_id} @ {result.timestamp}] {result.heading}")
+    logger.info(f"Timings: {reranker.timings}")
@@ -0,0 +1,348 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path("data")
+MANIFEST_PATH = DATA_DIR / "pipeline_manifest.json"
+# Stage key of the single, collection-wide run of a global stage
+ALL_VIDEOS = "*"
+
+
+class Stage(BaseModel):
+    """
+    One step of the pipeline.
+
+    A per-video stage runs once per video; a global stage runs once over every video
+    whose upstream stages are up to date. A stage's key hashes its input files, its
+    prompt directories, its model and the keys of its upstream stages, so editing a
+    transcript or a prompt makes the stage and everything downstream of it stale.
+    A stage that rewrites one of its inputs in place is keyed on the file it left behind.
+    """
+    name: str
+    run: Callable[[str], Awaitable[dict | None]] = Field(
+        description="Coroutine doing the work for a video_id (ALL_VIDEOS for global stages); "
+        "may return a small JSON-able result kept in the manifest"
+    )
+    upstream: list[str] = Field(default_factory=list, description="Stages that must be up to date first")
+    inputs: Callable[[str], list[Path]] = Field(default=lambda video_id: [], description="Files hashed into the key")
+    output: Callable[[str], Path] | None = Field(default=None, description="File the stage writes, if any")
+    prompts_dirs: list[Path] = Field(default_factory=list)
+    model: str | None = None
+    version: str = Field("1", description="Bump to invalidate every output after a code change")
+    workers: int = Field(4, ge=1, description="Videos this stage processes at once")
+    per_video: bool = True
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def directory_hash(directory: Path) -> str:
+    """Hash of every file under a prompt directory, names included."""
+    digest = hashlib.sha256()
+    for path in sorted(p for p in directory.rglob("*") if p.is_file()):
+        digest.update(path.relative_to(directory).as_posix().encode())
+        digest.update(file_hash(path).encode())
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    What produced each artifact: stage key, input hashes, prompt hashes and model,
+    per stage and video. Saved atomically after every completed step, so an
+    interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = path
+        self.entries: dict[str, dict[str, dict]] = {}
+        if path.exists():
+            self.entries = json.loads(path.read_text(encoding="utf-8")).get("stages", {})
+
+    def get(self, stage: str, video_id: str) -> dict | None:
+        return self.entries.get(stage, {}).get(video_id)
+
+    def put(self, stage: str, video_id: str, entry: dict):
+        self.entries.setdefault(stage, {})[video_id] = entry
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps({"version": 1, "stages": self.entries}, indent=2), encoding="utf-8")
+        os.replace(temporary, self.path)
+
+
+class PipelineSummary(BaseModel):
+    completed: dict[str, int] = Field(default_factory=dict)
+    fresh: dict[str, int] = Field(default_factory=dict)
+    failed: dict[str, int] = Field(default_factory=dict)
+    blocked: dict[str, int] = Field(default_factory=dict)
+
+    def count(self, outcome: str, stage: str):
+        counts = getattr(self, outcome)
+        counts[stage] = counts.get(stage, 0) + 1
+
+
+class Pipeline:
+    """
+    Runs stages over videos, recomputing only stale artifacts.
+
+    Each video moves through the per-video stages on its own, so one video's questions
+    can be generated while another is still being extracted; every stage bounds how
+    many videos it works on at once. Global stages run after all videos are done.
+    """
+
+    def __init__(self, stages: list[Stage], manifest: Manifest | None = None):
+        names = [stage.name for stage in stages]
+        for stage in stages:
+            unknown = [name for name in stage.upstream if name not in names[: names.index(stage.name)]]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown or later stages {unknown}")
+        self.stages = stages
+        self.manifest = manifest or Manifest()
+        self._prompt_hashes = {
+            stage.name: {str(directory): directory_hash(directory) for directory in stage.prompts_dirs}
+            for stage in stages
+        }
+
+    def describe(self, stage: Stage, video_id: str, upstream_keys: dict[str, str]) -> dict:
+        """The manifest entry `stage` would record for `video_id` right now, key included."""
+        missing = [str(path) for path in stage.inputs(video_id) if not path.exists()]
+        if missing:
+            raise FileNotFoundError(f"Missing inputs {missing}")
+        entry = {
+            "inputs": {str(path): file_hash(path) for path in stage.inputs(video_id)},
+            "prompts": self._prompt_hashes[stage.name],
+            "model": stage.model,
+            "version": stage.version,
+            "upstream": {name: upstream_keys[name] for name in stage.upstream},
+        }
+        entry["key"] = hashlib.sha256(json.dumps(entry, sort_keys=True).encode()).hexdigest()
+        return entry
+
+    def is_fresh(self, stage: Stage, video_id: str, entry: dict) -> bool:
+        recorded = self.manifest.get(stage.name, video_id)
+        if recorded is None or recorded["key"] != entry["key"]:
+            return False
+        return stage.output is None or stage.output(video_id).exists()
+
+    async def _step(
+        self, stage: Stage, video_id: str, upstream_keys: dict[str, str], semaphore: asyncio.Semaphore,
+        selected: bool, force: bool, dry_run: bool, summary: PipelineSummary,
+    ) -> str | None:
+        """Bring one artifact up to date; returns its key, or None if it is not up to date."""
+        try:
+            entry = self.describe(stage, video_id, upstream_keys)
+        except FileNotFoundError as e:
+            logger.warning(f"{stage.name} {video_id}: {e}")
+            summary.count("blocked", stage.name)
+            return None
+        if self.is_fresh(stage, video_id, entry) and not (force and selected):
+            summary.count("fresh", stage.name)
+            return entry["key"]
+        if not selected or dry_run:
+            logger.info(f"{stage.name} {video_id}: stale{'' if selected else ' (stage not selected)'}")
+            summary.count("blocked", stage.name)
+            return None
+
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await stage.run(video_id)
+            except Exception as e:
+                logger.error(f"{stage.name} {video_id} failed: {e}", exc_info=True)
+                summary.count("failed", stage.name)
+                return None
+        if stage.output is not None and stage.output(video_id) in stage.inputs(video_id):
+            # Hash the input as rewritten, or the stage would look stale again on the next run
+            entry = self.describe(stage, video_id, upstream_keys)
+        entry.update(result=result, seconds=round(time.perf_counter() - started, 2), updated_at=time.time())
+        self.manifest.put(stage.name, video_id, entry)
+        summary.count("completed", stage.name)
+        return entry["key"]
+
+    async def run(
+        self, video_ids: list[str], only: set[str] | None = None, force: bool = False, dry_run: bool = False
+    ) -> PipelineSummary:
+        """
+        Args:
+            video_ids: Videos to process.
+            only: Stages allowed to run (all by default); others must already be up to date.
+            force: Rerun the selected stages even where they are up to date.
+            dry_run: Only report what is stale.
+        """
+        summary = PipelineSummary()
+        semaphores = {stage.name: asyncio.Semaphore(stage.workers) for stage in self.stages}
+        per_video = [stage for stage in self.stages if stage.per_video]
+
+        async def run_video(video_id: str) -> dict[str, str]:
+            keys: dict[str, str] = {}
+            for stage in per_video:
+                if any(name not in keys for name in stage.upstream):
+                    summary.count("blocked", stage.name)
+                    continue
+                key = await self._step(
+                    stage, video_id, keys, semaphores[stage.name],
+                    only is None or stage.name in only, force, dry_run, summary,
+                )
+                if key is not None:
+                    keys[stage.name] = key
+            return keys
+
+        video_keys = dict(zip(video_ids, await asyncio.gather(*(run_video(video_id) for video_id in video_ids))))
+
+        for stage in self.stages:
+            if stage.per_video:
+                continue
+            ready = {
+                video_id: keys for video_id, keys in video_keys.items()
+                if all(name in keys for name in stage.upstream)
+            }
+            # A global stage depends on the upstream keys of every video that is ready
+            combined = {
+                name: hashlib.sha256(
+                    json.dumps({video_id: keys[name] for video_id, keys in sorted(ready.items())}).encode()
+                ).hexdigest()
+                for name in stage.upstream
+            }
+            await self._step(
+                stage, ALL_VIDEOS, combined, semaphores[stage.name],
+                only is None or stage.name in only, force, dry_run, summary,
+            )
+        logger.info(f"Pipeline finished: {summary.model_dump()}")
+        return summary
+
+
+def default_stages(data_dir: Path = DATA_DIR, workers: dict[str, int] | None = None) -> list[Stage]:
+    """
+    The huberman_chat pipeline: extract, enrich (chapter IDs), questions, validate, index.
+
+    The scripts behind each stage are imported on first use, so building the stages
+    needs neither credentials nor models.
+    """
+    import question_generation
+    import yt_chapters_extraction
+    from map_reduce_extraction import SUMMARY_PROMPTS_DIR
+
+    workers = workers or {}
+    subtitles = lambda video_id: data_dir / "subtitles" / f"{video_id}.srt"
+    chapters = lambda video_id: data_dir / "chapters" / f"{video_id}.json"
+    questions = lambda video_id: data_dir / "questions" / f"{video_id}.json"
+
+    async def extract(video_id: str) -> None:
+        result = await yt_chapters_extraction.extract_chapters(subtitles(video_id))
+        chapters(video_id).parent.mkdir(parents=True, exist_ok=True)
+        chapters(video_id).write_text(result.model_dump_json(indent=2), encoding="utf-8")
+
+    async def enrich(video_id: str) -> None:
+        from add_chapter_ids import add_chapter_ids_to_file
+
+        await asyncio.to_thread(add_chapter_ids_to_file, chapters(video_id))
+
+    async def generate(video_id: str) -> None:
+        result = await question_generation.agenerate_questions(chapters(video_id))
+        if result is None:
+            raise ValueError("No questions generated")
+        questions(video_id).parent.mkdir(parents=True, exist_ok=True)
+        questions(video_id).write_text(result.model_dump_json(indent=2), encoding="utf-8")
+
+    async def validate(video_id: str) -> dict:
+        from chapter_timestamp_validators import check_pair
+
+        result = await asyncio.to_thread(check_pair, subtitles(video_id), chapters(video_id))
+        if result.error:
+            raise ValueError(result.error)
+        return {"valid": result.valid, "issues": [issue.kind for issue in result.issues]}
+
+    async def index(video_id: str) -> None:
+        from create_qdrant_index import create_index
+
+        # create_index logs its failures; raising keeps the stage stale so the next run retries it
+        synced = await asyncio.to_thread(
+            create_index, chapters_dir=data_dir / "chapters", subtitles_dir=data_dir / "subtitles"
+        )
+        if not synced:
+            raise RuntimeError("Indexing failed")
+
+    return [
+        Stage(
+            name="extract", run=extract, inputs=lambda video_id: [subtitles(video_id)], output=chapters,
+            prompts_dirs=[Path(yt_chapters_extraction.DEFAULT_PROMPTS_DIR), Path(SUMMARY_PROMPTS_DIR)],
+            model=yt_chapters_extraction.model_name, workers=workers.get("extract", 8),
+        ),
+        # The chapters file is an input of every later stage, so re-extracting a video
+        # (even with unchanged transcript and prompts, e.g. --force) reruns them
+        Stage(
+            name="enrich", run=enrich, upstream=["extract"], inputs=lambda video_id: [chapters(video_id)],
+            output=chapters, workers=workers.get("enrich", 4),
+        ),
+        Stage(
+            name="questions", run=generate, upstream=["enrich"], inputs=lambda video_id: [chapters(video_id)],
+            output=questions, prompts_dirs=[Path(question_generation.DEFAULT_PROMPTS_DIR)],
+            model=question_generation.model_name, workers=workers.get("questions", 8),
+        ),
+        Stage(
+            name="validate", run=validate, upstream=["enrich"],
+            inputs=lambda video_id: [subtitles(video_id), chapters(video_id)], workers=workers.get("validate", 4),
+        ),
+        Stage(
+            name="index", run=index, upstream=["enrich"],
+            inputs=lambda video_id: sorted((data_dir / "chapters").glob("*.json")), per_video=False, workers=1,
+        ),
+    ]
+
+
+def parse_workers(values: list[str]) -> dict[str, int]:
+    """'stage=N' pairs from the command line."""
+    workers = {}
+    for value in values:
+        name, _, count = value.partition("=")
+        if not count.isdigit():
+            raise ValueError(f"Expected stage=N, got '{value}'")
+        workers[name] = int(count)
+    return workers
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Run the data pipeline, recomputing only stale artifacts.")
+    parser.add_argument("--only", nargs="+", default=None, help="Stages allowed to run (default: all).")
+    parser.add_argument("--videos", nargs="+", default=None, help="Video IDs (default: every transcript).")
+    parser.add_argument("--workers", nargs="+", default=[], metavar="STAGE=N", help="Videos processed at once per stage.")
+    parser.add_argument("--force", action="store_true", help="Rerun the selected stages even if up to date.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report stale artifacts.")
+    args = parser.parse_args()
+
+    stages = default_stages(workers=parse_workers(args.workers))
+    # After the stage scripts are imported, since they configure logging on import
+    setup_logging(level=logging.INFO, log_to_file=True, log_file="pipeline.log")
+    if args.only:
+        unknown = set(args.only) - {stage.name for stage in stages}
+        if unknown:
+            parser.error(f"Unknown stages: {sorted(unknown)}")
+    if not args.dry_run:
+        import weave
+
+        weave.init('huberman-chat')
+    video_ids = args.videos or sorted(path.stem for path in (DATA_DIR / "subtitles").glob("*.srt"))
+    summary = asyncio.run(
+        Pipeline(stages).run(video_ids, only=set(args.only) if args.only else None, force=args.force, dry_run=args.dry_run)
+    )
+    print(json.dumps(summary.model_dump(), indent=2))
@@ -0,0 +1,173 @@
+import json
+import logging
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from gemini_runner import CHARS_PER_TOKEN
+from srt_utils import compact_transcript, parse_srt
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CONFIG_FILE = "prompt_config.json"
+SYSTEM_PROMPT_FILE = "system_prompt.md"
+
+
+class PromptConfig(BaseModel):
+    """How inputs are serialized for a prompt directory, read from its optional prompt_config.json."""
+    transcript_format: Literal["srt", "compact"] = Field(
+        "srt", description="'srt' sends the raw file; 'compact' merges cues into timestamped lines"
+    )
+    bucket_seconds: float = Field(30, gt=0, description="Seconds of speech per compact transcript line")
+    chapters_format: Literal["json", "compact"] = Field(
+        "json", description="'json' sends indented JSON; 'compact' one header line plus content per chapter"
+    )
+    system_prompt_dir: str | None = Field(
+        None, description="Directory, relative to this one, whose system prompt is used when this one has none"
+    )
+
+
+def load_prompt_config(prompts_dir: str | Path) -> PromptConfig:
+    """The prompt directory's PromptConfig, or the defaults (the original payloads) if it has none."""
+    path = Path(prompts_dir) / PROMPT_CONFIG_FILE
+    if not path.exists():
+        return PromptConfig()
+    return PromptConfig.model_validate_json(path.read_text(encoding='utf-8'))
+
+
+def system_prompt_path(prompts_dir: str | Path) -> Path:
+    """The directory's own system prompt, or the one its PromptConfig shares from a base directory."""
+    path = Path(prompts_dir) / SYSTEM_PROMPT_FILE
+    system_prompt_dir = load_prompt_config(prompts_dir).system_prompt_dir
+    if path.exists() or system_prompt_dir is None:
+        return path
+    return Path(prompts_dir) / system_prompt_dir / SYSTEM_PROMPT_FILE
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text from its length."""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def serialize_chapters(chapters: list[dict], chapters_format: str = "json") -> str:
+    """
+    Render chapters for the question prompt.
+
+    The compact form is one block per chapter: '[chapter_id] timestamp | heading' on the
+    first line and the content on the next, without JSON keys, quotes or indentation.
+    """
+    if chapters_format == "json":
+        return json.dumps(chapters, indent=2)
+    return "\n\n".join(
+        f"[{chapter.get('chapter_id', '')}] {chapter.get('timestamp', '')} | {chapter.get('heading', '')}\n"
+        f"{chapter.get('content', '')}"
+        for chapter in chapters
+    )
+
+
+def transcript_payload(srt_text: str, config: PromptConfig = PromptConfig()) -> str:
+    """Render a transcript in the configured format."""
+    if config.transcript_format == "srt":
+        return srt_text
+    return compact_transcript(parse_srt(srt_text), config.bucket_seconds)
+
+
+def chapters_input_data(srt_path: Path, config: PromptConfig = PromptConfig()) -> dict:
+    """Prompt variables for chapter extraction from one transcript."""
+    srt_text = srt_path.read_text(encoding='utf-8')
+    transcript = transcript_payload(srt_text, config)
+    if config.transcript_format != "srt":
+        logger.info(
+            f"{srt_path.name}: transcript ~{estimate_tokens(srt_text)} -> ~{estimate_tokens(transcript)} tokens"
+        )
+    return {"transcript": transcript}
+
+
+def questions_input_data(chapters_data: dict, config: PromptConfig = PromptConfig()) -> dict:
+    """Prompt variables for question generation from a chapters JSON document."""
+    return {
+        "overall_summary": chapters_data.get("overall_summary", ""),
+        "chapters": serialize_chapters(chapters_data.get("chapters", []), config.chapters_format),
+        "topics": chapters_data.get("topics", [])
+    }
+
+
+def _compare(paths: list[Path], baseline, compacted, count_tokens) -> tuple[dict, dict]:
+    per_file = {}
+    for path in paths:
+        text = path.read_text(encoding='utf-8')
+        per_file[path.stem] = {"before": count_tokens(baseline(text)), "after": count_tokens(compacted(text))}
+    before = sum(counts["before"] for counts in per_file.values())
+    after = sum(counts["after"] for counts in per_file.values())
+    return per_file, {"before": before, "after": after, "saved": 1 - after / before if before else 0.0}
+
+
+def token_report(subtitles_dir: Path, chapters_dir: Path, config: PromptConfig, count_tokens=estimate_tokens) -> dict:
+    """
+    Tokens of the original payloads versus the payloads under `config`, per file and in total.
+
+    Args:
+        subtitles_dir: Directory of .srt transcripts.
+        chapters_dir: Directory of chapters JSON files.
+        config: The serialization to compare with the original payloads.
+        count_tokens: Token counter (defaults to the length-based estimate).
+    """
+    transcripts, transcripts_total = _compare(
+        sorted(subtitles_dir.glob("*.srt")),
+        lambda text: text,
+        lambda text: transcript_payload(text, config),
+        count_tokens,
+    )
+    chapters, chapters_total = _compare(
+        sorted(chapters_dir.glob("*.json")),
+        lambda text: serialize_chapters(json.loads(text).get("chapters", [])),
+        lambda text: serialize_chapters(json.loads(text).get("chapters", []), config.chapters_format),
+        count_tokens,
+    )
+    return {
+        "config": config.model_dump(),
+        "transcripts_total": transcripts_total,
+        "chapters_total": chapters_total,
+        "transcripts": transcripts,
+        "chapters": chapters,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare prompt payload tokens before and after compaction.")
+    parser.add_argument(
+        "--chapters-prompts-dir",
+        default="prompts/chapters_extractor_prompts/json_chapters_compact",
+        help="Prompt directory whose config sets the transcript format.",
+    )
+    parser.add_argument(
+        "--questions-prompts-dir",
+        default="prompts/question_creation_prompts_compact",
+        help="Prompt directory whose config sets the chapters format.",
+    )
+    parser.add_argument("--subtitles-dir", type=Path, default=Path("data/subtitles"))
+    parser.add_argument("--chapters-dir", type=Path, default=Path("data/chapters"))
+    parser.add_argument("--api", action="store_true", help="Count tokens with the Gemini API instead of estimating.")
+    parser.add_argument("--model-name", default="gemini-2.5-flash")
+    parser.add_argument("--output", type=Path, default=Path("reports/prompt_tokens.json"))
+    args = parser.parse_args()
+
+    count_tokens = estimate_tokens
+    if args.api:
+        from google import genai
+
+        client = genai.Client()
+
+        def count_tokens(text: str) -> int:
+            return client.models.count_tokens(model=args.model_name, contents=text).total_tokens or 0
+
+    config = load_prompt_config(args.chapters_prompts_dir).model_copy(
+        update={"chapters_format": load_prompt_config(args.questions_prompts_dir).chapters_format}
+    )
+    report = token_report(args.subtitles_dir, args.chapters_dir, config, count_tokens)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(json.dumps({key: value for key, value in report.items() if key.endswith("_total")}, indent=2))
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from loguru import logger
+from pydantic import BaseModel, ConfigDict, Field
+from qdrant_client import models
+
+from create_qdrant_index import fetch_indexed_chapters
+from retrieval import STRATEGIES, HybridSearcher, SearchResult, Strategy, load_questions
+
+DEFAULT_QUESTIONS_DIR = Path("data/questions")
+DEFAULT_METRICS_OUTPUT = Path("reports/query_cache_metrics.json")
+
+
+class CacheSettings(BaseModel):
+    """Bounds and matching rules of the query cache."""
+    max_entries: int = Field(2048, gt=0, description="Cached queries kept; the least recently used go first")
+    ttl_seconds: float | None = Field(3600, gt=0, description="Age after which an entry expires (None: never)")
+    similarity_threshold: float = Field(
+        0.95, gt=0, le=1, description="Cosine similarity of dense query vectors for a semantic hit"
+    )
+    fingerprint_interval_seconds: float = Field(
+        30, ge=0,
+        description="How often a background thread checks a Qdrant server's collection for changes (0: never)",
+    )
+
+
+class CacheMetrics(BaseModel):
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    seconds_saved: float = 0.0
+
+    @property
+    def lookups(self) -> int:
+        return self.exact_hits + self.semantic_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.exact_hits + self.semantic_hits) / self.lookups if self.lookups else 0.0
+
+    def as_dict(self) -> dict:
+        return {**self.model_dump(), "lookups": self.lookups, "hit_rate": self.hit_rate}
+
+
+class CacheEntry(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    results: list[SearchResult]
+    dense: np.ndarray
+    created_at: float
+    # What answering the query took on the miss, i.e. what every later hit saves
+    cost_seconds: float
+
+
+def normalize_query(query: str) -> str:
+    """Casefold, drop punctuation and collapse whitespace, so trivial rewordings share a key."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.casefold()).split())
+
+
+def collection_fingerprint(searcher: HybridSearcher) -> str:
+    """Hash of every indexed point ID and content hash; changes whenever a chapter is added, edited or removed."""
+    indexed = fetch_indexed_chapters(searcher.registry.client, searcher.collection_name)
+    digest = hashlib.sha256()
+    for point_id in sorted(indexed):
+        digest.update(f"{point_id}:{indexed[point_id][0]};".encode())
+    return digest.hexdigest()
+
+
+class CachedSearcher:
+    """
+    Two-tier query cache in front of a HybridSearcher.
+
+    The exact tier is keyed on the normalized query text (plus strategy, limit and
+    filter). On an exact miss only the dense query vector is encoded and compared with
+    the cached queries' vectors; one at or above `similarity_threshold` is a semantic hit
+    and reuses that query's results, skipping the BM25 and ColBERT encodings and the
+    search. Both tiers share one LRU of `max_entries` with a TTL, and the whole cache is
+    dropped when the collection's fingerprint changes.
+
+    The fingerprint scans every point, so it is never computed on the query path: for a
+    Qdrant server a background thread checks it every `fingerprint_interval_seconds`.
+    In-process Qdrant is not thread-safe and only changes when this process indexes,
+    so call `check_collection` after indexing instead.
+    """
+
+    def __init__(self, searcher: HybridSearcher | None = None, settings: CacheSettings = CacheSettings()):
+        """
+        Args:
+            searcher: The searcher whose results are cached.
+            settings: Size, TTL, similarity and invalidation settings.
+        """
+        self.searcher = searcher or HybridSearcher()
+        self.settings = settings
+        self.metrics = CacheMetrics()
+        self._entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint: str | None = None
+        self._stop = threading.Event()
+        if settings.fingerprint_interval_seconds and self.searcher.registry.qdrant_location is None:
+            threading.Thread(target=self._watch, name="query-cache-watcher", daemon=True).start()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _scope(strategy: Strategy, limit: int, query_filter: models.Filter | None) -> tuple:
+        return strategy, limit, query_filter.model_dump_json() if query_filter is not None else None
+
+    def invalidate(self):
+        """Drop every cached query."""
+        with self._lock:
+            self._entries.clear()
+            self.metrics.invalidations += 1
+
+    def close(self):
+        """Stop the background collection checks (a check in progress still finishes)."""
+        self._stop.set()
+
+    def _watch(self):
+        # The first check only records the fingerprint, before much can be cached
+        while True:
+            try:
+                self.check_collection()
+            except Exception as e:
+                logger.warning(f"Could not check the collection for changes: {e}")
+            if self._stop.wait(self.settings.fingerprint_interval_seconds):
+                return
+
+    def check_collection(self):
+        """
+        Invalidate the cache if the collection changed since the last check.
+
+        Queries cached before the first check cannot be matched to a fingerprint, so
+        they are dropped too.
+        """
+        fingerprint = collection_fingerprint(self.searcher)
+        if fingerprint != self._fingerprint and (self._fingerprint is not None or self._entries):
+            logger.info("Collection changed; invalidating the query cache.")
+            self.invalidate()
+        self._fingerprint = fingerprint
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return self.settings.ttl_seconds is not None and now - entry.created_at > self.settings.ttl_seconds
+
+    def _lookup_exact(self, key: tuple, now: float) -> CacheEntry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, now):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _lookup_semantic(self, scope: tuple, dense: np.ndarray, now: float) -> CacheEntry | None:
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if key[1:] == scope and not self._expired(entry, now)
+            ]
+            if not candidates:
+                return None
+            similarities = np.stack([entry.dense for _, entry in candidates]) @ dense
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.settings.similarity_threshold:
+                return None
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key: tuple, entry: CacheEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.settings.max_entries:
+                self._entries.popitem(last=False)
+
+    def _hit(self, entry: CacheEntry, started: float, semantic: bool) -> list[SearchResult]:
+        with self._lock:
+            if semantic:
+                self.metrics.semantic_hits += 1
+            else:
+                self.metrics.exact_hits += 1
+            self.metrics.seconds_saved += max(entry.cost_seconds - (time.perf_counter() - started), 0.0)
+        return list(entry.results)
+
+    def search(
+        self,
+        query: str,
+        strategy: Strategy = "rrf",
+        limit: int = 10,
+        query_filter: models.Filter | None = None,
+    ) -> list[SearchResult]:
+        """`HybridSearcher.search`, answered from the cache when the query (or a close paraphrase) was seen."""
+        started = time.perf_counter()
+        now = time.time()
+        scope = self._scope(strategy, limit, query_filter)
+        key = (normalize_query(query), *scope)
+        entry = self._lookup_exact(key, now)
+        if entry is not None:
+            return self._hit(entry, started, semantic=False)
+
+        dense = next(iter(self.searcher.registry.dense.query_embed([query])))
+        dense = dense / (np.linalg.norm(dense) or 1.0)
+        entry = self._lookup_semantic(scope, dense, now)
+        if entry is not None:
+            return self._hit(entry, started, semantic=True)
+
+        embedding = self.searcher.embed_queries([query], with_late=strategy == "colbert", dense=[dense])[0]
+        results = self.searcher.search_embedded([embedding], strategy, limit, query_filter)[0]
+        with self._lock:
+            self.metrics.misses += 1
+        cost = time.perf_counter() - started
+        self._store(key, CacheEntry(results=results, dense=dense, created_at=now, cost_seconds=cost))
+        return results
+
+    def warm(
+        self,
+        queries: Sequence[str],
+        strategy: Strategy = "rrf",
+        limit: int = 10,
+        batch_size: int = 64,
+    ) -> int:
+        """
+        Search and cache queries ahead of traffic, in batches; warming counts as neither hits nor misses.
+
+        Returns:
+            Number of queries cached.
+        """
+        self.check_collection()
+        scope = self._scope(strategy, limit, None)
+        pending = list(dict.fromkeys(q for q in queries if (normalize_query(q), *scope) not in self._entries))
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+            started = time.perf_counter()
+            embeddings = self.searcher.embed_queries(batch, with_late=strategy == "colbert")
+            results = self.searcher.search_embedded(embeddings, strategy, limit)
+            cost = (time.perf_counter() - started) / len(batch)
+            now = time.time()
+            for query, embedding, query_results in zip(batch, embeddings, results):
+                dense = np.asarray(embedding.dense, dtype=np.float32)
+                dense = dense / (np.linalg.norm(dense) or 1.0)
+                entry = CacheEntry(results=query_results, dense=dense, created_at=now, cost_seconds=cost)
+                self._store((normalize_query(query), *scope), entry)
+        logger.info(f"Warmed the query cache with {len(pending)} queries.")
+        return len(pending)
+
+    def warm_from_questions(
+        self, questions_dir: Path = DEFAULT_QUESTIONS_DIR, strategy: Strategy = "rrf", limit: int = 10
+    ) -> int:
+        """Warm the cache with every RAGQuestion.question in data/questions."""
+        return self.warm([question.question.question for question in load_questions(questions_dir)], strategy, limit)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Warm the query cache from data/questions and replay queries.")
+    parser.add_argument("queries", nargs="*", help="Queries to answer through the warmed cache.")
+    parser.add_argument("--questions-dir", type=Path, default=DEFAULT_QUESTIONS_DIR)
+    parser.add_argument("--strategy", choices=STRATEGIES, default="rrf")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.95, help="Similarity threshold of the semantic tier.")
+    parser.add_argument("--metrics-output", type=Path, default=DEFAULT_METRICS_OUTPUT)
+    args = parser.parse_args()
+
+    cache = CachedSearcher(settings=CacheSettings(similarity_threshold=args.threshold))
+    cache.warm_from_questions(args.questions_dir, args.strategy, args.limit)
+    for query in args.queries:
+        logger.info(f"Query: {query}")
+        for result in cache.search(query, args.strategy, args.limit):
+            logger.info(f"  {result.score:.3f} [{result.video_id} @ {result.timestamp}] {result.heading}")
+    args.metrics_output.parent.mkdir(parents=True, exist_ok=True)
+    args.metrics_output.write_text(json.dumps(cache.metrics.as_dict(), indent=2))
+    logger.info(f"Cache metrics: {cache.metrics.as_dict()}")
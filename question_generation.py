@@ -1,4 +1,5 @@
 
+import asyncio
 import os
 from pathlib import Path
 from pydantic_models import RAGQuestionSet
@@ -6,22 +7,35 @@ from gemini_chat_completion import GeminiChat
 from typing import List
 import weave
 import json
-from tqdm import tqdm
 import logging
 from logging_config import setup_logging
+from gemini_runner import RateLimits, RequestBudget, run_jobs
+from response_cache import ResponseCache
+from prompt_inputs import questions_input_data, load_prompt_config
+from usage_log import usage_context
 
 # Configure logging
 setup_logging(level=logging.INFO, log_to_file=True, log_file="question_generation.log")
 logger = logging.getLogger(__name__)
 
 model_name = "gemini-1.5-flash"
-# Setup GeminiChat instance for structured output
-gemini_chat = GeminiChat(
-    prompts_dir="prompts/question_creation_prompts",
-    output_type="structured",
-    pydantic_model=RAGQuestionSet,
-    model_name=model_name
-)
+DEFAULT_PROMPTS_DIR = "prompts/question_creation_prompts"
+
+
+def make_chat(prompts_dir: str) -> GeminiChat:
+    """GeminiChat instance for structured output with the prompts in `prompts_dir`."""
+    return GeminiChat(
+        prompts_dir=prompts_dir,
+        output_type="structured",
+        pydantic_model=RAGQuestionSet,
+        model_name=model_name,
+        cache=ResponseCache
+    )
+
+
+# Setup GeminiChat instance and the payload format its prompts expect
+gemini_chat = make_chat(DEFAULT_PROMPTS_DIR)
+prompt_config = load_prompt_config(DEFAULT_PROMPTS_DIR)
 
 @weave.op(name="generate_questions")
 def generate_questions(chapters_path: Path, questions_path: Path):
@@ -41,14 +55,8 @@ def generate_questions(chapters_path: Path, questions_path: Path):
             logger.warning(f"No valid chapters data found in {chapters_path}.")
             return
 
-        # Prepare input for GeminiChat
-        input_data = {
-            "overall_summary": chapters_data.get("overall_summary", ""),
-            "chapters": json.dumps(chapters_data.get("chapters", []), indent=2),
-            "topics": chapters_data.get("topics", [])
-        }
-
-        questions_obj = gemini_chat.complete(input_data)
+        with usage_context(stage="questions", video_id=chapters_path.stem):
+            questions_obj = gemini_chat.complete(questions_input_data(chapters_data, prompt_config))
 
         # Save output
         questions_path.write_text(questions_obj.model_dump_json(indent=2), encoding='utf-8')
@@ -60,34 +68,84 @@ def generate_questions(chapters_path: Path, questions_path: Path):
         logger.error(f"Failed to generate questions for {chapters_path.name}: {e}", exc_info=True)
 
 
+async def agenerate_questions(chapters_path: Path) -> RAGQuestionSet | None:
+    """
+    Async version of `generate_questions` for the concurrent runner, which saves the result.
+    :param chapters_path: Path to the chapters JSON file.
+    """
+    try:
+        chapters_data = json.loads(chapters_path.read_text(encoding='utf-8'))
+    except json.JSONDecodeError:
+        logger.error(f"Invalid JSON in {chapters_path}. Skipping.")
+        return None
+    return await agenerate_video_questions(chapters_path.stem, chapters_data)
+
+
+async def agenerate_video_questions(video_id: str, chapters_data: dict) -> RAGQuestionSet | None:
+    """
+    Questions for one video from its chapters document, however it was loaded (JSON file or corpus store).
+    :param video_id: The video the chapters belong to.
+    :param chapters_data: A VideoAnalysis as a dict.
+    """
+    if not chapters_data or "chapters" not in chapters_data:
+        logger.warning(f"No valid chapters data found for {video_id}.")
+        return None
+
+    logger.info(f"Generating questions for {video_id}...")
+    with weave.attributes({'video_id': video_id, 'model': model_name}), \
+            usage_context(stage="questions", video_id=video_id):
+        return await gemini_chat.acomplete(questions_input_data(chapters_data, prompt_config))
+
+
 if __name__ == "__main__":
+    import argparse
     import random
 
+    parser = argparse.ArgumentParser(description="Generate RAG evaluation questions from data/chapters.")
+    parser.add_argument("--sample", type=int, default=5, help="Chapter files to sample (0 for all).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once.")
+    parser.add_argument("--rpm", type=float, default=None, help="Requests per minute budget.")
+    parser.add_argument("--tpm", type=float, default=None, help="Estimated prompt tokens per minute budget.")
+    parser.add_argument(
+        "--prompts-dir", default=DEFAULT_PROMPTS_DIR, help="Prompt directory (its prompt_config.json sets the payload format)."
+    )
+    parser.add_argument("--output-dir", type=Path, default=None, help="Where questions go (default data/questions).")
+    parser.add_argument("--bypass-cache", action="store_true", help="Call the API even for cached requests.")
+    parser.add_argument("--corpus", type=Path, default=None, help="Read chapters from this corpus store directory.")
+    args = parser.parse_args()
+    if args.prompts_dir != DEFAULT_PROMPTS_DIR:
+        gemini_chat = make_chat(args.prompts_dir)
+        prompt_config = load_prompt_config(args.prompts_dir)
+    gemini_chat.bypass_cache = args.bypass_cache
+
     weave.init('huberman-chat')
     cur_dir = Path.cwd()
     data_dir = cur_dir / "data"
     chapters_dir = data_dir / "chapters"
-    questions_dir = data_dir / "questions"
+    questions_dir = args.output_dir or data_dir / "questions"
     questions_dir.mkdir(parents=True, exist_ok=True)
 
-    chapters_files: List[Path] = list(chapters_dir.glob("*.json"))
+    if args.corpus:
+        from corpus_store import CorpusStore
+
+        # One read of the store; each job's input path only names its video
+        analyses = {analysis.video_id: analysis.model_dump() for analysis in CorpusStore(args.corpus).analyses()}
+        chapters_files: List[Path] = [args.corpus / f"{video_id}.json" for video_id in analyses]
+        handler = lambda path: agenerate_video_questions(path.stem, analyses[path.stem])
+    else:
+        chapters_files = list(chapters_dir.glob("*.json"))
+        handler = agenerate_questions
     if not chapters_files:
-        logger.warning("No chapter files found in data/chapters.")
+        logger.warning(f"No chapters found in {args.corpus or 'data/chapters'}.")
     else:
-        # Process a random sample of 5 files for demonstration
-        files_to_process = random.sample(chapters_files, min(5, len(chapters_files)))
-        
-        for chapters_path in tqdm(files_to_process, desc="Generating questions"):
-            try:
-                output_path = questions_dir / f"{chapters_path.stem}.json"
-                if output_path.exists():
-                    logger.info(f"Questions already exist for {chapters_path.name}, skipping.")
-                    continue
-
-                logger.info(f"Generating questions for {chapters_path.name}...")
-                video_id = chapters_path.stem
-                with weave.attributes({'video_id': video_id, 'model': model_name}):
-                    generate_questions(chapters_path, output_path)
-
-            except Exception as e:
-                logger.error(f"Error in main loop for {chapters_path.name}: {e}", exc_info=True)
\ No newline at end of file
+        # Process a random sample of files unless told to process everything
+        files_to_process = (
+            random.sample(chapters_files, min(args.sample, len(chapters_files))) if args.sample else chapters_files
+        )
+        jobs = [(chapters_path, questions_dir / f"{chapters_path.stem}.json") for chapters_path in files_to_process]
+        limits = RateLimits(concurrency=args.concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+        gemini_chat.budget = RequestBudget(limits)
+        asyncio.run(run_jobs(jobs, handler, limits, desc="Generating questions"))
+        logger.info(f"Response cache: {gemini_chat.cache.stats()}")
+        logger.info(f"Concurrency limiter: {gemini_chat.limiter.stats()}")
+        logger.info(f"Token usage and latency recorded to {gemini_chat.usage_log.path}")
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path("cache/responses.sqlite")
+# Default bounds: 1 GB of responses, each kept for 30 days
+DEFAULT_MAX_BYTES = 1024**3
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+
+def response_key(model_name: str, system_prompt: str, user_prompt: str, schema_json: str) -> str:
+    """Content address of a request: SHA-256 over everything that determines the response."""
+    payload = json.dumps([model_name, system_prompt, user_prompt, schema_json])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LLM responses in a local SQLite file, keyed by `response_key`.
+
+    Entries older than `max_age_seconds` are treated as misses and removed. When the
+    stored responses grow past `max_bytes`, the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_seconds: float | None = DEFAULT_MAX_AGE_SECONDS,
+    ):
+        """
+        Args:
+            path: SQLite file, created if missing.
+            max_bytes: Size bound on stored responses.
+            max_age_seconds: Age after which a response expires (None keeps them forever).
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Requests may complete on worker threads; one lock serializes access to the connection
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_name TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.max_age_seconds is not None and now - created_at > self.max_age_seconds
+
+    def get(self, key: str) -> str | None:
+        """Return a stored response, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, size, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._expired(row[2], now):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= row[1]
+                row = None
+            if row is None:
+                self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model_name: str, response: str):
+        """Store a response, evicting old entries if the cache is over its size bound."""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model_name, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, size, now, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._db.commit()
+        if self._total_bytes > self.max_bytes:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Drop expired entries, then least recently used ones until under `max_bytes`.
+
+        Returns:
+            The number of entries removed.
+        """
+        removed = 0
+        with self._lock:
+            if self.max_age_seconds is not None:
+                removed += self._db.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+                ).rowcount
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                evict = []
+                for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((key,))
+                    total -= size
+                self._db.executemany("DELETE FROM responses WHERE key = ?", evict)
+                removed += len(evict)
+            self._db.commit()
+            self._total_bytes = total
+        if removed:
+            logger.info(f"Evicted {removed} cached responses from {self.path}")
+        return removed
+
+    def stats(self) -> dict:
+        """Entry count, stored bytes and this session's hit/miss counters."""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or prune the LLM response cache.")
+    parser.add_argument("command", choices=["info", "prune"])
+    parser.add_argument("--path", type=Path, default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES)
+    parser.add_argument("--max-age-days", type=float, default=DEFAULT_MAX_AGE_SECONDS / 86400)
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.path, args.max_bytes, args.max_age_days * 86400)
+    if args.command == "prune":
+        print(f"Removed {cache.prune()} entries.")
+    print(json.dumps(cache.stats(), indent=2))
+    cache.close()
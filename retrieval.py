@@ -0,0 +1,231 @@
+from pathlib import Path
+from typing import Literal, Sequence
+
+import numpy as np
+from loguru import logger
+from pydantic import BaseModel, Field
+from qdrant_client import models
+
+from colbert_storage import MultivectorStorage, encode
+from create_qdrant_index import COLLECTION_NAME
+from embedding_models import DENSE_MODEL, LATE_INTERACTION_MODEL, SPARSE_MODEL, ModelRegistry
+from pydantic_models import RAGQuestion, RAGQuestionSet
+
+Strategy = Literal["bm25", "dense", "rrf", "colbert"]
+STRATEGIES: tuple[Strategy, ...] = ("bm25", "dense", "rrf", "colbert")
+
+
+class PrefetchLimits(BaseModel):
+    """Candidates fetched by each first-stage search before fusion or reranking."""
+    dense: int = Field(20, description="Candidates from the dense vector search")
+    sparse: int = Field(20, description="Candidates from the BM25 sparse search")
+
+
+class SearchResult(BaseModel):
+    """A retrieved chapter with its score."""
+    point_id: str
+    score: float
+    video_id: str
+    chapter_id: int
+    heading: str
+    content: str
+    timestamp: str
+
+
+class QueryEmbeddings(BaseModel):
+    """The query-side vectors for one query; the ColBERT matrix only when a strategy needs it."""
+    dense: list[float]
+    sparse: models.SparseVector
+    late: list[list[float]] | None = None
+
+
+class HybridSearcher:
+    """
+    Search API over the huberman_clips collection.
+
+    Strategies:
+        bm25: sparse BM25 search only.
+        dense: dense vector search only.
+        rrf: dense + BM25 prefetch fused with Reciprocal Rank Fusion.
+        colbert: dense + BM25 prefetch reranked with the late-interaction multivectors.
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry | None = None,
+        collection_name: str = COLLECTION_NAME,
+        limits: PrefetchLimits = PrefetchLimits(),
+        storage: MultivectorStorage = MultivectorStorage(),
+    ):
+        """
+        Args:
+            registry: Models and Qdrant client to search with (a fresh lazy registry by default).
+            collection_name: Collection built by create_qdrant_index.
+            limits: Per-stage prefetch limits; larger limits trade latency for recall.
+            storage: How the collection stores ColBERT vectors, so queries are encoded to match.
+        """
+        self.registry = registry or ModelRegistry()
+        self.collection_name = collection_name
+        self.limits = limits
+        self.storage = storage
+
+    def embed_queries(
+        self, queries: Sequence[str], with_late: bool = True, dense: Sequence[np.ndarray] | None = None
+    ) -> list[QueryEmbeddings]:
+        """
+        Embed a batch of queries with every model in one call per model.
+
+        Args:
+            queries: Query texts.
+            with_late: Also encode the ColBERT query matrices.
+            dense: Dense vectors already computed for these queries, so they are not encoded again.
+        """
+        queries = list(queries)
+        dense = list(dense) if dense is not None else list(self.registry.dense.query_embed(queries))
+        sparse = list(self.registry.sparse.query_embed(queries))
+        late = list(self.registry.late.query_embed(queries)) if with_late else [None] * len(queries)
+        return [
+            QueryEmbeddings(
+                dense=dense_vector.tolist(),
+                sparse=models.SparseVector(**sparse_vector.as_object()),
+                late=encode(late_matrix, self.storage).tolist() if late_matrix is not None else None,
+            )
+            for dense_vector, sparse_vector, late_matrix in zip(dense, sparse, late)
+        ]
+
+    def _prefetch(self, embedding: QueryEmbeddings, query_filter: models.Filter | None) -> list[models.Prefetch]:
+        return [
+            models.Prefetch(
+                query=embedding.dense,
+                using=DENSE_MODEL,
+                limit=self.limits.dense,
+                filter=query_filter,
+            ),
+            models.Prefetch(
+                query=embedding.sparse,
+                using=SPARSE_MODEL,
+                limit=self.limits.sparse,
+                filter=query_filter,
+            ),
+        ]
+
+    def build_request(
+        self,
+        embedding: QueryEmbeddings,
+        strategy: Strategy = "rrf",
+        limit: int = 10,
+        query_filter: models.Filter | None = None,
+    ) -> models.QueryRequest:
+        """The Qdrant query for one embedded query under a strategy."""
+        common = {"limit": limit, "with_payload": True, "filter": query_filter}
+        if strategy == "bm25":
+            return models.QueryRequest(query=embedding.sparse, using=SPARSE_MODEL, **common)
+        if strategy == "dense":
+            return models.QueryRequest(query=embedding.dense, using=DENSE_MODEL, **common)
+        if strategy == "rrf":
+            return models.QueryRequest(
+                prefetch=self._prefetch(embedding, query_filter),
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                **common,
+            )
+        if strategy == "colbert":
+            if embedding.late is None:
+                raise ValueError("ColBERT reranking needs queries embedded with the late-interaction model")
+            return models.QueryRequest(
+                prefetch=self._prefetch(embedding, query_filter),
+                query=embedding.late,
+                using=LATE_INTERACTION_MODEL,
+                **common,
+            )
+        raise ValueError(f"Unknown strategy: {strategy}")
+
+    def search_embedded(
+        self,
+        embeddings: Sequence[QueryEmbeddings],
+        strategy: Strategy = "rrf",
+        limit: int = 10,
+        query_filter: models.Filter | None = None,
+    ) -> list[list[SearchResult]]:
+        """Run already-embedded queries in a single `query_batch_points` round trip."""
+        if not embeddings:
+            return []
+        responses = self.registry.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[self.build_request(embedding, strategy, limit, query_filter) for embedding in embeddings],
+        )
+        return [[to_result(point) for point in response.points] for response in responses]
+
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        strategy: Strategy = "rrf",
+        limit: int = 10,
+        query_filter: models.Filter | None = None,
+    ) -> list[list[SearchResult]]:
+        """Embed many queries in batches and search them all in one round trip."""
+        embeddings = self.embed_queries(queries, with_late=strategy == "colbert")
+        return self.search_embedded(embeddings, strategy, limit, query_filter)
+
+    def search(
+        self,
+        query: str,
+        strategy: Strategy = "rrf",
+        limit: int = 10,
+        query_filter: models.Filter | None = None,
+    ) -> list[SearchResult]:
+        """Search a single query."""
+        return self.search_batch([query], strategy, limit, query_filter)[0]
+
+
+def to_result(point: models.ScoredPoint) -> SearchResult:
+    payload = point.payload or {}
+    return SearchResult(
+        point_id=str(point.id),
+        score=point.score,
+        video_id=payload.get("video_id", ""),
+        chapter_id=payload.get("chapter_id", 0),
+        heading=payload.get("heading", ""),
+        content=payload.get("content", ""),
+        timestamp=payload.get("timestamp", ""),
+    )
+
+
+class EvalQuestion(BaseModel):
+    """A question from data/questions with the chapters that answer it."""
+    video_id: str
+    question: RAGQuestion
+
+    @property
+    def relevant(self) -> set[tuple[str, int]]:
+        return {(self.video_id, chapter_id) for chapter_id in self.question.ground_truth_reference}
+
+
+def load_questions(questions_dir: Path) -> list[EvalQuestion]:
+    """Every question in every RAGQuestionSet file; the file stem is the video the chapter IDs refer to."""
+    questions = []
+    for path in sorted(questions_dir.glob("*.json")):
+        try:
+            question_set = RAGQuestionSet.model_validate_json(path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.error(f"Skipping {path.name}: {e}")
+            continue
+        questions.extend(EvalQuestion(video_id=path.stem, question=question) for question in question_set.questions)
+    return questions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search the huberman_clips collection.")
+    parser.add_argument("queries", nargs="+", help="One or more questions.")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="rrf")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--dense-limit", type=int, default=20)
+    parser.add_argument("--sparse-limit", type=int, default=20)
+    args = parser.parse_args()
+
+    searcher = HybridSearcher(limits=PrefetchLimits(dense=args.dense_limit, sparse=args.sparse_limit))
+    for query, results in zip(args.queries, searcher.search_batch(args.queries, args.strategy, args.limit)):
+        logger.info(f"Query: {query}")
+        for result in results:
+            logger.info(f"  {result.score:.3f} [{result.video_id} @ {result.timestamp}] {result.heading}")
@@ -0,0 +1,224 @@
+import os
+import struct
+from collections import OrderedDict
+from itertools import groupby
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+from loguru import logger
+
+from pydantic_models import Chapter
+from srt_utils import Cue, format_timestamp, parse_srt, parse_timestamp
+
+DEFAULT_SUBTITLES_DIR = Path("data/subtitles")
+DEFAULT_INDEX_DIR = Path("data/srt_index")
+
+# File layout: header | starts float64[n] | ends float64[n] | offsets int64[n + 1] | UTF-8 text
+MAGIC = b"SRTIDX01"
+HEADER = struct.Struct("<8sQQ")
+
+
+class CueIndex:
+    """
+    Parsed cues of one transcript as parallel arrays, for O(log n) time lookups.
+
+    `starts[i]` and `ends[i]` are cue i's times in seconds (sorted by start) and its
+    text is `text[offsets[i]:offsets[i + 1]]` of a single UTF-8 buffer. Saved indexes
+    are memory-mapped, so loading one reads nothing until a lookup touches it.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, offsets: np.ndarray, text: np.ndarray):
+        self.starts = starts
+        self.ends = ends
+        self.offsets = offsets
+        self.text = text
+
+    @classmethod
+    def from_cues(cls, cues: list[Cue]) -> "CueIndex":
+        """
+        Index cues, dropping lines that repeat the previous line (the rolling lines of
+        auto-generated captions), so spans of consecutive cues read as clean text.
+        """
+        cues = sorted(cues, key=lambda cue: cue.start)
+        pieces = []
+        offsets = [0]
+        last_line = None
+        for cue in cues:
+            lines = []
+            for line in cue.text.split("\n"):
+                line = line.strip()
+                if line and line != last_line:
+                    lines.append(line)
+                    last_line = line
+            piece = "".join(f"{line}\n" for line in lines).encode("utf-8")
+            pieces.append(piece)
+            offsets.append(offsets[-1] + len(piece))
+        return cls(
+            np.array([cue.start for cue in cues], dtype=np.float64),
+            np.array([cue.end for cue in cues], dtype=np.float64),
+            np.array(offsets, dtype=np.int64),
+            np.frombuffer(b"".join(pieces), dtype=np.uint8),
+        )
+
+    @classmethod
+    def from_srt(cls, path: Path) -> "CueIndex":
+        return cls.from_cues(parse_srt(path.read_text(encoding="utf-8")))
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(".tmp")
+        with temporary.open("wb") as file:
+            file.write(HEADER.pack(MAGIC, len(self), len(self.text)))
+            for array in (self.starts, self.ends, self.offsets, self.text):
+                file.write(np.ascontiguousarray(array).tobytes())
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "CueIndex":
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, count, text_bytes = HEADER.unpack(bytes(buffer[: HEADER.size]))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a cue index")
+        position = HEADER.size
+
+        def take(dtype, length):
+            nonlocal position
+            size = np.dtype(dtype).itemsize * length
+            view = buffer[position : position + size].view(dtype)
+            position += size
+            return view
+
+        starts = take(np.float64, count)
+        ends = take(np.float64, count)
+        offsets = take(np.int64, count + 1)
+        text = take(np.uint8, text_bytes)
+        return cls(starts, ends, offsets, text)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def duration(self) -> float:
+        """End of the last cue."""
+        return float(self.ends.max()) if len(self) else 0.0
+
+    def cue_at(self, seconds: float) -> int | None:
+        """Index of the cue showing at `seconds`, or None between cues."""
+        position = int(np.searchsorted(self.starts, seconds, side="right")) - 1
+        if position >= 0 and seconds < self.ends[position]:
+            return position
+        return None
+
+    def span(self, start: float, end: float) -> tuple[int, int]:
+        """[first, last) range of the cues starting in [start, end)."""
+        first = int(np.searchsorted(self.starts, start, side="left"))
+        last = int(np.searchsorted(self.starts, end, side="left"))
+        return first, max(first, last)
+
+    def cue_text(self, first: int, last: int) -> str:
+        """Text of cues [first, last), one line per caption line."""
+        if last <= first:
+            return ""
+        return bytes(self.text[self.offsets[first] : self.offsets[last]]).decode("utf-8").rstrip("\n")
+
+    def text_between(self, start: float, end: float) -> str:
+        """Transcript text of the cues starting in [start, end)."""
+        return self.cue_text(*self.span(start, end))
+
+
+def index_path(video_id: str, index_dir: Path = DEFAULT_INDEX_DIR) -> Path:
+    return index_dir / f"{video_id}.idx"
+
+
+def load_or_build(srt_path: Path, index_dir: Path = DEFAULT_INDEX_DIR) -> CueIndex:
+    """The saved index of a transcript, (re)built when missing or older than the .srt."""
+    path = index_path(srt_path.stem, index_dir)
+    if path.exists() and path.stat().st_mtime >= srt_path.stat().st_mtime:
+        return CueIndex.load(path)
+    index = CueIndex.from_srt(srt_path)
+    index.save(path)
+    return CueIndex.load(path)
+
+
+class TranscriptSpans:
+    """
+    Chapter time bounds and transcript spans, for attaching to index payloads.
+
+    A chapter runs from its timestamp to the next chapter's (or the end of the final
+    cue). `annotate` records the bounds of every chapter it streams past; `payload`
+    then slices the chapter's transcript text out of the video's cue index. Indexes
+    are built once per transcript and a few recently used ones are kept open.
+    """
+
+    def __init__(
+        self, subtitles_dir: Path = DEFAULT_SUBTITLES_DIR, index_dir: Path = DEFAULT_INDEX_DIR, open_indexes: int = 32
+    ):
+        self.subtitles_dir = subtitles_dir
+        self.index_dir = index_dir
+        self.open_indexes = open_indexes
+        self.bounds: dict[tuple[str, int], tuple[float, float]] = {}
+        self._indexes: OrderedDict[str, CueIndex | None] = OrderedDict()
+
+    def index(self, video_id: str) -> CueIndex | None:
+        """The video's cue index, or None if it has no readable transcript."""
+        if video_id in self._indexes:
+            self._indexes.move_to_end(video_id)
+            return self._indexes[video_id]
+        srt_path = self.subtitles_dir / f"{video_id}.srt"
+        index = None
+        if srt_path.exists():
+            try:
+                index = load_or_build(srt_path, self.index_dir)
+            except Exception as e:
+                logger.warning(f"Could not index transcript {srt_path.name}: {e}")
+        self._indexes[video_id] = index
+        if len(self._indexes) > self.open_indexes:
+            self._indexes.popitem(last=False)
+        return index
+
+    def annotate(self, chapters: Iterable[tuple[str, Chapter]]) -> Iterator[tuple[str, Chapter]]:
+        """Pass (video_id, chapter) pairs through, recording each chapter's bounds."""
+        for video_id, group in groupby(chapters, key=lambda pair: pair[0]):
+            video_chapters = [chapter for _, chapter in group]
+            index = self.index(video_id)
+            if index is not None:
+                timed = sorted(
+                    (seconds, chapter.chapter_id)
+                    for chapter in video_chapters
+                    if (seconds := parse_timestamp(chapter.timestamp)) is not None
+                )
+                for position, (seconds, chapter_id) in enumerate(timed):
+                    end = timed[position + 1][0] if position + 1 < len(timed) else max(index.duration, seconds)
+                    self.bounds[(video_id, chapter_id)] = (float(seconds), float(end))
+            for chapter in video_chapters:
+                yield video_id, chapter
+
+    def payload(self, video_id: str, chapter_id: int) -> dict:
+        """end_time, start/end seconds and transcript text of an annotated chapter ({} if unknown)."""
+        bounds = self.bounds.get((video_id, chapter_id))
+        index = self.index(video_id) if bounds else None
+        if bounds is None or index is None:
+            return {}
+        start, end = bounds
+        return {
+            "start_seconds": start,
+            "end_seconds": end,
+            "end_time": format_timestamp(end),
+            "transcript": index.text_between(start, end),
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build cue indexes for every transcript.")
+    parser.add_argument("--subtitles-dir", type=Path, default=DEFAULT_SUBTITLES_DIR)
+    parser.add_argument("--index-dir", type=Path, default=DEFAULT_INDEX_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    srt_files = sorted(args.subtitles_dir.glob("*.srt"))
+    cues = sum(len(load_or_build(srt_path, args.index_dir)) for srt_path in srt_files)
+    logger.info(f"Indexed {cues} cues of {len(srt_files)} transcripts in {time.perf_counter() - start:.1f}s.")
@@ -0,0 +1,142 @@
+import os
+import re
+from pathlib import Path
+
+from pydantic import BaseModel
+
+TIMING_PATTERN = re.compile(
+    r"(\d{1,2}):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d{1,2}):(\d{2}):(\d{2})[,.](\d{3})"
+)
+
+
+class Cue(BaseModel):
+    """One subtitle cue, with times in seconds."""
+    start: float
+    end: float
+    text: str
+
+
+def _seconds(hours: str, minutes: str, seconds: str, milliseconds: str) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(milliseconds) / 1000
+
+
+def parse_srt(text: str) -> list[Cue]:
+    """
+    Parse SRT text into cues.
+
+    Blocks without a timing line are skipped; cue numbers are ignored, so files with
+    missing or repeated numbering still parse.
+    """
+    cues = []
+    for block in re.split(r"\n\s*\n", text.replace("\r\n", "\n").strip()):
+        lines = block.strip().split("\n")
+        for i, line in enumerate(lines):
+            match = TIMING_PATTERN.search(line)
+            if match:
+                groups = match.groups()
+                cues.append(
+                    Cue(
+                        start=_seconds(*groups[:4]),
+                        end=_seconds(*groups[4:]),
+                        text="\n".join(lines[i + 1 :]).strip(),
+                    )
+                )
+                break
+    return cues
+
+
+def format_timestamp(seconds: float) -> str:
+    """Chapter-style timestamp: 'M:SS' below an hour, 'H:MM:SS' above."""
+    total = int(seconds)
+    hours, remainder = divmod(total, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def compact_transcript(cues: list[Cue], bucket_seconds: float = 30) -> str:
+    """
+    Merge cues into one line per time bucket, prefixed with the bucket's first timestamp.
+
+    Auto-generated captions repeat the previous cue's last line as the next cue's first
+    line; such consecutive duplicate lines are kept once.
+    """
+    lines = []
+    bucket = None
+    words: list[str] = []
+    last_line = None
+    for cue in cues:
+        cue_bucket = int(cue.start // bucket_seconds)
+        if cue_bucket != bucket:
+            if len(words) > 1:
+                lines.append(" ".join(words))
+            bucket = cue_bucket
+            words = [f"[{format_timestamp(cue.start)}]"]
+        for line in cue.text.split("\n"):
+            line = line.strip()
+            if line and line != last_line:
+                words.append(line)
+                last_line = line
+    if len(words) > 1:
+        lines.append(" ".join(words))
+    return "\n".join(lines)
+
+
+def parse_timestamp(timestamp: str) -> float | None:
+    """Seconds of a chapter timestamp ('M:SS' or 'H:MM:SS'), or None if it does not parse."""
+    try:
+        parts = [int(part) for part in timestamp.strip().split(":")]
+    except ValueError:
+        return None
+    if len(parts) == 2:
+        return parts[0] * 60 + parts[1]
+    if len(parts) == 3:
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return None
+
+
+def _srt_time(seconds: float) -> str:
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
+
+
+def format_srt(cues: list[Cue]) -> str:
+    """Render cues back to SRT text, numbered from 1."""
+    return "\n\n".join(
+        f"{number}\n{_srt_time(cue.start)} --> {_srt_time(cue.end)}\n{cue.text}"
+        for number, cue in enumerate(cues, start=1)
+    ) + "\n"
+
+
+def read_final_cue_end(path: Path, chunk_size: int = 4096) -> float:
+    """
+    End time of the last cue of an SRT file, reading only its tail.
+
+    Reads backwards from the end in growing chunks until a timing line turns up, so the
+    cost does not depend on the transcript's length.
+
+    Raises:
+        ValueError: The file has no timing line
+    """
+    with path.open("rb") as file:
+        size = file.seek(0, os.SEEK_END)
+        tail = chunk_size
+        while True:
+            offset = max(0, size - tail)
+            file.seek(offset)
+            # A chunk can start mid-character; the lost bytes are never part of a timing line
+            text = file.read().decode("utf-8", errors="ignore")
+            matches = [
+                match for match in TIMING_PATTERN.finditer(text)
+                # A match at the very start of a chunk may be a truncated timing line
+                if offset == 0 or match.start() > 0
+            ]
+            if matches:
+                return _seconds(*matches[-1].groups()[4:])
+            if offset == 0:
+                raise ValueError(f"No timestamps found in {path.name}")
+            tail *= 2
@@ -0,0 +1,130 @@
+import json
+from typing import AsyncIterator, Callable, Iterable, Iterator, Type, get_args
+
+from pydantic import BaseModel
+
+
+class ArrayItemScanner:
+    """
+    Incremental scanner pulling complete elements out of one array of a JSON object.
+
+    Text is fed in arbitrary pieces (e.g. streamed response chunks); every call returns
+    the raw JSON of the elements of `field` (a key of the top-level object) completed
+    by that piece. Elements must be objects or arrays, as with lists of pydantic models.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string = ""
+        self._key: str | None = None
+        self._in_field = False
+        self._item_start: int | None = None
+
+    def feed(self, piece: str) -> list[str]:
+        self.text += piece
+        items = []
+        text = self.text
+        for index in range(self._position, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start : index + 1]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char == ":" and self._depth == 1:
+                self._key = json.loads(self._last_string)
+            elif char == "," and self._depth == 1:
+                self._key = None
+            elif char in "{[":
+                if self._in_field and self._depth == 2:
+                    self._item_start = index
+                elif char == "[" and self._depth == 1 and self._key == self.field:
+                    self._in_field = True
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._in_field and self._depth == 2 and self._item_start is not None:
+                    items.append(text[self._item_start : index + 1])
+                    self._item_start = None
+                elif self._in_field and self._depth == 1:
+                    self._in_field = False
+        self._position = len(text)
+        return items
+
+
+def list_item_model(model: Type[BaseModel], field: str) -> Type[BaseModel]:
+    """The element model of a `list[Model]` field, e.g. Chapter for VideoAnalysis.chapters."""
+    annotation = model.model_fields[field].annotation
+    (item_model,) = get_args(annotation) or (None,)
+    if not (isinstance(item_model, type) and issubclass(item_model, BaseModel)):
+        raise ValueError(f"{model.__name__}.{field} is not a list of pydantic models")
+    return item_model
+
+
+class StructuredStream:
+    """
+    A structured response consumed as it streams.
+
+    Iterating (with `for`, or `async for` over an async source) yields each element of
+    `item_field` as a validated model as soon as its JSON is complete. Once the stream
+    is exhausted, the whole response is validated against `model` and available as
+    `result`.
+    """
+
+    def __init__(
+        self,
+        pieces: Iterable[str] | AsyncIterator[str],
+        model: Type[BaseModel],
+        item_field: str,
+        on_result: Callable[[BaseModel], None] | None = None,
+    ):
+        """
+        Args:
+            pieces: Text chunks of the JSON response, sync or async.
+            model: Model the complete response is validated against.
+            item_field: List field whose elements are yielded while streaming.
+            on_result: Called with the validated result, e.g. to cache it.
+        """
+        self._pieces = pieces
+        self._model = model
+        self._item_model = list_item_model(model, item_field)
+        self._scanner = ArrayItemScanner(item_field)
+        self._on_result = on_result
+        self._result: BaseModel | None = None
+
+    @property
+    def result(self) -> BaseModel:
+        if self._result is None:
+            raise RuntimeError("The stream has not been consumed yet")
+        return self._result
+
+    def _items(self, piece: str) -> list[BaseModel]:
+        return [self._item_model.model_validate_json(raw) for raw in self._scanner.feed(piece)]
+
+    def _finish(self):
+        self._result = self._model.model_validate_json(self._scanner.text)
+        if self._on_result is not None:
+            self._on_result(self._result)
+
+    def __iter__(self) -> Iterator[BaseModel]:
+        for piece in self._pieces:  # type: ignore
+            yield from self._items(piece)
+        self._finish()
+
+    async def __aiter__(self) -> AsyncIterator[BaseModel]:
+        async for piece in self._pieces:  # type: ignore
+            for item in self._items(piece):
+                yield item
+        self._finish()
@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pytest
+from fastembed.sparse.sparse_embedding_base import SparseEmbedding
+
+from embedding_models import DENSE_MODEL, LATE_INTERACTION_MODEL, SPARSE_MODEL, ModelRegistry
+from usage_log import default_usage_log
+
+DENSE_SIZE = 8
+LATE_SIZE = 4
+
+
+class FakeModel:
+    """Deterministic stand-in for a fastembed model; counts the documents it embeds."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.embedded = 0
+
+    def _vector(self, text: str, dim: int) -> np.ndarray:
+        rng = np.random.default_rng(sum(text.encode()))
+        vector = rng.standard_normal(dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def passage_embed(self, documents, **kwargs):
+        for document in documents:
+            self.embedded += 1
+            if self.kind == "dense":
+                yield self._vector(document, DENSE_SIZE)
+            elif self.kind == "sparse":
+                indices = np.array(sorted({len(word) for word in document.split()}))
+                yield SparseEmbedding(values=np.ones(len(indices), dtype=np.float32), indices=indices)
+            else:
+                yield np.stack([self._vector(word, LATE_SIZE) for word in document.split()])
+
+    query_embed = passage_embed
+    embed = passage_embed
+
+
+@pytest.fixture
+def registry(mocker):
+    registry = ModelRegistry(qdrant_location=":memory:")
+    registry._models = {
+        DENSE_MODEL: FakeModel("dense"),
+        SPARSE_MODEL: FakeModel("sparse"),
+        LATE_INTERACTION_MODEL: FakeModel("late"),
+    }
+    sizes = {DENSE_MODEL: DENSE_SIZE, LATE_INTERACTION_MODEL: LATE_SIZE}
+    mocker.patch.object(registry, "vector_size", side_effect=sizes.__getitem__)
+    return registry
+
+
+def write_chapters(directory, video_id, contents):
+    chapters = [
+        {"chapter_id": i + 1, "timestamp": f"{i}:00", "heading": f"Heading {i}", "content": content}
+        for i, content in enumerate(contents)
+    ]
+    path = directory / f"{video_id}.json"
+    path.write_text(
+        json.dumps(
+            {"video_id": video_id, "overall_summary": "Summary.", "chapters": chapters, "topics": ["sleep"]}
+        )
+    )
+    return path
+
+
+@pytest.fixture
+def chapters_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    directory = tmp_path / "data" / "chapters"
+    directory.mkdir(parents=True)
+    write_chapters(directory, "video_a", ["light in the morning", "caffeine timing rules", "naps"])
+    write_chapters(directory, "video_b", ["cold exposure and dopamine", "sauna protocols"])
+    return directory
+
+
+@pytest.fixture(autouse=True)
+def usage_log_path(tmp_path, monkeypatch):
+    """Keep LLM usage recorded by tests out of the real logs/ directory."""
+    path = tmp_path / "llm_usage.jsonl"
+    monkeypatch.setattr(default_usage_log, "path", path)
+    yield path
+    default_usage_log.flush()
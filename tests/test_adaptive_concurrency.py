@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.genai.errors import APIError
+
+from adaptive_concurrency import AdaptiveLimiter, retry_after_seconds
+from gemini_chat_completion import GeminiChat
+from pydantic_models import Chapter
+
+QUOTA_ERROR = {
+    "error": {
+        "code": 429,
+        "status": "RESOURCE_EXHAUSTED",
+        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "0.05s"}],
+    }
+}
+
+
+class FlakyModels:
+    """Fails with the queued errors first, then answers; tracks overlapping calls."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _next(self, contents):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(parsed={"chapter_id": 1, "timestamp": "0:00", "heading": contents, "content": "."})
+
+    def generate_content(self, model, config, contents):
+        return self._next(contents)
+
+    async def agenerate_content(self, model, config, contents):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return self._next(contents)
+
+
+@pytest.fixture
+def make_chat(tmp_path):
+    prompts_dir = tmp_path / "prompts"
+    prompts_dir.mkdir()
+    (prompts_dir / "system_prompt.md").write_text("You write chapters.")
+    (prompts_dir / "user_prompt.md").write_text("{{ transcript }}")
+
+    def make_chat(models, limiter, **kwargs):
+        client = SimpleNamespace(models=models, aio=SimpleNamespace(models=SimpleNamespace(generate_content=models.agenerate_content)))
+        return GeminiChat(
+            str(prompts_dir), output_type="structured", pydantic_model=Chapter, client=client, limiter=limiter, **kwargs
+        )
+
+    return make_chat
+
+
+def test_aimd_halves_on_overload_and_probes_up_on_success():
+    limiter = AdaptiveLimiter(initial_limit=8, decrease_interval=0)
+    limiter.record_failure(overloaded=True)
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.record_success()
+    assert 4.9 < limiter.limit < 5.1
+    assert limiter.error_rate == 0.2
+
+
+def test_retry_hints_from_body_and_header():
+    assert retry_after_seconds(APIError(429, QUOTA_ERROR)) == 0.05
+    error = APIError(503, {"error": {"code": 503}}, response=SimpleNamespace(headers={"retry-after": "7"}))
+    assert retry_after_seconds(error) == 7.0
+
+
+def test_complete_retries_overloads_up_to_max_retries(make_chat):
+    limiter = AdaptiveLimiter(initial_limit=4)
+    models = FlakyModels([APIError(429, QUOTA_ERROR), APIError(503, {"error": {"code": 503}})])
+    chat = make_chat(models, limiter, max_retries=2, retry_delay=0.01)
+
+    assert chat.complete({"transcript": "Sleep"}).heading == "Sleep"
+    assert models.calls == 3
+    assert limiter.limit < 4
+    assert limiter.stats()["overloads"] == 2
+
+
+def test_non_retryable_errors_and_exhausted_retries_raise(make_chat):
+    limiter = AdaptiveLimiter()
+    chat = make_chat(FlakyModels([APIError(400, {"error": {"code": 400}})]), limiter, retry_delay=0.01)
+    with pytest.raises(APIError):
+        chat.complete({"transcript": "Sleep"})
+
+    models = FlakyModels([APIError(500, {"error": {"code": 500}})] * 2)
+    with pytest.raises(APIError):
+        make_chat(models, limiter, max_retries=1, retry_delay=0.01).complete({"transcript": "Sleep"})
+    assert models.calls == 2
+
+
+def test_async_calls_stay_within_the_limit(make_chat):
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=2)
+    models = FlakyModels()
+    chat = make_chat(models, limiter)
+
+    async def run():
+        return await asyncio.gather(*(chat.acomplete({"transcript": f"t{i}"}) for i in range(8)))
+
+    assert len(asyncio.run(run())) == 8
+    assert models.max_in_flight == 2
+    assert limiter.in_flight == 0
@@ -0,0 +1,63 @@
+import json
+
+from benchmark_retrieval import run_benchmark, score_question
+from create_qdrant_index import create_index
+from retrieval import HybridSearcher, SearchResult, load_questions
+
+
+def result(video_id, chapter_id):
+    return SearchResult(
+        point_id="", score=0.0, video_id=video_id, chapter_id=chapter_id, heading="", content="", timestamp=""
+    )
+
+
+def question(question_id, text, chapters, difficulty="simple", scope="single_chapter"):
+    return {
+        "question_id": question_id,
+        "question": text,
+        "expected_answer_type": "descriptive",
+        "context_requirements": "",
+        "ground_truth_reference": chapters,
+        "difficulty_level": difficulty,
+        "answer_scope": scope,
+        "question_category": "sleep",
+    }
+
+
+def test_hits_match_video_and_chapter():
+    results = [result("video_b", 1), result("video_a", 2), result("video_a", 1)]
+    scores = score_question(results, {("video_a", 1), ("video_a", 3)}, ks=[1, 3])
+    assert scores["mrr"] == 1 / 3
+    assert scores["precision@1"] == 0.0
+    assert scores["precision@3"] == 1 / 3
+    assert scores["recall@3"] == 0.5
+
+
+def test_benchmark_reports_quality_breakdowns_and_latency(registry, chapters_dir):
+    questions_dir = chapters_dir.parent / "questions"
+    questions_dir.mkdir()
+    (questions_dir / "video_a.json").write_text(
+        json.dumps(
+            {
+                "questions": [
+                    question(1, "naps", [3]),
+                    question(2, "caffeine timing rules", [1, 2], "complex", "cross_chapter"),
+                ]
+            }
+        )
+    )
+    create_index(batch_size=4, cache_dir=None, registry=registry)
+
+    report = run_benchmark(
+        HybridSearcher(registry=registry), load_questions(questions_dir), ["dense"], ks=[1, 3], concurrency_levels=[1, 2]
+    )
+
+    dense = report["strategies"]["dense"]
+    assert dense["quality"]["overall"]["questions"] == 2
+    assert dense["quality"]["overall"]["precision@1"] == 1.0
+    assert set(dense["quality"]["by_difficulty_level"]) == {"simple", "complex"}
+    assert dense["quality"]["by_answer_scope"]["cross_chapter"]["recall@1"] == 0.5
+    # In-process Qdrant is not thread-safe, so only single-threaded throughput is measured
+    assert [run["concurrency"] for run in dense["latency"]] == [1]
+    assert "concurrency_note" in report
+    assert json.dumps(report)
@@ -0,0 +1,62 @@
+import json
+
+from chapter_timestamp_validators import ValidationSettings, check_chapters, validate_all_transcripts_and_chapters
+from srt_utils import Cue, format_srt, read_final_cue_end
+
+
+def chapter(chapter_id, timestamp):
+    return {"chapter_id": chapter_id, "timestamp": timestamp, "heading": f"Heading {chapter_id}", "content": "..."}
+
+
+def write_srt(path, cue_count, seconds_per_cue=4.0):
+    cues = [Cue(start=i * seconds_per_cue, end=(i + 1) * seconds_per_cue, text=f"Line {i} ünïcödé") for i in range(cue_count)]
+    path.write_text(format_srt(cues), encoding="utf-8")
+
+
+def test_tail_reader_finds_the_final_cue(tmp_path):
+    path = tmp_path / "long.srt"
+    write_srt(path, 1500)
+    assert read_final_cue_end(path, chunk_size=64) == 6000.0
+    assert read_final_cue_end(path) == 6000.0
+
+
+def test_check_chapters_flags_every_kind():
+    chapters = [
+        chapter(1, "0:00"), chapter(2, "0:10"), chapter(3, "0:05"), chapter(4, "bad"), chapter(5, "3:00:00"),
+    ]
+    issues = check_chapters(chapters, 600.0, ValidationSettings(min_gap_seconds=30))
+    kinds = [(issue.kind, issue.chapter_id) for issue in issues]
+    assert kinds == [
+        ("gap_too_small", 2),
+        ("not_increasing", 3),
+        ("parse_error", 4),
+        ("exceeds_duration", 5),
+    ]
+
+    uncovered = check_chapters([chapter(1, "0:00"), chapter(2, "5:00")], 7200.0, ValidationSettings())
+    assert [issue.kind for issue in uncovered] == ["final_cue_not_covered"]
+
+
+def test_validate_all_writes_report_and_mistakes_log(tmp_path):
+    subtitles, chapters = tmp_path / "subtitles", tmp_path / "chapters"
+    subtitles.mkdir()
+    chapters.mkdir()
+    for video_id in ("close", "good", "late", "orphan"):
+        write_srt(subtitles / f"{video_id}.srt", 300)
+    (chapters / "close.json").write_text(json.dumps({"chapters": [chapter(1, "0:00"), chapter(2, "0:10")]}))
+    (chapters / "good.json").write_text(json.dumps({"chapters": [chapter(1, "0:00"), chapter(2, "10:00")]}))
+    (chapters / "late.json").write_text(json.dumps({"chapters": [chapter(1, "0:00"), chapter(2, "25:00")]}))
+
+    report = validate_all_transcripts_and_chapters(
+        subtitles, chapters, workers=2,
+        report_path=tmp_path / "report.json", mistakes_log_path=tmp_path / "mistakes.log",
+    )
+
+    assert report["summary"]["pairs"] == 3
+    assert report["summary"]["valid"] == 1
+    assert report["summary"]["issues_by_kind"] == {"exceeds_duration": 1, "gap_too_small": 1}
+    assert report["missing_chapters"] == ["orphan.srt"]
+    assert [result["video_id"] for result in report["results"]] == ["close", "late"]
+    assert json.loads((tmp_path / "report.json").read_text()) == report
+    # The mistakes log keeps to the original checks; chapters that are merely close together are only reported
+    assert (tmp_path / "mistakes.log").read_text().splitlines() == ["Missing chapters file for orphan.srt", "late.srt"]
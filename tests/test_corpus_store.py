@@ -0,0 +1,95 @@
+import json
+
+from add_chapter_ids import add_chapter_ids_to_store
+from chapter_timestamp_validators import validate_all_transcripts_and_chapters
+from conftest import write_chapters
+from corpus_store import CorpusStore, export_json, import_json, iter_store_chapters
+from create_qdrant_index import COLLECTION_NAME, create_index, iter_chapters
+from pydantic_models import RAGQuestionSet, VideoAnalysis
+from srt_utils import Cue, format_srt
+
+QUESTIONS = {
+    "questions": [
+        {
+            "question_id": 1,
+            "question": "When should I get morning light?",
+            "expected_answer_type": "prescriptive",
+            "context_requirements": "Light timing",
+            "ground_truth_reference": [1],
+            "difficulty_level": "simple",
+            "answer_scope": "single_chapter",
+            "question_category": "sleep",
+        }
+    ]
+}
+
+
+def test_json_round_trip(chapters_dir, tmp_path):
+    questions_dir = tmp_path / "data" / "questions"
+    questions_dir.mkdir()
+    (questions_dir / "video_a.json").write_text(json.dumps(QUESTIONS))
+    store = CorpusStore(tmp_path / "corpus")
+
+    assert import_json(store, chapters_dir, questions_dir) == (2, 1)
+    assert store.video_ids() == ["video_a", "video_b"]
+    assert store.chapters().num_rows == 5
+
+    out = tmp_path / "export"
+    assert export_json(store, out / "chapters", out / "questions") == (2, 1)
+    for path in chapters_dir.glob("*.json"):
+        exported = VideoAnalysis.model_validate_json((out / "chapters" / path.name).read_text())
+        assert exported == VideoAnalysis.model_validate_json(path.read_text())
+    assert RAGQuestionSet.model_validate_json((out / "questions" / "video_a.json").read_text()) == (
+        RAGQuestionSet.model_validate(QUESTIONS)
+    )
+
+
+def test_rewritten_video_supersedes_old_rows_and_compaction_keeps_them(chapters_dir, tmp_path):
+    store = CorpusStore(tmp_path / "corpus")
+    import_json(store, chapters_dir, tmp_path / "none")
+    write_chapters(chapters_dir, "video_a", ["only one chapter now"])
+    store.write_analyses([VideoAnalysis.model_validate_json((chapters_dir / "video_a.json").read_text())])
+
+    assert store.chapters(["video_a"]).column("content").to_pylist() == ["only one chapter now"]
+    assert store.chapters(["video_b"]).num_rows == 2
+    before = store.chapters()
+
+    store.compact()
+    assert len(list((tmp_path / "corpus" / "chapters").glob("*.parquet"))) == 1
+    assert store.chapters().equals(before)
+    assert len(store.videos()) == 2
+
+
+def test_store_feeds_the_index_like_json_files(registry, chapters_dir, tmp_path):
+    store = CorpusStore(tmp_path / "corpus")
+    import_json(store, chapters_dir, tmp_path / "none")
+    assert list(iter_store_chapters(store)) == list(iter_chapters(sorted(chapters_dir.glob("*.json"))))
+
+    create_index(batch_size=4, cache_dir=None, registry=registry, corpus=store)
+    assert registry.client.count(COLLECTION_NAME).count == 5
+
+
+def test_chapter_ids_and_validation_work_from_the_store(chapters_dir, tmp_path):
+    store = CorpusStore(tmp_path / "corpus")
+    import_json(store, chapters_dir, tmp_path / "none")
+    analysis = next(store.analyses(["video_a"]))
+    chapters = [chapter.model_copy(update={"chapter_id": 10 * chapter.chapter_id}) for chapter in analysis.chapters]
+    store.write_analyses([analysis.model_copy(update={"chapters": chapters})])
+
+    assert add_chapter_ids_to_store(store) == 1
+    assert store.chapters(["video_a"]).column("chapter_id").to_pylist() == [1, 2, 3]
+    assert add_chapter_ids_to_store(store) == 0
+
+    # The validator needs only the transcripts and the store, not the JSON files
+    subtitles = tmp_path / "data" / "subtitles"
+    subtitles.mkdir()
+    for video_id in ("video_a", "video_b"):
+        cues = [Cue(start=4.0 * i, end=4.0 * (i + 1), text=f"Line {i}") for i in range(300)]
+        (subtitles / f"{video_id}.srt").write_text(format_srt(cues), encoding="utf-8")
+    for path in chapters_dir.glob("*.json"):
+        path.unlink()
+    report = validate_all_transcripts_and_chapters(
+        subtitles, chapters_dir, workers=1, report_path=tmp_path / "report.json",
+        mistakes_log_path=tmp_path / "mistakes.log", corpus=store,
+    )
+    assert report["summary"]["pairs"] == report["summary"]["valid"] == 2
@@ -0,0 +1,127 @@
+import pytest
+from pydantic import ValidationError
+
+import create_qdrant_index
+from colbert_storage import MultivectorStorage
+from create_qdrant_index import (
+    COLLECTION_NAME,
+    DENSE_MODEL,
+    LATE_INTERACTION_MODEL,
+    SPARSE_MODEL,
+    chapter_content_hash,
+    chapter_point_id,
+    create_index,
+    iter_chapters,
+)
+from conftest import write_chapters
+from pydantic_models import Chapter
+
+
+def test_importing_module_loads_no_models():
+    assert create_qdrant_index.model_registry._models == {}
+    assert create_qdrant_index.model_registry._client is None
+
+
+def test_point_id_is_deterministic_and_distinct():
+    assert chapter_point_id("video_a", 1) == chapter_point_id("video_a", 1)
+    assert chapter_point_id("video_a", 1) != chapter_point_id("video_a", 2)
+    assert chapter_point_id("video_a", 1) != chapter_point_id("video_b", 1)
+
+
+def test_content_hash_changes_with_any_field():
+    chapter = Chapter(chapter_id=1, timestamp="0:00", heading="Sleep", content="Get morning light.")
+    assert chapter_content_hash(chapter) != chapter_content_hash(chapter.model_copy(update={"timestamp": "0:01"}))
+    assert chapter_content_hash(chapter) != chapter_content_hash(chapter.model_copy(update={"heading": "Light"}))
+
+
+def test_iter_chapters_skips_and_reports_broken_files(chapters_dir):
+    (chapters_dir / "broken.json").write_text("{not json")
+    failed = set()
+    chapters = list(iter_chapters(sorted(chapters_dir.glob("*.json")), failed))
+    assert len(chapters) == 5
+    assert failed == {"broken"}
+
+
+def test_create_index_batches_across_files(registry, chapters_dir):
+    create_index(batch_size=4, cache_dir=None, registry=registry)
+    assert registry.client.count(COLLECTION_NAME).count == 5
+    assert registry.get(DENSE_MODEL).embedded == 5
+
+
+def test_local_qdrant_upserts_are_all_searchable(registry, chapters_dir):
+    create_index(batch_size=2, upload_workers=4, cache_dir=None, registry=registry)
+    dense = registry.get(DENSE_MODEL)
+    for content in ["light in the morning", "caffeine timing rules", "naps", "cold exposure and dopamine"]:
+        vector = next(dense.query_embed([content])).tolist()
+        hits = registry.client.query_points(COLLECTION_NAME, query=vector, using=DENSE_MODEL, limit=1).points
+        assert hits[0].payload["content"] == content
+
+
+def test_create_index_reads_the_given_directory_and_reports_failures(registry, chapters_dir, mocker):
+    other = chapters_dir.parent / "other"
+    other.mkdir()
+    write_chapters(other, "video_c", ["sunlight", "hydration"])
+    assert create_index(batch_size=4, cache_dir=None, registry=registry, chapters_dir=other) is True
+    assert registry.client.count(COLLECTION_NAME).count == 2
+
+    mocker.patch.object(registry.client, "upsert", side_effect=RuntimeError("Qdrant unreachable"))
+    assert create_index(batch_size=4, cache_dir=None, registry=registry) is False
+
+
+def test_rerun_only_embeds_changed_chapters_and_deletes_removed(registry, chapters_dir):
+    create_index(batch_size=4, cache_dir=None, registry=registry)
+    write_chapters(chapters_dir, "video_a", ["light in the morning", "caffeine timing, revised"])
+    registry.get(DENSE_MODEL).embedded = 0
+
+    create_index(batch_size=4, cache_dir=None, registry=registry)
+
+    assert registry.get(DENSE_MODEL).embedded == 1
+    assert registry.client.count(COLLECTION_NAME).count == 4
+
+
+def test_embedding_cache_skips_cached_models(registry, chapters_dir, tmp_path):
+    create_index(batch_size=4, cache_dir=tmp_path / "cache", registry=registry)
+    registry.client.delete_collection(COLLECTION_NAME)
+    for name in (DENSE_MODEL, SPARSE_MODEL, LATE_INTERACTION_MODEL):
+        registry.get(name).embedded = 0
+
+    create_index(batch_size=4, cache_dir=tmp_path / "cache", registry=registry)
+
+    assert registry.get(DENSE_MODEL).embedded == 0
+    assert registry.get(LATE_INTERACTION_MODEL).embedded == 0
+    assert registry.get(SPARSE_MODEL).embedded == 5
+    assert registry.client.count(COLLECTION_NAME).count == 5
+
+
+def test_float16_multivectors_are_indexed(registry, chapters_dir):
+    create_index(
+        batch_size=4,
+        cache_dir=None,
+        registry=registry,
+        storage=MultivectorStorage(datatype="float16"),
+    )
+    config = registry.client.get_collection(COLLECTION_NAME).config.params.vectors
+    assert config[LATE_INTERACTION_MODEL].datatype == "float16"
+    assert registry.client.count(COLLECTION_NAME).count == 5
+
+
+def test_uint8_multivectors_are_not_an_option():
+    # Shifting components onto 0-255 would break Qdrant's cosine MaxSim; int8 quantization is the compact option
+    with pytest.raises(ValidationError):
+        MultivectorStorage(datatype="uint8")  # type: ignore
+
+
+def test_bulk_load_restores_indexing(registry, chapters_dir, mocker):
+    create_index(batch_size=4, cache_dir=None, registry=registry)
+    original = registry.client.get_collection(COLLECTION_NAME).config.optimizer_config
+    update = mocker.spy(registry.client, "update_collection")
+
+    create_index(batch_size=4, cache_dir=None, registry=registry, bulk=True)
+
+    deferred, restored = [call.kwargs["optimizers_config"] for call in update.call_args_list]
+    assert (deferred.indexing_threshold, deferred.max_optimization_threads) == (0, 0)
+    assert restored.indexing_threshold == original.indexing_threshold
+    assert restored.max_optimization_threads == original.max_optimization_threads
+    collection = registry.client.get_collection(COLLECTION_NAME)
+    assert collection.status == "green"
+    assert registry.client.count(COLLECTION_NAME).count == 5
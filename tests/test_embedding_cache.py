@@ -0,0 +1,106 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache, EmbeddingStore
+
+
+def test_dense_store_round_trip(tmp_path):
+    store = EmbeddingStore(tmp_path, "dense-model", "v1", dim=3, multivector=False)
+    store.put_many(["a", "b"], [np.array([1, 2, 3]), np.array([4, 5, 6])])
+
+    hits = store.get_many(["b", "missing", "a"])
+
+    np.testing.assert_array_equal(hits[0], [4, 5, 6])
+    assert hits[1] is None
+    np.testing.assert_array_equal(hits[2], [1, 2, 3])
+
+
+def test_ragged_store_keeps_token_counts_across_reopen(tmp_path):
+    store = EmbeddingStore(tmp_path, "late-model", "v1", dim=2, multivector=True)
+    short, long = np.ones((1, 2)), np.arange(10, dtype=np.float32).reshape(5, 2)
+    store.put_many(["short", "long"], [short, long])
+    store.close()
+
+    reopened = EmbeddingStore(tmp_path, "late-model", "v1", dim=2, multivector=True)
+    short_hit, long_hit = reopened.get_many(["short", "long"])
+
+    assert short_hit.shape == (1, 2)
+    np.testing.assert_array_equal(long_hit, long)
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(tmp_path, max_bytes=2 * 4 * 4)
+    cache.add_model("dense-model", dim=4)
+    cache.put_many("dense-model", ["old", "mid", "new"], np.eye(3, 4))
+    cache.get_many("dense-model", ["mid"])
+    cache.get_many("dense-model", ["new"])
+
+    assert cache.prune() == 1
+
+    old, mid, new = cache.get_many("dense-model", ["old", "mid", "new"])
+    assert old is None
+    np.testing.assert_array_equal(mid, np.eye(3, 4)[1])
+    np.testing.assert_array_equal(new, np.eye(3, 4)[2])
+
+
+def test_interrupted_prune_keeps_index_and_vectors_consistent(tmp_path, mocker):
+    def reopen():
+        return EmbeddingStore(tmp_path, "dense-model", "v1", dim=4, multivector=False)
+
+    def use_mid_and_new(store):
+        store.get_many(["mid"])
+        store.get_many(["new"])
+
+    store = reopen()
+    store.put_many(["old", "mid", "new"], np.eye(3, 4))
+    use_mid_and_new(store)
+
+    # Dying while the compacted file is written leaves the old file and offsets in use
+    mocker.patch("embedding_cache.os.fsync", side_effect=OSError("disk full"))
+    with pytest.raises(OSError):
+        store.prune(2 * 4 * 4)
+    mocker.stopall()
+    store = reopen()
+    np.testing.assert_array_equal(store.get_many(["old", "mid", "new"]), np.eye(3, 4))
+    use_mid_and_new(store)
+
+    # Dying after the commit, before the old file is removed, leaves the compacted one in use
+    mocker.patch.object(Path, "unlink", side_effect=OSError("killed"))
+    with pytest.raises(OSError):
+        store.prune(2 * 4 * 4)
+    mocker.stopall()
+    store = reopen()
+    old, mid, new = store.get_many(["old", "mid", "new"])
+    assert old is None
+    np.testing.assert_array_equal(mid, np.eye(3, 4)[1])
+    np.testing.assert_array_equal(new, np.eye(3, 4)[2])
+
+    # The next compaction removes the files the interrupted ones left behind
+    store.put_many(["newest"], [np.ones(4)])
+    store.prune(2 * 4 * 4)
+    assert [path.name for path in store.path.glob("vectors*.f32")] == [store.vectors_path.name]
+
+
+def test_rows_appended_without_their_entries_are_dropped_on_open(tmp_path, mocker):
+    def reopen():
+        return EmbeddingStore(tmp_path, "dense-model", "v1", dim=4, multivector=False)
+
+    store = reopen()
+    store.put_many(["a"], [np.ones(4)])
+    # Killed after appending rows, before their entries committed, and mid-way through a row
+    mocker.patch("embedding_cache.os.fsync", side_effect=OSError("killed"))
+    with pytest.raises(OSError):
+        store.put_many(["b"], [np.full(4, 2.0)])
+    mocker.stopall()
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\x00" * 6)
+
+    store = reopen()
+    assert store.nbytes == 4 * 4
+    store.put_many(["c"], [np.full(4, 3.0)])
+    a, b, c = store.get_many(["a", "b", "c"])
+    assert b is None
+    np.testing.assert_array_equal(a, np.ones(4))
+    np.testing.assert_array_equal(c, np.full(4, 3.0))
@@ -0,0 +1,22 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from embedding_models import DENSE_MODEL, ModelRegistry
+
+
+def test_concurrent_first_use_loads_a_model_once(mocker):
+    loads = []
+
+    def slow_model(model_name, threads):
+        loads.append(threading.get_ident())
+        time.sleep(0.05)
+        return object()
+
+    mocker.patch.dict("embedding_models.MODEL_CLASSES", {DENSE_MODEL: slow_model})
+    registry = ModelRegistry(qdrant_location=":memory:")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        models = list(pool.map(lambda _: registry.dense, range(4)))
+
+    assert len(loads) == 1
+    assert all(model is models[0] for model in models)
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from gemini_batch import collect_batch_results, read_retry_keys, write_batch_requests
+from gemini_chat_completion import GeminiChat
+from pydantic_models import VideoAnalysis
+
+
+@pytest.fixture
+def chat(tmp_path):
+    prompts_dir = tmp_path / "prompts"
+    prompts_dir.mkdir()
+    (prompts_dir / "system_prompt.md").write_text("You write chapters.")
+    (prompts_dir / "user_prompt.md").write_text("{{ transcript }}")
+    return GeminiChat(str(prompts_dir), output_type="structured", pydantic_model=VideoAnalysis)
+
+
+def fake_batch_service(request_files, results_path, failing_keys=()):
+    """Answer every request line the way the batch service writes result lines."""
+    with results_path.open("w") as results:
+        for request_file in request_files:
+            for line in request_file.read_text().splitlines():
+                request = json.loads(line)
+                key = request["key"]
+                if key in failing_keys:
+                    results.write(json.dumps({"key": key, "error": {"code": 13, "message": "internal"}}) + "\n")
+                    continue
+                transcript = request["request"]["contents"][0]["parts"][0]["text"]
+                analysis = {
+                    "video_id": "ignored",
+                    "overall_summary": transcript,
+                    "chapters": [{"chapter_id": 1, "timestamp": "0:00", "heading": "Intro", "content": "Hi."}],
+                    "topics": ["sleep"],
+                }
+                text = json.dumps(analysis) if key != "truncated" else json.dumps(analysis)[:40]
+                response = {"candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": "STOP"}]}
+                results.write(json.dumps({"key": key, "response": response}) + "\n")
+
+
+def test_requests_are_sharded_and_keyed_by_video(chat, tmp_path):
+    items = [(f"video_{i}", {"transcript": f"transcript {i}"}) for i in range(5)]
+
+    shards = write_batch_requests(chat, items, tmp_path / "requests", shard_size=2)
+
+    assert [path.name for path in shards] == ["requests-00000.jsonl", "requests-00001.jsonl", "requests-00002.jsonl"]
+    first = json.loads(shards[0].read_text().splitlines()[0])
+    assert first["key"] == "video_0"
+    assert first["request"]["contents"][0]["parts"][0]["text"] == "transcript 0"
+    assert first["request"]["generation_config"]["response_mime_type"] == "application/json"
+
+
+def test_collect_writes_valid_outputs_and_queues_failures(chat, tmp_path):
+    items = [(key, {"transcript": key}) for key in ["video_a", "video_b", "truncated"]]
+    shards = write_batch_requests(chat, items, tmp_path / "requests")
+    results_path = tmp_path / "results.jsonl"
+    fake_batch_service(shards, results_path, failing_keys={"video_b"})
+
+    summary = collect_batch_results(chat, [results_path], tmp_path / "chapters", tmp_path / "retry.jsonl")
+
+    assert summary.model_dump() == {"written": 1, "failed": 2}
+    analysis = VideoAnalysis.model_validate_json((tmp_path / "chapters" / "video_a.json").read_text())
+    assert analysis.video_id == "video_a"
+    assert read_retry_keys(tmp_path / "retry.jsonl") == {"video_b", "truncated"}
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_chat_completion import GeminiChat
+from gemini_runner import RateLimits, TokenBucket, run_jobs
+from pydantic_models import Chapter
+
+
+class FakeAsyncModels:
+    """Stands in for `client.aio.models`, tracking how many requests overlap."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    async def generate_content(self, model, config, contents):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return SimpleNamespace(
+            text=contents,
+            parsed={"chapter_id": 1, "timestamp": "0:00", "heading": contents, "content": "Summary."},
+        )
+
+
+@pytest.fixture
+def fake_chat(tmp_path):
+    prompts_dir = tmp_path / "prompts"
+    prompts_dir.mkdir()
+    (prompts_dir / "system_prompt.md").write_text("You write chapters.")
+    (prompts_dir / "user_prompt.md").write_text("{{ transcript }}")
+    client = SimpleNamespace(aio=SimpleNamespace(models=FakeAsyncModels()))
+    return GeminiChat(str(prompts_dir), output_type="structured", pydantic_model=Chapter, client=client)
+
+
+def test_acomplete_parses_structured_output(fake_chat):
+    chapter = asyncio.run(fake_chat.acomplete({"transcript": "Morning light"}))
+    assert chapter == Chapter(chapter_id=1, timestamp="0:00", heading="Morning light", content="Summary.")
+
+
+def test_run_jobs_bounds_concurrency_and_skips_existing(fake_chat, tmp_path):
+    jobs = []
+    for i in range(6):
+        input_path = tmp_path / f"video_{i}.srt"
+        input_path.write_text(f"transcript {i}")
+        jobs.append((input_path, tmp_path / f"video_{i}.json"))
+    jobs[0][1].write_text("{}")
+
+    async def handler(path):
+        return await fake_chat.acomplete({"transcript": path.read_text()})
+
+    summary = asyncio.run(run_jobs(jobs, handler, RateLimits(concurrency=2)))
+
+    fake_models = fake_chat.client.aio.models
+    assert summary.model_dump() == {"completed": 5, "skipped": 1, "failed": 0}
+    assert fake_models.calls == 5
+    assert fake_models.max_in_flight == 2
+    assert jobs[0][1].read_text() == "{}"
+    assert Chapter.model_validate_json(jobs[3][1].read_text()).heading == "transcript 3"
+
+
+def test_token_bucket_throttles_past_burst():
+    async def take(bucket, times):
+        for _ in range(times):
+            await bucket.acquire()
+
+    bucket = TokenBucket(per_minute=1200, capacity=2)  # 20 per second after a burst of 2
+    start = time.monotonic()
+    asyncio.run(take(bucket, 4))
+    assert time.monotonic() - start >= 0.09
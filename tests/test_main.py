@@ -0,0 +1,115 @@
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+from adaptive_concurrency import AdaptiveLimiter
+from create_qdrant_index import create_index
+from gemini_chat_completion import GeminiChat
+from main import DEFAULT_PROMPTS_DIR, ChatService
+from query_cache import CachedSearcher
+from retrieval import HybridSearcher
+
+PROMPTS_DIR = Path(__file__).parent.parent / DEFAULT_PROMPTS_DIR
+
+
+class FakeStreamingModels:
+    """Streams a fixed answer, optionally holding the stream open until released."""
+
+    def __init__(self, pieces: list[str]):
+        self.pieces = pieces
+        self.calls = 0
+        self.prompts = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def generate_content_stream(self, model, config, contents):
+        self.calls += 1
+        self.prompts.append(contents)
+
+        async def chunks():
+            for i, piece in enumerate(self.pieces):
+                if i == 1:
+                    await self.release.wait()
+                yield SimpleNamespace(text=piece, usage_metadata=None)
+
+        return chunks()
+
+
+def make_service(registry, models) -> ChatService:
+    create_index(batch_size=4, cache_dir=None, registry=registry, subtitles_dir=None)
+    chat = GeminiChat(
+        str(PROMPTS_DIR), output_type="text", client=SimpleNamespace(aio=SimpleNamespace(models=models)),
+        limiter=AdaptiveLimiter(),
+    )
+    return ChatService(CachedSearcher(HybridSearcher(registry)), chat)
+
+
+async def request(port: int, method: str, path: str, payload: dict | None = None) -> tuple[str, bytes]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return head.decode().split("\r\n")[0], body
+
+
+def events(body: bytes) -> list[dict]:
+    return [json.loads(line[len("data: "):]) for line in body.decode().split("\n\n") if line]
+
+
+def test_ask_streams_citations_tokens_and_timing(registry, chapters_dir):
+    models = FakeStreamingModels(["Caffeine ", "should wait ", "90 minutes [1]."])
+    service = make_service(registry, models)
+
+    async def scenario():
+        server = await service.serve(port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            status, body = await request(port, "POST", "/ask", {"question": "When should I have caffeine?"})
+            bad_status, _ = await request(port, "POST", "/ask", {"q": "missing"})
+            _, metrics = await request(port, "GET", "/metrics")
+        return status, events(body), bad_status, json.loads(metrics)
+
+    status, stream, bad_status, metrics = asyncio.run(scenario())
+    assert status == "HTTP/1.1 200 OK" and bad_status == "HTTP/1.1 400 Bad Request"
+    assert [event["type"] for event in stream] == ["citations", "token", "token", "token", "done"]
+    citations = stream[0]["citations"]
+    assert [citation["number"] for citation in citations] == list(range(1, 6))
+    assert {"video_id", "chapter_id", "heading", "timestamp"} <= set(citations[0])
+    # The prompt numbers excerpts the same way the citations do
+    assert f"[1] {citations[0]['heading']} (episode {citations[0]['video_id']}" in models.prompts[0]
+    assert "".join(event["text"] for event in stream[1:4]) == "Caffeine should wait 90 minutes [1]."
+    done = stream[-1]
+    assert 0 < done["retrieval_seconds"] <= done["ttft_seconds"] <= done["total_seconds"]
+    assert metrics["requests"] == 1 and metrics["ttft"]["p50_ms"] > 0
+    assert metrics["query_cache"]["misses"] == 1
+
+
+def test_identical_in_flight_questions_share_one_answer(registry, chapters_dir):
+    models = FakeStreamingModels(["Morning ", "light."])
+    models.release.clear()
+    service = make_service(registry, models)
+
+    async def collect(question):
+        return [event async for event in service.ask(question)]
+
+    async def scenario():
+        first = asyncio.create_task(collect("Why get morning light?"))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(collect("why get morning light"))
+        await asyncio.sleep(0.05)
+        models.release.set()
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(scenario())
+    assert models.calls == 1
+    assert first[:-1] == second[:-1]
+    assert (first[-1]["shared"], second[-1]["shared"]) == (False, True)
+    assert service.metrics.shared == 1 and len(service.flights) == 0
+
+    # Once the answer is finished, the same question is answered afresh
+    asyncio.run(collect("Why get morning light?"))
+    assert models.calls == 2
@@ -0,0 +1,109 @@
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+from gemini_chat_completion import GeminiChat
+from gemini_runner import RateLimits, RequestBudget
+from map_reduce_extraction import MapReduceSettings, extract_long_transcript, split_windows, stream_chapters
+from pydantic_models import VideoAnalysis
+from srt_utils import Cue, format_timestamp, parse_srt
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts" / "chapters_extractor_prompts"
+SETTINGS = MapReduceSettings(window_seconds=30 * 60, overlap_seconds=4 * 60)
+
+
+def minute_cues(minutes):
+    return [Cue(start=60 * i, end=60 * i + 59, text=f"minute {i}") for i in range(minutes)]
+
+
+class FakeWindowModels:
+    """Extracts a chapter at every 7-minute mark of the window it is sent, like a model would."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content(self, model, config, contents):
+        self.calls += 1
+        if config.response_schema is None:
+            return SimpleNamespace(text="One summary of the whole episode.")
+        cues = parse_srt(contents)
+        marks = [cue.start for cue in cues if cue.start % 420 == 0]
+        chapters = [
+            {"chapter_id": i, "timestamp": format_timestamp(mark), "heading": f"Topic at {mark // 60:.0f}", "content": "."}
+            for i, mark in enumerate(marks, start=1)
+        ]
+        analysis = {"video_id": "x", "overall_summary": "Part.", "chapters": chapters, "topics": ["Sleep", "sleep"]}
+        return SimpleNamespace(parsed=analysis)
+
+
+def test_windows_overlap_and_cores_tile_the_video():
+    windows = split_windows(minute_cues(100), SETTINGS)
+
+    assert len(windows) == 4
+    assert windows[0].cues[-1].start > windows[1].cues[0].start
+    assert [window.core_start for window in windows[1:]] == [window.core_end for window in windows[:-1]]
+
+
+class RecordingBudget(RequestBudget):
+    def __init__(self):
+        super().__init__(RateLimits(requests_per_minute=1000, tokens_per_minute=10**7))
+        self.charged: list[int] = []
+
+    async def acquire(self, prompt_tokens):
+        self.charged.append(prompt_tokens)
+        await super().acquire(prompt_tokens)
+
+
+def test_long_transcript_merges_windows_into_one_analysis():
+    models = FakeWindowModels()
+    client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    budget = RecordingBudget()
+    chat = GeminiChat(
+        str(PROMPTS_DIR / "json_chapters"), output_type="structured", pydantic_model=VideoAnalysis, client=client,
+        budget=budget,
+    )
+    summary_chat = GeminiChat(str(PROMPTS_DIR / "merge_summary"), client=client, budget=budget)
+
+    analysis = asyncio.run(extract_long_transcript(chat, summary_chat, "video_a", minute_cues(100), settings=SETTINGS))
+
+    assert models.calls == 4 + 1
+    # Every window and the merge call are charged to the budget, each for its own prompt
+    assert len(budget.charged) == 4 + 1
+    assert len(set(budget.charged)) > 1
+    assert analysis.video_id == "video_a"
+    assert analysis.overall_summary == "One summary of the whole episode."
+    # The 28-minute chapter is extracted by both of the first two windows but kept once
+    assert [chapter.timestamp for chapter in analysis.chapters] == [format_timestamp(60 * m) for m in range(0, 100, 7)]
+    assert [chapter.chapter_id for chapter in analysis.chapters] == list(range(1, 16))
+    assert analysis.topics == ["Sleep"]
+
+
+class FakeStreamingModels:
+    """Streams a fixed analysis whose chapters come without usable IDs."""
+
+    async def generate_content_stream(self, model, config, contents):
+        chapters = [
+            {"chapter_id": 0, "timestamp": f"{m}:00", "heading": f"Topic {m}", "content": "."} for m in (0, 7, 14)
+        ]
+        text = json.dumps({"video_id": "?", "overall_summary": "All.", "chapters": chapters, "topics": ["sleep"]})
+
+        async def chunks():
+            for i in range(0, len(text), 16):
+                yield SimpleNamespace(text=text[i : i + 16], usage_metadata=None)
+
+        return chunks()
+
+
+def test_streamed_chapters_are_numbered_as_they_arrive():
+    client = SimpleNamespace(aio=SimpleNamespace(models=FakeStreamingModels()))
+    chat = GeminiChat(
+        str(PROMPTS_DIR / "json_chapters"), output_type="structured", pydantic_model=VideoAnalysis, client=client
+    )
+
+    analysis = asyncio.run(stream_chapters(chat, "video_a", {"transcript": "t"}))
+
+    assert analysis.video_id == "video_a"
+    assert [(chapter.chapter_id, chapter.heading) for chapter in analysis.chapters] == [
+        (1, "Topic 0"), (2, "Topic 7"), (3, "Topic 14")
+    ]
@@ -0,0 +1,105 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from colbert_storage import TokenStore, maxsim, maxsim_scores, simulate_scalar_quantization
+from conftest import LATE_SIZE
+from create_qdrant_index import COLLECTION_NAME, create_index
+from embedding_models import LATE_INTERACTION_MODEL
+from maxsim_reranker import MaxSimReranker
+from retrieval import HybridSearcher
+
+
+def test_vectorized_maxsim_matches_the_reference():
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal((6, 16))
+    documents = [rng.standard_normal((length, 16)) for length in (1, 9, 30, 4)] + [np.empty((0, 16))]
+    scores = maxsim_scores(query, documents)
+    np.testing.assert_allclose(scores[:4], [maxsim(query, document) for document in documents[:4]], rtol=1e-5)
+    assert scores[4] == -np.inf
+
+
+def test_scalar_quantization_keeps_a_constant_range_finite():
+    matrices = [np.full((2, LATE_SIZE), 0.5, dtype=np.float32), np.full((3, LATE_SIZE), 0.5, dtype=np.float32)]
+    quantized = simulate_scalar_quantization(matrices)
+    for matrix, original in zip(quantized, matrices):
+        np.testing.assert_array_equal(matrix, original)
+
+
+def test_token_store_replaces_deletes_and_compacts(tmp_path):
+    rng = np.random.default_rng(1)
+    store = TokenStore(tmp_path / "tokens", dim=8, datatype="float16")
+    store.put_many(["a", "b"], [rng.standard_normal((3, 8)), rng.standard_normal((5, 8))])
+    replacement = rng.standard_normal((2, 8))
+    store.put_many(["a"], [replacement])
+    store.delete_many(["b"])
+    store.close()
+
+    store = TokenStore(tmp_path / "tokens")
+    assert len(store) == 1 and "b" not in store
+    assert store.get_many(["b"]) == [None]
+    assert store.compact() == 8 * 8 * 2
+    (matrix,) = store.get_many(["a"])
+    assert isinstance(matrix, np.memmap) and matrix.dtype == np.float16
+    np.testing.assert_allclose(matrix, replacement / np.linalg.norm(replacement, axis=1, keepdims=True), atol=1e-3)
+    with pytest.raises(ValueError):
+        TokenStore(tmp_path / "tokens", dim=4)
+
+
+def test_local_rerank_matches_server_side_colbert(registry, chapters_dir, tmp_path):
+    create_index(batch_size=4, cache_dir=None, registry=registry, subtitles_dir=None)
+    store = TokenStore(tmp_path / "tokens", dim=LATE_SIZE)
+    create_index(
+        batch_size=4, cache_dir=None, registry=registry, subtitles_dir=None,
+        collection_name="clips_local", token_store=store,
+    )
+    vectors = registry.client.get_collection("clips_local").config.params.vectors
+    assert LATE_INTERACTION_MODEL not in vectors and len(store) == 5  # type: ignore
+
+    queries = ["caffeine timing", "cold exposure and dopamine"]
+    server = HybridSearcher(registry).search_batch(queries, "colbert", limit=3)
+    local = MaxSimReranker(HybridSearcher(registry, collection_name="clips_local"), store).search_batch(queries, 3)
+    for server_results, local_results in zip(server, local):
+        assert [r.point_id for r in local_results] == [r.point_id for r in server_results]
+        np.testing.assert_allclose([r.score for r in local_results], [r.score for r in server_results], rtol=1e-4)
+
+    # Reindexing an unchanged corpus embeds nothing, but a fresh store is filled again
+    late = registry.get(LATE_INTERACTION_MODEL)
+    late.embedded = 0
+    create_index(
+        batch_size=4, cache_dir=None, registry=registry, subtitles_dir=None,
+        collection_name="clips_local", token_store=store,
+    )
+    assert late.embedded == 0
+    create_index(
+        batch_size=4, cache_dir=None, registry=registry, subtitles_dir=None,
+        collection_name="clips_local", token_store=TokenStore(tmp_path / "other", dim=LATE_SIZE),
+    )
+    assert late.embedded == 5
+    assert registry.client.count("clips_local").count == registry.client.count(COLLECTION_NAME).count == 5
+
+
+def test_interrupted_compaction_keeps_index_and_rows_consistent(tmp_path, mocker):
+    rng = np.random.default_rng(2)
+    matrices = [rng.standard_normal((3, 8)), rng.standard_normal((2, 8))]
+    store = TokenStore(tmp_path / "tokens", dim=8)
+    store.put_many(["a", "b"], matrices)
+    store.delete_many(["a"])
+
+    mocker.patch("colbert_storage.os.fsync", side_effect=OSError("disk full"))
+    with pytest.raises(OSError):
+        store.compact()
+    mocker.stopall()
+    (matrix,) = TokenStore(tmp_path / "tokens").get_many(["b"])
+    np.testing.assert_allclose(matrix, matrices[1] / np.linalg.norm(matrices[1], axis=1, keepdims=True), rtol=1e-6)
+
+    # Killed after the commit: the compacted file is in use, the old one is only left over
+    mocker.patch.object(Path, "unlink", side_effect=OSError("killed"))
+    with pytest.raises(OSError):
+        store.compact()
+    mocker.stopall()
+    reopened = TokenStore(tmp_path / "tokens")
+    assert reopened.nbytes == 2 * 8 * 4
+    (matrix,) = reopened.get_many(["b"])
+    np.testing.assert_allclose(matrix, matrices[1] / np.linalg.norm(matrices[1], axis=1, keepdims=True), rtol=1e-6)
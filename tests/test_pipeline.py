@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from pipeline import ALL_VIDEOS, Manifest, Pipeline, Stage
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "out").mkdir()
+    (tmp_path / "prompts").mkdir()
+    (tmp_path / "prompts" / "user_prompt.md").write_text("v1")
+    for video_id in ("a", "b"):
+        (tmp_path / "in" / f"{video_id}.txt").write_text(f"transcript {video_id}")
+    return tmp_path
+
+
+def make_stages(root, calls, fail=(), workers=2):
+    source = lambda video_id: root / "in" / f"{video_id}.txt"
+    extracted = lambda video_id: root / "out" / f"{video_id}.txt"
+    in_flight = {"now": 0, "max": 0}
+
+    async def extract(video_id):
+        if video_id in fail:
+            raise RuntimeError("boom")
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        calls.append(("extract", video_id))
+        extracted(video_id).write_text(source(video_id).read_text().upper())
+
+    async def count(video_id):
+        calls.append(("count", video_id))
+        return {"length": len(extracted(video_id).read_text())}
+
+    async def index(video_id):
+        calls.append(("index", video_id))
+
+    stages = [
+        Stage(
+            name="extract", run=extract, inputs=lambda video_id: [source(video_id)], output=extracted,
+            prompts_dirs=[root / "prompts"], model="m1", workers=workers,
+        ),
+        Stage(name="count", run=count, upstream=["extract"]),
+        Stage(name="index", run=index, upstream=["count"], per_video=False),
+    ]
+    return stages, in_flight
+
+
+def run(stages, root, video_ids=("a", "b"), **kwargs):
+    return asyncio.run(Pipeline(stages, Manifest(root / "manifest.json")).run(list(video_ids), **kwargs))
+
+
+def test_second_run_does_nothing_and_manifest_records_provenance(workspace):
+    calls = []
+    stages, in_flight = make_stages(workspace, calls)
+    run(stages, workspace)
+    assert sorted(calls) == [("count", "a"), ("count", "b"), ("extract", "a"), ("extract", "b"), ("index", ALL_VIDEOS)]
+    assert in_flight["max"] == 2
+
+    calls.clear()
+    summary = run(stages, workspace)
+    assert calls == []
+    assert summary.fresh == {"extract": 2, "count": 2, "index": 1}
+
+    entry = Manifest(workspace / "manifest.json").get("extract", "a")
+    assert entry["model"] == "m1"
+    assert list(entry["inputs"]) == [str(workspace / "in" / "a.txt")]
+    assert Manifest(workspace / "manifest.json").get("count", "a")["result"] == {"length": 12}
+
+
+def test_changed_input_prompt_or_model_recomputes_only_what_is_stale(workspace):
+    calls = []
+    stages, _ = make_stages(workspace, calls)
+    run(stages, workspace)
+
+    calls.clear()
+    (workspace / "in" / "b.txt").write_text("new transcript")
+    run(stages, workspace)
+    assert calls == [("extract", "b"), ("count", "b"), ("index", ALL_VIDEOS)]
+
+    calls.clear()
+    (workspace / "prompts" / "user_prompt.md").write_text("v2")
+    stages, _ = make_stages(workspace, calls)
+    run(stages, workspace)
+    assert len(calls) == 5
+
+    calls.clear()
+    stages[0].model = "m2"
+    run(stages, workspace, only={"extract"})
+    assert sorted(calls) == [("extract", "a"), ("extract", "b")]
+    # Downstream stages are stale but were not selected, so they wait for the next run
+    calls.clear()
+    run(stages, workspace)
+    assert [call[0] for call in calls].count("count") == 2
+
+
+def test_failed_video_blocks_only_its_downstream_stages(workspace):
+    calls = []
+    stages, _ = make_stages(workspace, calls, fail={"b"})
+    summary = run(stages, workspace)
+    assert summary.failed == {"extract": 1}
+    assert ("count", "a") in calls and ("count", "b") not in calls
+    assert Manifest(workspace / "manifest.json").get("extract", "b") is None
+
+
+def test_upstream_must_be_an_earlier_stage(workspace):
+    stages, _ = make_stages(workspace, [])
+    with pytest.raises(ValueError):
+        Pipeline(list(reversed(stages)), Manifest(workspace / "manifest.json"))
+
+
+def test_re_extracted_output_reruns_the_stages_that_read_it(workspace):
+    source = lambda video_id: workspace / "in" / f"{video_id}.txt"
+    chapters = lambda video_id: workspace / "out" / f"{video_id}.json"
+    calls = []
+    extractions = {"count": 0}
+
+    async def extract(video_id):
+        calls.append("extract")
+        # Like a model, each extraction of the same transcript comes out a little different
+        extractions["count"] += 1
+        chapters(video_id).write_text(f"{source(video_id).read_text()} #{extractions['count']}")
+
+    async def enrich(video_id):
+        # Rewrites its input in place, like add_chapter_ids
+        calls.append("enrich")
+        chapters(video_id).write_text(chapters(video_id).read_text() + " [ids]")
+
+    async def questions(video_id):
+        calls.append("questions")
+
+    stages = [
+        Stage(name="extract", run=extract, inputs=lambda video_id: [source(video_id)], output=chapters),
+        Stage(
+            name="enrich", run=enrich, upstream=["extract"], inputs=lambda video_id: [chapters(video_id)],
+            output=chapters,
+        ),
+        Stage(name="questions", run=questions, upstream=["enrich"], inputs=lambda video_id: [chapters(video_id)]),
+    ]
+    run(stages, workspace, video_ids=["a"])
+    assert calls == ["extract", "enrich", "questions"]
+
+    # Re-extracting leaves the extract key unchanged, but rewrites what enrich and questions read
+    calls.clear()
+    run(stages, workspace, video_ids=["a"], only={"extract"}, force=True)
+    run(stages, workspace, video_ids=["a"])
+    assert calls == ["extract", "enrich", "questions"]
+
+    calls.clear()
+    run(stages, workspace, video_ids=["a"])
+    assert calls == []
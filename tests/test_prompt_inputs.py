@@ -0,0 +1,79 @@
+from pathlib import Path
+
+from prompt_inputs import (
+    PromptConfig,
+    chapters_input_data,
+    load_prompt_config,
+    serialize_chapters,
+    system_prompt_path,
+    token_report,
+)
+from srt_utils import compact_transcript, parse_srt
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts"
+
+SRT = """1
+00:00:01,000 --> 00:00:04,000
+welcome to the huberman lab podcast
+
+2
+00:00:04,000 --> 00:00:29,500
+welcome to the huberman lab podcast
+where we discuss science
+
+3
+00:00:31,000 --> 00:00:35,000
+today we talk about sleep
+
+4
+01:02:03,000 --> 01:02:05,000
+thanks for listening
+"""
+
+
+def test_parse_srt_reads_times_and_text():
+    cues = parse_srt(SRT)
+    assert len(cues) == 4
+    assert (cues[1].start, cues[1].end) == (4.0, 29.5)
+    assert cues[3].start == 3723.0
+
+
+def test_compact_transcript_buckets_cues_and_drops_rolling_duplicates():
+    assert compact_transcript(parse_srt(SRT), bucket_seconds=30).split("\n") == [
+        "[0:01] welcome to the huberman lab podcast where we discuss science",
+        "[0:31] today we talk about sleep",
+        "[1:02:03] thanks for listening",
+    ]
+
+
+def test_compact_chapters_keep_ids_and_drop_json_syntax():
+    chapters = [{"chapter_id": 3, "timestamp": "4:10", "heading": "Light", "content": "Get sunlight."}]
+    assert serialize_chapters(chapters, "compact") == "[3] 4:10 | Light\nGet sunlight."
+
+
+def test_prompt_directories_select_their_payload_format(tmp_path):
+    srt_path = tmp_path / "video.srt"
+    srt_path.write_text(SRT)
+
+    original = load_prompt_config(PROMPTS_DIR / "chapters_extractor_prompts" / "json_chapters")
+    compact = load_prompt_config(PROMPTS_DIR / "chapters_extractor_prompts" / "json_chapters_compact")
+
+    assert chapters_input_data(srt_path, original)["transcript"] == SRT
+    assert chapters_input_data(srt_path, compact)["transcript"].startswith("[0:01] welcome")
+    assert load_prompt_config(PROMPTS_DIR / "question_creation_prompts_compact").chapters_format == "compact"
+
+
+def test_compact_question_prompts_share_the_base_system_prompt():
+    compact_dir = PROMPTS_DIR / "question_creation_prompts_compact"
+    assert not (compact_dir / "system_prompt.md").exists()
+    assert system_prompt_path(compact_dir).read_text() == (
+        PROMPTS_DIR / "question_creation_prompts" / "system_prompt.md"
+    ).read_text()
+    assert system_prompt_path(PROMPTS_DIR / "question_creation_prompts").parent.name == "question_creation_prompts"
+
+
+def test_token_report_compares_before_and_after(tmp_path):
+    (tmp_path / "video.srt").write_text(SRT)
+    report = token_report(tmp_path, tmp_path, PromptConfig(transcript_format="compact"))
+    assert report["transcripts_total"]["after"] < report["transcripts_total"]["before"]
+    assert report["chapters_total"] == {"before": 0, "after": 0, "saved": 0.0}
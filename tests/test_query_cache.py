@@ -0,0 +1,83 @@
+import json
+
+import query_cache
+from conftest import write_chapters
+from create_qdrant_index import create_index
+from embedding_models import SPARSE_MODEL
+from query_cache import CachedSearcher, CacheSettings
+from retrieval import HybridSearcher
+
+
+def question(question_id, text):
+    return {
+        "question_id": question_id,
+        "question": text,
+        "expected_answer_type": "descriptive",
+        "context_requirements": "",
+        "ground_truth_reference": [1],
+        "difficulty_level": "simple",
+        "answer_scope": "single_chapter",
+        "question_category": "sleep",
+    }
+
+
+def make_cache(registry, **settings) -> CachedSearcher:
+    create_index(batch_size=4, cache_dir=None, registry=registry, subtitles_dir=None)
+    return CachedSearcher(HybridSearcher(registry), CacheSettings(fingerprint_interval_seconds=0, **settings))
+
+
+def test_exact_and_semantic_tiers(registry, chapters_dir, mocker):
+    cache = make_cache(registry)
+    spy = mocker.spy(registry.client, "query_batch_points")
+    first = cache.search("caffeine timing", limit=3)
+
+    # Same text after normalization: served by the exact tier without encoding anything
+    sparse = registry.get(SPARSE_MODEL)
+    sparse.embedded = 0
+    assert cache.search("  Caffeine TIMING?", limit=3) == first
+    # The fake dense model maps anagrams to the same vector: a semantic hit, with no BM25 encoding
+    assert cache.search("timing caffeine", limit=3) == first
+    assert sparse.embedded == 0 and spy.call_count == 1
+
+    # A different limit is a different result set
+    cache.search("caffeine timing", limit=2)
+    assert spy.call_count == 2
+    metrics = cache.metrics.as_dict()
+    assert (metrics["exact_hits"], metrics["semantic_hits"], metrics["misses"]) == (1, 1, 2)
+    assert metrics["hit_rate"] == 0.5 and metrics["seconds_saved"] >= 0
+
+
+def test_lru_eviction_and_collection_changes(registry, chapters_dir, mocker):
+    cache = make_cache(registry, max_entries=2, similarity_threshold=1.0)
+    scan = mocker.spy(query_cache, "fetch_indexed_chapters")
+    for query in ("morning light", "sauna", "cold plunge"):
+        cache.search(query)
+    assert len(cache) == 2
+    # The fingerprint scans the whole collection, so searches never compute it
+    assert scan.call_count == 0
+
+    spy = mocker.spy(registry.client, "query_batch_points")
+    cache.search("sauna")
+    assert spy.call_count == 0
+
+    # Editing a chapter changes the collection fingerprint and drops every cached query
+    write_chapters(chapters_dir, "video_b", ["cold exposure and dopamine", "sauna protocols, updated"])
+    create_index(batch_size=4, cache_dir=None, registry=registry, subtitles_dir=None)
+    cache.check_collection()
+    cache.search("sauna")
+    assert spy.call_count == 1
+    assert cache.metrics.invalidations == 1 and len(cache) == 1
+
+
+def test_warm_from_questions(registry, chapters_dir, tmp_path, mocker):
+    questions_dir = tmp_path / "data" / "questions"
+    questions_dir.mkdir(parents=True)
+    questions = [question(1, "When should I drink coffee?"), question(2, "Are naps useful?")]
+    (questions_dir / "video_a.json").write_text(json.dumps({"questions": questions}))
+    cache = make_cache(registry)
+
+    assert cache.warm_from_questions(questions_dir, limit=5) == 2
+    assert cache.warm_from_questions(questions_dir, limit=5) == 0
+    spy = mocker.spy(registry.client, "query_batch_points")
+    cache.search("when should I drink coffee", limit=5)
+    assert spy.call_count == 0 and cache.metrics.exact_hits == 1
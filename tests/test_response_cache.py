@@ -0,0 +1,89 @@
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_chat_completion import GeminiChat
+from pydantic_models import Chapter
+from response_cache import ResponseCache
+
+
+class FakeModels:
+    """Stands in for `client.models`, counting API calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, model, config, contents):
+        self.calls += 1
+        return SimpleNamespace(parsed={"chapter_id": 1, "timestamp": "0:00", "heading": contents, "content": "."})
+
+
+@pytest.fixture
+def make_chat(tmp_path):
+    prompts_dir = tmp_path / "prompts"
+    prompts_dir.mkdir()
+    (prompts_dir / "system_prompt.md").write_text("You write chapters.")
+    (prompts_dir / "user_prompt.md").write_text("{{ transcript }}")
+    models = FakeModels()
+
+    def make_chat(**kwargs):
+        return GeminiChat(
+            str(prompts_dir),
+            output_type="structured",
+            pydantic_model=Chapter,
+            client=SimpleNamespace(models=models),
+            **kwargs,
+        )
+
+    make_chat.models = models
+    return make_chat
+
+
+def test_structured_hit_skips_the_api(make_chat, tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    first = make_chat(cache=cache).complete({"transcript": "Sleep"})
+
+    # A new instance, as after a crash and rerun
+    second = make_chat(cache=ResponseCache(tmp_path / "responses.sqlite")).complete({"transcript": "Sleep"})
+
+    assert make_chat.models.calls == 1
+    assert isinstance(second, Chapter) and second == first
+
+
+def test_bypass_calls_the_api_and_refreshes(make_chat, tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    make_chat(cache=cache).complete({"transcript": "Sleep"})
+    make_chat(cache=cache, bypass_cache=True).complete({"transcript": "Sleep"})
+    make_chat(cache=cache, model_name="other-model").complete({"transcript": "Sleep"})
+
+    assert make_chat.models.calls == 3
+    assert cache.stats()["entries"] == 2
+
+
+def test_cache_factory_opens_the_file_on_first_request(make_chat, tmp_path):
+    path = tmp_path / "cache" / "responses.sqlite"
+    chat = make_chat(cache=partial(ResponseCache, path))
+    assert not path.parent.exists()
+
+    chat.complete({"transcript": "Sleep"})
+    chat.complete({"transcript": "Sleep"})
+
+    assert path.exists()
+    assert make_chat.models.calls == 1
+    assert chat.cache.stats()["entries"] == 1
+
+
+def test_eviction_by_age_and_size(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite", max_bytes=10, max_age_seconds=None)
+    cache.put("old", "model", "aaaa")
+    cache.put("mid", "model", "bbbb")
+    cache.get("old")
+    cache.put("new", "model", "cccc")
+
+    assert cache.get("mid") is None
+    assert cache.get("old") == "aaaa"
+
+    cache.max_age_seconds = -1
+    assert cache.get("new") is None
+    assert cache.stats()["hits"] == 2
@@ -0,0 +1,25 @@
+import pytest
+
+from create_qdrant_index import create_index
+from retrieval import STRATEGIES, HybridSearcher, PrefetchLimits
+
+
+@pytest.fixture
+def searcher(registry, chapters_dir):
+    create_index(batch_size=4, cache_dir=None, registry=registry)
+    return HybridSearcher(registry=registry, limits=PrefetchLimits(dense=5, sparse=5))
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_every_strategy_returns_chapter_payloads(searcher, strategy):
+    results = searcher.search("morning light", strategy=strategy, limit=3)
+    assert 0 < len(results) <= 3
+    assert all(result.video_id in {"video_a", "video_b"} for result in results)
+
+
+def test_search_batch_answers_each_query_in_one_round_trip(searcher, mocker):
+    spy = mocker.spy(searcher.registry.client, "query_batch_points")
+    results = searcher.search_batch(["sauna protocols", "naps", "caffeine timing rules"], strategy="dense", limit=1)
+    assert spy.call_count == 1
+    assert [r[0].heading for r in results] == ["Heading 1", "Heading 2", "Heading 1"]
+    assert [r[0].video_id for r in results] == ["video_b", "video_a", "video_a"]
@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+
+from create_qdrant_index import COLLECTION_NAME, DENSE_MODEL, create_index
+from srt_index import CueIndex, index_path, load_or_build
+from srt_utils import Cue, format_srt
+
+CUES = [
+    Cue(start=0.0, end=2.0, text="welcome to the show"),
+    Cue(start=2.0, end=4.0, text="welcome to the show\ntoday: sleep"),
+    Cue(start=65.0, end=68.0, text="caffeine timing ☕"),
+    Cue(start=130.0, end=133.0, text="naps"),
+]
+
+
+def test_saved_index_is_memory_mapped_and_matches(tmp_path):
+    path = tmp_path / "video.idx"
+    CueIndex.from_cues(CUES).save(path)
+    index = CueIndex.load(path)
+
+    assert isinstance(index.starts.base, np.memmap) or isinstance(index.starts, np.memmap)
+    assert len(index) == 4 and index.duration == 133.0
+    # The rolling caption line repeated by the second cue is kept once
+    assert index.cue_text(0, 2) == "welcome to the show\ntoday: sleep"
+    assert index.text_between(60, 130) == "caffeine timing ☕"
+
+
+def test_lookups_at_boundaries():
+    index = CueIndex.from_cues(CUES)
+    assert index.cue_at(0.0) == 0
+    assert index.cue_at(2.0) == 1
+    assert index.cue_at(10.0) is None
+    assert index.span(0, 65) == (0, 2)
+    assert index.span(65, 1000) == (2, 4)
+    assert index.span(500, 600) == (4, 4)
+
+
+def test_index_is_rebuilt_when_the_transcript_changes(tmp_path):
+    srt_path = tmp_path / "video.srt"
+    srt_path.write_text(format_srt(CUES), encoding="utf-8")
+    assert len(load_or_build(srt_path, tmp_path / "index")) == 4
+
+    srt_path.write_text(format_srt(CUES[:2]), encoding="utf-8")
+    later = index_path("video", tmp_path / "index").stat().st_mtime + 10
+    os.utime(srt_path, (later, later))
+    assert len(load_or_build(srt_path, tmp_path / "index")) == 2
+
+
+def test_index_payload_carries_transcript_span_and_end_time(registry, chapters_dir, tmp_path):
+    subtitles = tmp_path / "data" / "subtitles"
+    subtitles.mkdir(parents=True)
+    (subtitles / "video_a.srt").write_text(format_srt(CUES), encoding="utf-8")
+
+    create_index(batch_size=4, cache_dir=None, registry=registry)
+    records, _ = registry.client.scroll(COLLECTION_NAME, limit=10, with_payload=True)
+    payloads = {(r.payload["video_id"], r.payload["chapter_id"]): r.payload for r in records}
+
+    # write_chapters puts chapter i at i:00
+    assert payloads[("video_a", 1)]["transcript"] == "welcome to the show\ntoday: sleep"
+    assert payloads[("video_a", 1)]["end_time"] == "1:00"
+    assert payloads[("video_a", 3)]["end_time"] == "2:13"
+    assert "transcript" not in payloads[("video_b", 1)]
+
+    # Unchanged spans re-embed nothing; a longer transcript moves only the last chapter's end
+    registry.get(DENSE_MODEL).embedded = 0
+    create_index(batch_size=4, cache_dir=None, registry=registry)
+    assert registry.get(DENSE_MODEL).embedded == 0
+
+    srt_path = subtitles / "video_a.srt"
+    srt_path.write_text(format_srt(CUES + [Cue(start=200.0, end=210.0, text="goodbye")]), encoding="utf-8")
+    later = srt_path.stat().st_mtime + 10
+    os.utime(srt_path, (later, later))
+    create_index(batch_size=4, cache_dir=None, registry=registry)
+    assert registry.get(DENSE_MODEL).embedded == 1
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from google.genai.errors import APIError
+
+from adaptive_concurrency import AdaptiveLimiter
+from gemini_chat_completion import GeminiChat
+from pydantic_models import VideoAnalysis
+from response_cache import ResponseCache
+from streaming_json import ArrayItemScanner, StructuredStream
+
+ANALYSIS = {
+    "video_id": "video_a",
+    "overall_summary": 'Tricky "quotes" and braces: {[',
+    "chapters": [
+        {"chapter_id": 1, "timestamp": "0:00", "heading": "Intro", "content": "Welcome. ] }"},
+        {"chapter_id": 2, "timestamp": "5:10", "heading": "Light \\ dark", "content": "Morning light."},
+    ],
+    "topics": ["sleep"],
+}
+
+
+def pieces(text: str, size: int = 7) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+class StreamingModels:
+    def __init__(self, text: str, fail_after: int | None = None, failures=()):
+        self.chunks = pieces(text)
+        self.fail_after = fail_after
+        self.failures = list(failures)
+        self.calls = 0
+
+    def _chunks(self):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise APIError(503, {"error": {"code": 503}})
+            yield SimpleNamespace(text=chunk, usage_metadata=None)
+
+    def generate_content_stream(self, model, config, contents):
+        return self._chunks()
+
+    async def agenerate_content_stream(self, model, config, contents):
+        async def chunks():
+            for chunk in self._chunks():
+                await asyncio.sleep(0)
+                yield chunk
+
+        return chunks()
+
+
+@pytest.fixture
+def make_chat(tmp_path):
+    prompts_dir = tmp_path / "prompts"
+    prompts_dir.mkdir()
+    (prompts_dir / "system_prompt.md").write_text("You write chapters.")
+    (prompts_dir / "user_prompt.md").write_text("{{ transcript }}")
+
+    def make_chat(models, **kwargs):
+        client = SimpleNamespace(
+            models=models, aio=SimpleNamespace(models=SimpleNamespace(generate_content_stream=models.agenerate_content_stream))
+        )
+        return GeminiChat(
+            str(prompts_dir), output_type="structured", pydantic_model=VideoAnalysis, client=client,
+            limiter=AdaptiveLimiter(), retry_delay=0.01, **kwargs
+        )
+
+    return make_chat
+
+
+def test_scanner_emits_each_element_once_complete():
+    text = json.dumps(ANALYSIS)
+    scanner = ArrayItemScanner("chapters")
+    emitted = []
+    for i, char in enumerate(text):
+        for raw in scanner.feed(char):
+            emitted.append((raw, i))
+
+    assert [json.loads(raw) for raw, _ in emitted] == ANALYSIS["chapters"]
+    # Each chapter is emitted at its closing brace, before the rest of the document arrives
+    assert all(i < text.index('"topics"') for _, i in emitted)
+    assert scanner.text == text
+
+
+def test_stream_yields_chapters_then_validated_result(make_chat):
+    models = StreamingModels(json.dumps(ANALYSIS), failures=[APIError(429, {"error": {"code": 429}})])
+    stream = make_chat(models).complete_stream({"transcript": "t"}, "chapters")
+
+    with pytest.raises(RuntimeError):
+        stream.result
+    chapters = list(stream)
+    assert [chapter.heading for chapter in chapters] == ["Intro", "Light \\ dark"]
+    assert stream.result == VideoAnalysis.model_validate(ANALYSIS)
+    assert models.calls == 2
+
+
+def test_async_stream_and_cache_replay(make_chat, tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    models = StreamingModels(json.dumps(ANALYSIS))
+    chat = make_chat(models, cache=cache)
+
+    async def consume():
+        stream = chat.acomplete_stream({"transcript": "t"}, "chapters")
+        chapters = [chapter async for chapter in stream]
+        return chapters, stream.result
+
+    first = asyncio.run(consume())
+    second = asyncio.run(consume())
+    assert first == second
+    assert len(first[0]) == 2
+    assert models.calls == 1
+
+
+def test_failures_after_text_was_streamed_are_not_retried(make_chat):
+    models = StreamingModels(json.dumps(ANALYSIS), fail_after=3)
+    with pytest.raises(APIError):
+        list(make_chat(models).complete_stream({"transcript": "t"}, "chapters"))
+    assert models.calls == 1
+
+
+def test_invalid_document_fails_final_validation():
+    stream = StructuredStream(iter(pieces(json.dumps({**ANALYSIS, "topics": None}))), VideoAnalysis, "chapters")
+    with pytest.raises(ValueError):
+        list(stream)
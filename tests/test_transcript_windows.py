@@ -0,0 +1,95 @@
+from qdrant_client import models
+
+from conftest import DENSE_SIZE
+from create_qdrant_index import create_index, embed_documents, iter_chapters
+from embedding_models import DENSE_MODEL, SPARSE_MODEL
+from retrieval import HybridSearcher
+from srt_index import CueIndex
+from srt_utils import Cue, format_srt
+from transcript_windows import (
+    WINDOWS_COLLECTION,
+    TranscriptWindow,
+    TwoLevelSearcher,
+    WindowSettings,
+    build_window_points,
+    chapter_windows,
+    ensure_windows_collection,
+    index_windows,
+)
+
+
+def cues(seconds: int, step: int = 5) -> list[Cue]:
+    return [Cue(start=t, end=t + step, text=f"line {t} about topic {t // 60}") for t in range(0, seconds, step)]
+
+
+def test_windows_slide_within_the_chapter():
+    index = CueIndex.from_cues(cues(300))
+    windows = chapter_windows(index, "v", 2, 60, 180, WindowSettings(window_seconds=60, stride_seconds=30))
+    assert [(w.start_seconds, w.end_seconds) for w in windows] == [(60, 120), (90, 150), (120, 180)]
+    assert windows[0].text.splitlines()[0] == "line 60 about topic 1"
+    assert windows[-1].text.splitlines()[-1] == "line 175 about topic 2"
+
+
+def test_two_level_search_groups_windows_under_coarse_chapters(registry, chapters_dir, tmp_path, mocker):
+    subtitles = tmp_path / "data" / "subtitles"
+    subtitles.mkdir(parents=True)
+    for video_id in ("video_a", "video_b"):
+        (subtitles / f"{video_id}.srt").write_text(format_srt(cues(240)), encoding="utf-8")
+    create_index(batch_size=4, cache_dir=None, registry=registry, subtitles_dir=None)
+
+    chapters = lambda: iter_chapters(sorted(chapters_dir.glob("*.json")))
+    count = index_windows(registry, chapters(), subtitles_dir=subtitles)
+    # Reindexing replaces each video's windows instead of adding to them
+    assert index_windows(registry, chapters(), subtitles_dir=subtitles) == count
+    assert registry.client.count(WINDOWS_COLLECTION).count == count
+
+    searcher = TwoLevelSearcher(HybridSearcher(registry), windows_per_chapter=2)
+    spy = mocker.spy(registry.client, "query_points_groups")
+    hits = searcher.search("topic 1", chapters=3)
+
+    assert spy.call_count == 1
+    assert len(hits) == 3
+    for chapter_hits in hits:
+        assert 0 < len(chapter_hits.windows) <= 2
+        records = registry.client.retrieve(WINDOWS_COLLECTION, [w.point_id for w in chapter_hits.windows])
+        assert {(r.payload["video_id"], r.payload["chapter_id"]) for r in records} == {
+            (chapter_hits.chapter.video_id, chapter_hits.chapter.chapter_id)
+        }
+
+    # A video whose subtitles are gone loses its old windows instead of keeping them
+    (subtitles / "video_b.srt").unlink()
+    remaining = index_windows(registry, chapters(), subtitles_dir=subtitles)
+    assert 0 < remaining < count
+    assert registry.client.count(WINDOWS_COLLECTION).count == remaining
+    assert registry.client.count(WINDOWS_COLLECTION, count_filter=models.Filter(
+        must=[models.FieldCondition(key="video_id", match=models.MatchValue(value="video_b"))]
+    )).count == 0
+
+
+def test_fine_search_gives_every_chapter_windows_despite_a_dominant_one(registry, mocker):
+    ensure_windows_collection(registry.client, WINDOWS_COLLECTION, DENSE_SIZE)
+    # Chapter 1 has more exact matches than a prefetch returns; the others match only weakly
+    windows = [
+        TranscriptWindow(
+            video_id="v", chapter_id=chapter_id, window_no=window_no, start_seconds=window_no * 30,
+            end_seconds=window_no * 30 + 60, text="caffeine" if chapter_id == 1 else f"sleep window {window_no}",
+        )
+        for chapter_id, count in ((1, 30), (2, 3), (3, 3))
+        for window_no in range(count)
+    ]
+    texts = [window.text for window in windows]
+    embeddings, _ = embed_documents(
+        {DENSE_MODEL: registry.dense, SPARSE_MODEL: registry.sparse}, {DENSE_MODEL: texts, SPARSE_MODEL: texts}
+    )
+    registry.client.upsert(WINDOWS_COLLECTION, points=build_window_points(windows, embeddings), wait=True)
+
+    searcher = TwoLevelSearcher(HybridSearcher(registry), windows_per_chapter=2)
+    embedding = searcher.searcher.embed_queries(["caffeine"], with_late=False)[0]
+    spy = mocker.spy(registry.client, "query_points_groups")
+    hits = searcher.fine_search(embedding, ["v:1", "v:2", "v:3"])
+
+    # Local Qdrant lifts the prefetch limits of group queries, so check the request as well
+    prefetch = spy.call_args.kwargs["prefetch"]
+    assert sorted(p.filter.must[0].match.value for p in prefetch) == ["v:1", "v:1", "v:2", "v:2", "v:3", "v:3"]
+    assert {key: len(windows) for key, windows in hits.items()} == {"v:1": 2, "v:2": 2, "v:3": 2}
+    assert {window.text for window in hits["v:1"]} == {"caffeine"}
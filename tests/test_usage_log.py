@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.genai.errors import APIError
+
+from adaptive_concurrency import AdaptiveLimiter
+from gemini_chat_completion import GeminiChat
+from response_cache import ResponseCache
+from usage_log import UsageLog, UsageRecord, read_records, summarize, usage_context
+
+
+def response(text: str):
+    usage = SimpleNamespace(
+        prompt_token_count=100, candidates_token_count=20, cached_content_token_count=40, thoughts_token_count=None
+    )
+    return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class FakeModels:
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+
+    def generate_content(self, model, config, contents):
+        if self.failures:
+            raise self.failures.pop(0)
+        return response(contents)
+
+    async def agenerate_content(self, model, config, contents):
+        await asyncio.sleep(0)
+        return self.generate_content(model, config, contents)
+
+
+@pytest.fixture
+def make_chat(tmp_path):
+    prompts_dir = tmp_path / "prompts"
+    prompts_dir.mkdir()
+    (prompts_dir / "system_prompt.md").write_text("You summarize.")
+    (prompts_dir / "user_prompt.md").write_text("{{ transcript }}")
+
+    def make_chat(models, usage_log, **kwargs):
+        client = SimpleNamespace(models=models, aio=SimpleNamespace(models=SimpleNamespace(generate_content=models.agenerate_content)))
+        return GeminiChat(
+            str(prompts_dir), client=client, limiter=AdaptiveLimiter(), usage_log=usage_log, model_name="m", **kwargs
+        )
+
+    return make_chat
+
+
+def test_records_tokens_retries_and_context(make_chat, tmp_path):
+    log = UsageLog(tmp_path / "usage.jsonl")
+    chat = make_chat(FakeModels([APIError(503, {"error": {"code": 503}})]), log, retry_delay=0.01)
+
+    with usage_context(stage="extract", video_id="video_a"):
+        chat.complete({"transcript": "sleep"})
+    log.flush()
+
+    [record] = read_records(log.path)
+    assert (record.stage, record.video_id, record.model) == ("extract", "video_a", "m")
+    assert (record.prompt_tokens, record.output_tokens, record.cached_tokens, record.thoughts_tokens) == (100, 20, 40, 0)
+    assert record.retries == 1
+    assert record.latency_seconds >= 0.01
+
+
+def test_async_tasks_inherit_context_and_failures_are_recorded(make_chat, tmp_path):
+    log = UsageLog(tmp_path / "usage.jsonl", flush_every=2)
+    chat = make_chat(FakeModels(), log)
+
+    async def run():
+        async def one(video_id):
+            with usage_context(stage="questions", video_id=video_id):
+                return await chat.acomplete({"transcript": video_id})
+
+        await asyncio.gather(one("a"), one("b"))
+
+    asyncio.run(run())
+    assert {record.video_id for record in read_records(log.path)} == {"a", "b"}
+
+    failing = make_chat(FakeModels([APIError(400, {"error": {"code": 400}})]), log)
+    with pytest.raises(APIError):
+        failing.complete({"transcript": "bad"})
+    log.flush()
+    assert [record.status for record in read_records(log.path)][-1] == "error_400"
+
+
+def test_cache_hits_are_recorded_without_tokens(make_chat, tmp_path):
+    log = UsageLog(tmp_path / "usage.jsonl")
+    chat = make_chat(FakeModels(), log, cache=ResponseCache(tmp_path / "cache.sqlite"))
+    chat.complete({"transcript": "sleep"})
+    chat.complete({"transcript": "sleep"})
+    log.flush()
+
+    fresh, hit = read_records(log.path)
+    assert not fresh.cache_hit and fresh.output_tokens == 20
+    assert hit.cache_hit and hit.prompt_tokens == 0
+
+
+def test_summarize_per_stage():
+    records = [
+        UsageRecord(timestamp=0, model="m", stage="extract", latency_seconds=seconds, output_tokens=100, prompt_tokens=10)
+        for seconds in (1.0, 2.0, 3.0, 4.0)
+    ] + [UsageRecord(timestamp=0, model="m", stage="extract", cache_hit=True)]
+
+    [(stage, summary)] = summarize(records).items()
+    assert stage == "extract"
+    assert summary["calls"] == 5 and summary["cache_hits"] == 1
+    assert summary["latency_p50_seconds"] == 2.5
+    assert summary["output_tokens"] == 400 and summary["prompt_tokens"] == 40
+    assert summary["output_tokens_per_second"] == 40.0
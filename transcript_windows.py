@@ -0,0 +1,278 @@
+from itertools import batched
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+from uuid import UUID, uuid5
+
+from loguru import logger
+from pydantic import BaseModel, Field
+from qdrant_client import QdrantClient, models
+from qdrant_client.http.models import PointStruct
+
+from create_qdrant_index import embed_documents, get_json_files, iter_chapters
+from embedding_models import DENSE_MODEL, SPARSE_MODEL, ModelRegistry
+from pydantic_models import Chapter
+from retrieval import HybridSearcher, PrefetchLimits, QueryEmbeddings, SearchResult, Strategy, STRATEGIES
+from srt_index import DEFAULT_SUBTITLES_DIR, CueIndex, TranscriptSpans
+from srt_utils import format_timestamp
+
+WINDOWS_COLLECTION = "huberman_windows"
+WINDOW_ID_NAMESPACE = UUID("0b7a4d2e-91c5-4f3a-8e62-5d1c9a7b3f08")
+# Keyword payload field every fine search filters on, indexed so the filter is a lookup, not a scan
+CHAPTER_KEY = "chapter_key"
+
+
+class WindowSettings(BaseModel):
+    """Sliding transcript windows inside each chapter."""
+    window_seconds: float = Field(60, gt=0, description="Length of each window")
+    stride_seconds: float = Field(30, gt=0, description="Start-to-start distance of consecutive windows")
+
+
+class TranscriptWindow(BaseModel):
+    video_id: str
+    chapter_id: int
+    window_no: int
+    start_seconds: float
+    end_seconds: float
+    text: str
+
+
+class WindowHit(BaseModel):
+    """A transcript window matching the query inside a retrieved chapter."""
+    point_id: str
+    score: float
+    start_seconds: float
+    end_seconds: float
+    timestamp: str
+    text: str
+
+
+class ChapterHits(BaseModel):
+    """A coarse chapter result with its best-matching transcript windows."""
+    chapter: SearchResult
+    windows: list[WindowHit]
+
+
+def chapter_key(video_id: str, chapter_id: int) -> str:
+    return f"{video_id}:{chapter_id}"
+
+
+def window_point_id(video_id: str, chapter_id: int, window_no: int) -> str:
+    return str(uuid5(WINDOW_ID_NAMESPACE, f"{video_id}:{chapter_id}:{window_no}"))
+
+
+def chapter_windows(
+    index: CueIndex, video_id: str, chapter_id: int, start: float, end: float,
+    settings: WindowSettings = WindowSettings(),
+) -> list[TranscriptWindow]:
+    """Windows of `settings.window_seconds` every `settings.stride_seconds` over [start, end)."""
+    windows = []
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + settings.window_seconds, end)
+        text = index.text_between(window_start, window_end)
+        if text:
+            windows.append(TranscriptWindow(
+                video_id=video_id, chapter_id=chapter_id, window_no=len(windows),
+                start_seconds=window_start, end_seconds=window_end, text=text,
+            ))
+        if window_end >= end:
+            break
+        window_start += settings.stride_seconds
+    return windows
+
+
+def iter_windows(
+    chapters: Iterable[tuple[str, Chapter]], spans: TranscriptSpans, settings: WindowSettings = WindowSettings()
+) -> Iterator[TranscriptWindow]:
+    """Windows of every chapter whose transcript span is known."""
+    for video_id, chapter in spans.annotate(chapters):
+        bounds = spans.bounds.get((video_id, chapter.chapter_id))
+        index = spans.index(video_id) if bounds else None
+        if bounds is None or index is None:
+            continue
+        yield from chapter_windows(index, video_id, chapter.chapter_id, *bounds, settings=settings)
+
+
+def ensure_windows_collection(client: QdrantClient, collection_name: str, dense_size: int):
+    """Create the windows collection (dense + BM25, no ColBERT) and its payload indexes if missing."""
+    if client.collection_exists(collection_name=collection_name):
+        return
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config={DENSE_MODEL: models.VectorParams(size=dense_size, distance=models.Distance.COSINE)},
+        sparse_vectors_config={SPARSE_MODEL: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+    )
+    for field in (CHAPTER_KEY, "video_id"):
+        client.create_payload_index(
+            collection_name=collection_name, field_name=field, field_schema=models.PayloadSchemaType.KEYWORD
+        )
+    logger.info(f"Created collection '{collection_name}' with payload indexes on {CHAPTER_KEY} and video_id.")
+
+
+def build_window_points(windows: list[TranscriptWindow], embeddings: dict[str, list]) -> list[PointStruct]:
+    return [
+        PointStruct(
+            id=window_point_id(window.video_id, window.chapter_id, window.window_no),
+            vector={
+                DENSE_MODEL: embeddings[DENSE_MODEL][idx],
+                SPARSE_MODEL: embeddings[SPARSE_MODEL][idx].as_object(),
+            },  # type: ignore
+            payload={
+                CHAPTER_KEY: chapter_key(window.video_id, window.chapter_id),
+                "timestamp": format_timestamp(window.start_seconds),
+                **window.model_dump(),
+            },
+        )
+        for idx, window in enumerate(windows)
+    ]
+
+
+def index_windows(
+    registry: ModelRegistry,
+    chapters: Iterable[tuple[str, Chapter]],
+    collection_name: str = WINDOWS_COLLECTION,
+    settings: WindowSettings = WindowSettings(),
+    subtitles_dir: Path = DEFAULT_SUBTITLES_DIR,
+    batch_size: int = 256,
+) -> int:
+    """
+    Replace the transcript windows of the given chapters' videos.
+
+    The old windows of every video in `chapters` are deleted before the new ones are
+    upserted, so re-chaptering a video never leaves windows under stale chapter keys,
+    and a video that no longer yields windows (its subtitles are gone, or its spans
+    are unknown) keeps none.
+
+    Returns:
+        Number of windows indexed
+    """
+    client = registry.client
+    ensure_windows_collection(client, collection_name, registry.vector_size(DENSE_MODEL))
+    models_by_name = {DENSE_MODEL: registry.dense, SPARSE_MODEL: registry.sparse}
+    chapters = list(chapters)
+    for video_id in dict.fromkeys(video_id for video_id, _ in chapters):
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(filter=models.Filter(
+                must=[models.FieldCondition(key="video_id", match=models.MatchValue(value=video_id))]
+            )),
+            wait=True,
+        )
+    count = 0
+    for batch in batched(iter_windows(chapters, TranscriptSpans(subtitles_dir), settings), batch_size):
+        windows = list(batch)
+        texts = [window.text for window in windows]
+        embeddings, _ = embed_documents(models_by_name, {DENSE_MODEL: texts, SPARSE_MODEL: texts})
+        client.upsert(collection_name=collection_name, points=build_window_points(windows, embeddings), wait=True)
+        count += len(windows)
+        logger.info(f"Indexed {count} transcript windows so far.")
+    return count
+
+
+class TwoLevelSearcher:
+    """
+    Coarse-to-fine search: chapters first, then transcript windows inside the top chapters.
+
+    The coarse stage is a normal HybridSearcher query over chapter summaries. The fine
+    stage is one hybrid (dense + BM25, RRF) query over the windows collection with a
+    dense and a BM25 prefetch per coarse hit, each restricted by an indexed
+    `chapter_key` filter to that chapter, and grouped by chapter. Its cost depends on
+    the windows of a handful of chapters, not on the size of the windows collection,
+    and a chapter with many strongly matching windows cannot crowd out the others.
+    """
+
+    def __init__(
+        self,
+        searcher: HybridSearcher | None = None,
+        windows_collection: str = WINDOWS_COLLECTION,
+        windows_per_chapter: int = 3,
+        fine_limits: PrefetchLimits = PrefetchLimits(),
+    ):
+        """
+        Args:
+            searcher: Chapter-level searcher (its registry's client also serves the windows).
+            windows_collection: Collection built by `index_windows`.
+            windows_per_chapter: Windows returned under each chapter.
+            fine_limits: Prefetch limits of the fine stage's dense and BM25 searches, per chapter.
+        """
+        self.searcher = searcher or HybridSearcher()
+        self.windows_collection = windows_collection
+        self.windows_per_chapter = windows_per_chapter
+        self.fine_limits = fine_limits
+
+    def fine_search(self, embedding: QueryEmbeddings, keys: Sequence[str]) -> dict[str, list[WindowHit]]:
+        """Best windows of each chapter in `keys`, keyed by chapter key."""
+        if not keys:
+            return {}
+        prefetch = []
+        for key in keys:
+            # Prefetch limits shared by all chapters would let one dominant chapter take every candidate
+            chapter_filter = models.Filter(
+                must=[models.FieldCondition(key=CHAPTER_KEY, match=models.MatchValue(value=key))]
+            )
+            prefetch += [
+                models.Prefetch(
+                    query=embedding.dense, using=DENSE_MODEL, limit=self.fine_limits.dense, filter=chapter_filter
+                ),
+                models.Prefetch(
+                    query=embedding.sparse, using=SPARSE_MODEL, limit=self.fine_limits.sparse, filter=chapter_filter
+                ),
+            ]
+        response = self.searcher.registry.client.query_points_groups(
+            collection_name=self.windows_collection,
+            prefetch=prefetch,
+            # Every prefetch is already filtered, so the fusion needs no filter of its own
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            group_by=CHAPTER_KEY,
+            limit=len(keys),
+            group_size=self.windows_per_chapter,
+            with_payload=["start_seconds", "end_seconds", "timestamp", "text"],
+        )
+        return {
+            str(group.id): [
+                WindowHit(point_id=str(hit.id), score=hit.score, **(hit.payload or {})) for hit in group.hits
+            ]
+            for group in response.groups
+        }
+
+    def search_embedded(
+        self, embedding: QueryEmbeddings, strategy: Strategy = "rrf", chapters: int = 5
+    ) -> list[ChapterHits]:
+        coarse = self.searcher.search_embedded([embedding], strategy, chapters)[0]
+        keys = [chapter_key(result.video_id, result.chapter_id) for result in coarse]
+        windows = self.fine_search(embedding, keys)
+        return [ChapterHits(chapter=result, windows=windows.get(key, [])) for result, key in zip(coarse, keys)]
+
+    def search(self, query: str, strategy: Strategy = "rrf", chapters: int = 5) -> list[ChapterHits]:
+        """Top `chapters` chapters for a query, each with its best-matching transcript windows."""
+        embedding = self.searcher.embed_queries([query], with_late=strategy == "colbert")[0]
+        return self.search_embedded(embedding, strategy, chapters)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Index and search transcript windows under chapters.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    index_parser = subparsers.add_parser("index", help="Index the transcript windows of every chapter.")
+    index_parser.add_argument("--window-seconds", type=float, default=60)
+    index_parser.add_argument("--stride-seconds", type=float, default=30)
+    search_parser = subparsers.add_parser("search", help="Search chapters, then windows inside them.")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--strategy", choices=STRATEGIES, default="rrf")
+    search_parser.add_argument("--chapters", type=int, default=5)
+    search_parser.add_argument("--windows", type=int, default=3, help="Windows per chapter.")
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    if args.command == "index":
+        settings = WindowSettings(window_seconds=args.window_seconds, stride_seconds=args.stride_seconds)
+        chapters = iter_chapters(sorted(get_json_files(Path("data/chapters"))))
+        logger.info(f"Indexed {index_windows(registry, chapters, settings=settings)} windows.")
+    else:
+        searcher = TwoLevelSearcher(HybridSearcher(registry), windows_per_chapter=args.windows)
+        for hits in searcher.search(args.query, args.strategy, args.chapters):
+            chapter = hits.chapter
+            logger.info(f"{chapter.score:.3f} [{chapter.video_id} @ {chapter.timestamp}] {chapter.heading}")
+            for window in hits.windows:
+                logger.info(f"    {window.score:.3f} @ {window.timestamp}: {window.text[:120]!r}")
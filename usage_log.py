@@ -0,0 +1,182 @@
+import atexit
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+
+DEFAULT_USAGE_PATH = Path("logs/llm_usage.jsonl")
+# Records are buffered in memory and written in chunks, keeping file I/O off the request path
+FLUSH_EVERY = 50
+
+current_stage: ContextVar[str] = ContextVar("current_stage", default="default")
+current_video_id: ContextVar[str | None] = ContextVar("current_video_id", default=None)
+
+
+@contextmanager
+def usage_context(stage: str | None = None, video_id: str | None = None):
+    """
+    Label every LLM call made inside the block (including in asyncio tasks it starts).
+
+    Args:
+        stage: Pipeline stage, e.g. 'extract' or 'questions'.
+        video_id: The video the calls are about.
+    """
+    tokens = []
+    if stage is not None:
+        tokens.append((current_stage, current_stage.set(stage)))
+    if video_id is not None:
+        tokens.append((current_video_id, current_video_id.set(video_id)))
+    try:
+        yield
+    finally:
+        for variable, token in reversed(tokens):
+            variable.reset(token)
+
+
+class UsageRecord(BaseModel):
+    """One LLM call: who made it, how long it took and the tokens it used."""
+    timestamp: float
+    model: str
+    stage: str
+    video_id: str | None = None
+    status: str = "ok"
+    cache_hit: bool = False
+    retries: int = 0
+    latency_seconds: float = 0.0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    thoughts_tokens: int = 0
+
+
+def usage_tokens(response) -> dict[str, int]:
+    """Token counts from a response's usage_metadata (zeros if it has none)."""
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", None) or 0,
+        "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+        "thoughts_tokens": getattr(usage, "thoughts_token_count", None) or 0,
+    }
+
+
+class UsageLog:
+    """Append-only JSONL sink for UsageRecords, safe to share between threads."""
+
+    def __init__(self, path: Path = DEFAULT_USAGE_PATH, flush_every: int = FLUSH_EVERY):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self._buffer: list[str] = []
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(
+        self,
+        model: str,
+        latency_seconds: float = 0.0,
+        response=None,
+        retries: int = 0,
+        status: str = "ok",
+        cache_hit: bool = False,
+    ):
+        """Record a call, labelled with the current stage and video_id."""
+        record = UsageRecord(
+            timestamp=time.time(),
+            model=model,
+            stage=current_stage.get(),
+            video_id=current_video_id.get(),
+            status=status,
+            cache_hit=cache_hit,
+            retries=retries,
+            latency_seconds=latency_seconds,
+            **usage_tokens(response),
+        )
+        with self._lock:
+            self._buffer.append(record.model_dump_json())
+            if len(self._buffer) < self.flush_every:
+                return
+            lines, self._buffer = self._buffer, []
+        self._write(lines)
+
+    def _write(self, lines: list[str]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as sink:
+            sink.write("\n".join(lines) + "\n")
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if lines:
+            self._write(lines)
+
+
+def read_records(path: Path = DEFAULT_USAGE_PATH, since: float | None = None) -> Iterator[UsageRecord]:
+    if not path.exists():
+        return
+    with path.open(encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                record = UsageRecord.model_validate_json(line)
+                if since is None or record.timestamp >= since:
+                    yield record
+
+
+def latency_summary(seconds: Sequence[float]) -> dict[str, float]:
+    """p50/p95/p99 of latencies given in seconds, in milliseconds."""
+    p50, p95, p99 = np.percentile(np.array(seconds) * 1000, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def summarize(records: Iterator[UsageRecord] | list[UsageRecord]) -> dict[str, dict]:
+    """
+    Per-stage call counts, latency percentiles, token totals and output tokens per second.
+
+    Latency and throughput count only calls that reached the API (not response-cache hits).
+    """
+    stages: dict[str, list[UsageRecord]] = {}
+    for record in records:
+        stages.setdefault(record.stage, []).append(record)
+
+    summary = {}
+    for stage, stage_records in sorted(stages.items()):
+        api_calls = [record for record in stage_records if not record.cache_hit]
+        latencies = [record.latency_seconds for record in api_calls if record.status == "ok"]
+        output_tokens = sum(record.output_tokens for record in api_calls)
+        p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (0.0, 0.0)
+        summary[stage] = {
+            "calls": len(stage_records),
+            "cache_hits": len(stage_records) - len(api_calls),
+            "errors": sum(record.status != "ok" for record in stage_records),
+            "retries": sum(record.retries for record in stage_records),
+            "videos": len({record.video_id for record in stage_records if record.video_id}),
+            "latency_p50_seconds": float(p50),
+            "latency_p95_seconds": float(p95),
+            "prompt_tokens": sum(record.prompt_tokens for record in api_calls),
+            "output_tokens": output_tokens,
+            "cached_tokens": sum(record.cached_tokens for record in api_calls),
+            "thoughts_tokens": sum(record.thoughts_tokens for record in api_calls),
+            "output_tokens_per_second": output_tokens / sum(latencies) if latencies else 0.0,
+        }
+    return summary
+
+
+# Shared by every GeminiChat that is not given its own log
+default_usage_log = UsageLog()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize recorded LLM usage per pipeline stage.")
+    parser.add_argument("--path", type=Path, default=DEFAULT_USAGE_PATH)
+    parser.add_argument("--hours", type=float, default=None, help="Only the last N hours.")
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else None
+    print(json.dumps(summarize(read_records(args.path, since)), indent=2))
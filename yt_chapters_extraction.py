@@ -1,57 +1,113 @@
 
+import asyncio
 import os
 from pathlib import Path
 from pydantic_models import VideoAnalysis
 from gemini_chat_completion import GeminiChat
 from typing import List
 import weave
-from tqdm import tqdm
 import logging
 from logging_config import setup_logging
+from gemini_runner import RateLimits, RequestBudget, run_jobs
+from response_cache import ResponseCache
+from prompt_inputs import chapters_input_data, load_prompt_config
+from map_reduce_extraction import (
+    SUMMARY_PROMPTS_DIR, MapReduceSettings, extract_long_transcript, stream_chapters, transcript_duration
+)
+from srt_utils import parse_srt
+from usage_log import usage_context
 
 # Configure logging
 setup_logging(level=logging.INFO, log_to_file=True, log_file="yt_chapters_extraction.log")
 logger = logging.getLogger(__name__)
 
 model_name = "gemini-1.5-flash"
-# Setup GeminiChat instance for structured output
-gemini_chat = GeminiChat(
-    prompts_dir="prompts/chapters_extractor_prompts/json_chapters",
-    output_type="structured",
-    pydantic_model=VideoAnalysis,
-    model_name=model_name
+DEFAULT_PROMPTS_DIR = "prompts/chapters_extractor_prompts/json_chapters"
+
+
+def make_chat(prompts_dir: str) -> GeminiChat:
+    """GeminiChat instance for structured output with the prompts in `prompts_dir`."""
+    return GeminiChat(
+        prompts_dir=prompts_dir,
+        output_type="structured",
+        pydantic_model=VideoAnalysis,
+        model_name=model_name,
+        cache=ResponseCache
+    )
+
+
+# Setup GeminiChat instance and the payload format its prompts expect
+gemini_chat = make_chat(DEFAULT_PROMPTS_DIR)
+prompt_config = load_prompt_config(DEFAULT_PROMPTS_DIR)
+# Long transcripts are extracted in windows; this chat writes their single overall summary
+summary_chat = GeminiChat(
+    prompts_dir=SUMMARY_PROMPTS_DIR,
+    output_type="text",
+    model_name=model_name,
+    cache=ResponseCache
 )
+map_reduce_settings = MapReduceSettings()
+
+
+async def extract_chapters(srt_path: Path) -> VideoAnalysis:
+    """Extract chapters from one transcript with the async client, streamed, or in windows if it is long."""
+    logger.info(f"Processing transcript: {srt_path.name}")
+    video_id = srt_path.stem
+    cues = parse_srt(srt_path.read_text(encoding='utf-8'))
+
+    with weave.attributes({'video_id': video_id, 'model': model_name}), usage_context(stage="extract", video_id=video_id):
+        if transcript_duration(cues) > map_reduce_settings.long_video_seconds:
+            return await extract_long_transcript(
+                gemini_chat, summary_chat, video_id, cues, prompt_config, map_reduce_settings
+            )
+        return await stream_chapters(gemini_chat, video_id, chapters_input_data(srt_path, prompt_config))
+
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract chapters from transcripts in data/subtitles.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once.")
+    parser.add_argument("--rpm", type=float, default=None, help="Requests per minute budget.")
+    parser.add_argument("--tpm", type=float, default=None, help="Estimated prompt tokens per minute budget.")
+    parser.add_argument(
+        "--prompts-dir", default=DEFAULT_PROMPTS_DIR, help="Prompt directory (its prompt_config.json sets the payload format)."
+    )
+    parser.add_argument("--output-dir", type=Path, default=None, help="Where chapters go (default data/chapters).")
+    parser.add_argument("--bypass-cache", action="store_true", help="Call the API even for cached requests.")
+    parser.add_argument(
+        "--long-after-minutes", type=float, default=90, help="Extract longer transcripts in overlapping windows."
+    )
+    parser.add_argument("--window-minutes", type=float, default=30, help="Window length for long transcripts.")
+    parser.add_argument("--overlap-minutes", type=float, default=2, help="Overlap between consecutive windows.")
+    args = parser.parse_args()
+    map_reduce_settings = MapReduceSettings(
+        long_video_seconds=args.long_after_minutes * 60,
+        window_seconds=args.window_minutes * 60,
+        overlap_seconds=args.overlap_minutes * 60,
+    )
+    if args.prompts_dir != DEFAULT_PROMPTS_DIR:
+        gemini_chat = make_chat(args.prompts_dir)
+        prompt_config = load_prompt_config(args.prompts_dir)
+    gemini_chat.bypass_cache = args.bypass_cache
+    summary_chat.bypass_cache = args.bypass_cache
+
     weave.init('huberman-chat')
     cur_dir = Path.cwd()
     data_dir = cur_dir / "data"
     subtitles_dir = data_dir / "subtitles"
-    chapters_dir = data_dir / "chapters"
+    chapters_dir = args.output_dir or data_dir / "chapters"
     chapters_dir.mkdir(parents=True, exist_ok=True)
 
     srt_files: List[Path] = list(subtitles_dir.glob("*.srt"))
     if not srt_files:
         logger.warning("No transcript files found in data/subtitles.")
     else:
-        for srt_path in tqdm(srt_files, desc="Processing transcripts"):
-            try:
-                output_path = chapters_dir / f"{srt_path.stem}.json"
-                if output_path.exists():
-                    logger.info(f"Chapters already exist for {srt_path.name}, skipping.")
-                    continue
-
-                logger.info(f"Processing transcript: {srt_path.name}")
-                transcript_text = srt_path.read_text(encoding='utf-8')
-                video_id = srt_path.stem
-
-                input_data = {"transcript": transcript_text}
-
-                with weave.attributes({'video_id': video_id, 'model': model_name}):
-                    chapters_obj = gemini_chat.complete(input_data)
-
-                output_path.write_text(chapters_obj.model_dump_json(indent=2), encoding='utf-8')
-                logger.info(f"Successfully saved chapters to {output_path}")
-
-            except Exception as e:
-                logger.error(f"Failed to process {srt_path.name}: {e}", exc_info=True)
\ No newline at end of file
+        jobs = [(srt_path, chapters_dir / f"{srt_path.stem}.json") for srt_path in srt_files]
+        limits = RateLimits(concurrency=args.concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+        # Long videos make a request per window plus a merge; each one is charged to the budget
+        gemini_chat.budget = summary_chat.budget = RequestBudget(limits)
+        asyncio.run(run_jobs(jobs, extract_chapters, limits, desc="Processing transcripts"))
+        logger.info(f"Response cache: {gemini_chat.cache.stats()}")
+        logger.info(f"Concurrency limiter: {gemini_chat.limiter.stats()}")
+        logger.info(f"Token usage and latency recorded to {gemini_chat.usage_log.path}")